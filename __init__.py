@@ -11,6 +11,15 @@ from .commands.query import *
 from .commands.schedule import *
 from .commands.clear import *
 from .config import Config
+from .csust_api import csust_api
+from .db.electricity_db import engine, init_db
+from .utils.catalog import building_catalog
+from .utils import collector  # noqa: F401  导入时注册后台采集任务
+from .utils.dispatch import outbound_dispatcher
+from .utils import metrics_export  # noqa: F401  导入时注册指标文件写入任务
+from .utils.render_pool import chart_renderer
+from .utils import retention  # noqa: F401  导入时注册历史记录汇总任务
+from .utils.scheduler import init_scheduler
 
 __plugin_meta__ = PluginMetadata(
     name="nonebot-plugin-csust-electricity",
@@ -21,6 +30,25 @@ __plugin_meta__ = PluginMetadata(
 
 config = get_plugin_config(Config).csust_electricity
 
+driver = nonebot.get_driver()
+
+
+@driver.on_startup
+async def load_storage():
+    # 依次执行：定时任务与楼栋目录都依赖已迁移的数据库
+    await init_db()
+    await building_catalog.load()
+    await init_scheduler()
+
+
+@driver.on_shutdown
+async def release_resources():
+    await outbound_dispatcher.close()
+    await csust_api.aclose()
+    await chart_renderer.close()
+    await engine.dispose()
+
+
 sub_plugins = nonebot.load_plugins(
     str(Path(__file__).parent.joinpath("plugins").resolve())
 )
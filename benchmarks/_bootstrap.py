@@ -0,0 +1,52 @@
+import asyncio
+import importlib
+import sys
+import tempfile
+from pathlib import Path
+
+import nonebot
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_plugin(**config):
+    """初始化 NoneBot 并加载插件，返回插件包模块
+
+    插件在 NoneBot 启动时才初始化数据库，这里直接执行一次
+
+    子模块请使用 plugin_module 获取，包内同名属性可能已被重新导出的对象覆盖
+    """
+    config.setdefault("data_storage_path", tempfile.mkdtemp(prefix="csust-bench-"))
+    nonebot.init(csust_electricity=config)
+
+    from nonebot.adapters.onebot.v11 import Adapter
+
+    nonebot.get_driver().register_adapter(Adapter)
+
+    sys.path.insert(0, str(PLUGIN_DIR.parent))
+    nonebot.load_plugin(PLUGIN_DIR.name)
+
+    db = plugin_module("db.electricity_db")
+
+    async def init():
+        await db.init_db()
+        await db.engine.dispose()
+
+    asyncio.run(init())
+    return importlib.import_module(PLUGIN_DIR.name)
+
+
+def plugin_module(name: str):
+    return importlib.import_module(f"{PLUGIN_DIR.name}.{name}")
+
+
+def sync_engine() -> Engine:
+    """与插件使用同一个 SQLite 数据库的同步引擎，用于批量构造测试数据"""
+    db = plugin_module("db.electricity_db")
+    engine = create_engine(db.engine.url.set(drivername="sqlite"))
+    db.apply_sqlite_pragmas(
+        engine, db.sqlite_pragmas(db.config.sqlite_profile, db.config.sqlite_pragmas)
+    )
+    return engine
@@ -0,0 +1,60 @@
+"""对本地桩服务器并发查询电量，统计 p50/p99 延迟
+
+用法: python benchmarks/bench_api_latency.py --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from _bootstrap import load_plugin, plugin_module
+from stub_server import start_stub_server
+
+
+async def run(api, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await api.aget_electricity("云塘", "至诚轩5栋A区", f"A{i % 500:03d}")
+            latencies.append(time.perf_counter() - start)
+
+    await api.aget_buildings("云塘")
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    await api.aclose()
+    return np.array(latencies) * 1000, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency=args.latency)
+    load_plugin(api_url=url)
+    api = plugin_module("csust_api").CSUSTElectricityAPI(
+        query_url=url, pool_size=args.pool_size
+    )
+
+    latencies, elapsed = asyncio.run(run(api, args.requests, args.concurrency))
+    server.shutdown()
+
+    print(
+        f"requests={args.requests} concurrency={args.concurrency} pool={args.pool_size}\n"
+        f"throughput={args.requests / elapsed:.1f} req/s\n"
+        f"p50={np.percentile(latencies, 50):.2f}ms "
+        f"p99={np.percentile(latencies, 99):.2f}ms "
+        f"max={latencies.max():.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
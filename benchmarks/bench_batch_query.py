@@ -0,0 +1,95 @@
+"""批量查询多个宿舍电量的耗时，并对比请求体模板与逐次序列化的开销
+
+用法: python benchmarks/bench_batch_query.py --rooms 1000 --concurrency 8 --rate 0
+"""
+
+import argparse
+import asyncio
+import time
+
+from _bootstrap import load_plugin, plugin_module
+from stub_server import BUILDINGS, start_stub_server
+
+
+def room_keys(total: int):
+    buildings = [item["building"] for item in BUILDINGS["0030000000002501"]]
+    return [
+        ("云塘", buildings[i % len(buildings)], f"A{i // len(buildings):03d}")
+        for i in range(total)
+    ]
+
+
+def bench_encode(api, repeat: int):
+    building = next(iter(api.buildings_cache["云塘"].values()))
+    rooms = [api_module.Room(id=f"A{i:03d}", building=building) for i in range(repeat)]
+
+    start = time.perf_counter()
+    for room in rooms:
+        api._encode(
+            "synjones.onecard.query.elec.roominfo",
+            api._roominfo_query(building, room.id),
+        )
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for room in rooms:
+        api._roominfo_body(room)
+    template = time.perf_counter() - start
+
+    # 模板生成的请求体必须与逐次序列化的结果完全一致
+    for room in rooms[:100]:
+        assert api._roominfo_body(room) == api._encode(
+            "synjones.onecard.query.elec.roominfo",
+            api._roominfo_query(building, room.id),
+        )
+    return full / repeat * 1e6, template / repeat * 1e6
+
+
+async def run(api, keys):
+    await api.aget_all_buildings()
+    start = time.perf_counter()
+    results = await api.aget_electricity_many(keys)
+    elapsed = time.perf_counter() - start
+    failed = sum(isinstance(result, Exception) for result in results.values())
+    return elapsed, failed
+
+
+def main():
+    global api_module
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency=args.latency)
+    load_plugin(api_url=url)
+    api_module = plugin_module("csust_api")
+    api = api_module.CSUSTElectricityAPI(
+        query_url=url,
+        pool_size=args.concurrency,
+        max_concurrency=args.concurrency,
+        rate_limit=args.rate,
+    )
+
+    async def bench():
+        elapsed, failed = await run(api, room_keys(args.rooms))
+        encode = bench_encode(api, 10000)
+        await api.aclose()
+        return elapsed, failed, encode
+
+    elapsed, failed, (full, template) = asyncio.run(bench())
+    server.shutdown()
+
+    print(
+        f"rooms={args.rooms} concurrency={args.concurrency} rate={args.rate}\n"
+        f"elapsed={elapsed:.2f}s throughput={args.rooms / elapsed:.1f} rooms/s "
+        f"failed={failed}\n"
+        f"encode: full={full:.2f}us template={template:.2f}us"
+    )
+
+
+if __name__ == "__main__":
+    main()
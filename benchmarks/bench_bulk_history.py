@@ -0,0 +1,83 @@
+"""逐个写入与批量写入电量历史的耗时对比
+
+每种规模使用新的数据库，依次写入三轮读数：第一轮全部为新宿舍，第二轮一半宿舍电量变化，
+第三轮全部不变。逐个写入每个宿舍一个事务，批量写入所有宿舍一个事务。
+
+用法: python benchmarks/bench_bulk_history.py --rooms 1000 10000
+"""
+
+import argparse
+import asyncio
+import time
+
+from _bootstrap import load_plugin, plugin_module
+from sqlalchemy import text
+
+
+def make_readings(api_module, rooms: int, round_no: int):
+    campus = api_module.Campus(name="云塘", id="0030000000002501")
+    building = api_module.Building(name="至诚轩5栋A区", id="557", campus=campus)
+    readings = []
+    for i in range(rooms):
+        # 第二轮偶数宿舍的电量下降，第三轮与第二轮相同
+        value = 100.0 - (min(round_no, 1) if i % 2 == 0 else 0)
+        key = ("云塘", f"{i // 100 + 1}栋", f"A{i % 100:03d}")
+        room = api_module.Room(id=key[2], building=building)
+        readings.append((key, api_module.ElectricityInfo(value=value, room=room)))
+    return readings
+
+
+async def reset(db):
+    async with db.engine.begin() as conn:
+        for table in ("electricity_history", "discharge_segments", "rooms"):
+            await conn.execute(text(f"DELETE FROM {table}"))
+
+
+async def run_single(electricity, readings):
+    start = time.perf_counter()
+    changed = 0
+    for key, info in readings:
+        changed += await electricity.update_electricity_history(info, *key)
+    return time.perf_counter() - start, changed
+
+
+async def run_bulk(electricity, readings):
+    start = time.perf_counter()
+    changed = len(await electricity.update_electricity_history_many(readings))
+    return time.perf_counter() - start, changed
+
+
+async def run(db, api_module, electricity, sizes):
+    for rooms in sizes:
+        rounds = [make_readings(api_module, rooms, round_no) for round_no in range(3)]
+        for name, runner in (("逐个写入", run_single), ("批量写入", run_bulk)):
+            await reset(db)
+            results = [await runner(electricity, readings) for readings in rounds]
+            print(
+                f"rooms={rooms} {name}: "
+                + " ".join(
+                    f"第{i + 1}轮 {elapsed * 1000:.0f}ms({changed}条)"
+                    for i, (elapsed, changed) in enumerate(results)
+                )
+            )
+    await db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1000, 10000])
+    args = parser.parse_args()
+
+    load_plugin()
+    asyncio.run(
+        run(
+            plugin_module("db.electricity_db"),
+            plugin_module("csust_api"),
+            plugin_module("utils.electricity"),
+            args.rooms,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""电量历史复合索引前后的查询延迟对比
+
+向临时数据库写入数百万条历史记录，分别测量「最新一条记录」与「时间范围查询」
+在没有索引和有 (room_id, record_time) 复合索引时的耗时。
+
+用法: python benchmarks/bench_history_index.py --rows 2000000 --rooms 2000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from _bootstrap import load_plugin, plugin_module, sync_engine
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+
+def seed(engine, db, rows: int, rooms: int):
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            db.Room.__table__.insert(),
+            [
+                {
+                    "campus": "云塘",
+                    "building": f"{i // 100 + 1}栋",
+                    "room": f"A{i % 100:03d}",
+                }
+                for i in range(rooms)
+            ],
+        )
+        room_ids = [row[0] for row in conn.execute(text("SELECT id FROM rooms"))]
+
+    insert = db.ElectricityHistory.__table__.insert()
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            batch.append(
+                {
+                    "room_id": room_ids[i % rooms],
+                    "record_time": start + timedelta(minutes=i // rooms * 30),
+                    "electricity": random.uniform(0, 200),
+                }
+            )
+            if len(batch) >= 50000:
+                conn.execute(insert, batch)
+                batch.clear()
+        if batch:
+            conn.execute(insert, batch)
+    return room_ids
+
+
+def measure(engine, ElectricityHistory, room_ids, repeat: int):
+    latest, ranged = [], []
+    for room_id in random.sample(room_ids, repeat):
+        filters = (ElectricityHistory.room_id == room_id,)
+        with Session(engine) as session:
+            start = time.perf_counter()
+            session.query(ElectricityHistory).filter(*filters).order_by(
+                ElectricityHistory.record_time.desc()
+            ).first()
+            latest.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            session.query(ElectricityHistory).filter(*filters).order_by(
+                ElectricityHistory.record_time
+            ).all()
+            ranged.append(time.perf_counter() - start)
+    return sum(latest) / repeat * 1000, sum(ranged) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    load_plugin()
+    db = plugin_module("db.electricity_db")
+    engine = sync_engine()
+
+    # 先去掉索引，模拟旧数据库
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX IF EXISTS ix_electricity_history_room_time"))
+
+    start = time.perf_counter()
+    room_ids = seed(engine, db, args.rows, args.rooms)
+    print(f"写入 {args.rows} 条记录耗时 {time.perf_counter() - start:.1f}s")
+
+    latest, ranged = measure(engine, db.ElectricityHistory, room_ids, args.repeat)
+    print(f"无索引: 最新记录 {latest:.2f}ms, 范围查询 {ranged:.2f}ms")
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        db.migrate_db(conn)
+    print(f"迁移（创建索引）耗时 {time.perf_counter() - start:.1f}s")
+
+    latest, ranged = measure(engine, db.ElectricityHistory, room_ids, args.repeat)
+    print(f"有索引: 最新记录 {latest:.2f}ms, 范围查询 {ranged:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
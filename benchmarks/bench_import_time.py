@@ -0,0 +1,102 @@
+"""插件启动耗时与导入开销检查
+
+在新的解释器中以 -X importtime 加载插件，统计加载耗时、峰值内存与导入最慢的模块，
+并检查 numpy、matplotlib 等重量级依赖没有在启动时导入（它们应在第一次 /图表 或预测时才导入）。
+存在不应导入的模块或耗时超过 --budget 时以非零状态退出，可用于防止启动变慢。
+
+用法: python benchmarks/bench_import_time.py --runs 5 --budget 3000
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+# 启动时不应导入的模块
+DEFERRED_MODULES = ["numpy", "matplotlib", "sklearn", "scipy", "PIL"]
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {bench_dir!r})
+from _bootstrap import load_plugin
+load_plugin()
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "loaded": [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr: str):
+    """返回顶层导入的 (累计耗时微秒, 模块名)"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # 模块名前的缩进表示嵌套深度，只统计顶层导入
+        if name.startswith("  "):
+            continue
+        entries.append((int(cumulative), name.strip()))
+    return entries
+
+
+def run_once():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            CHILD.format(bench_dir=str(BENCH_DIR), deferred=DEFERRED_MODULES),
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return report, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=0, help="加载耗时上限（毫秒）")
+    args = parser.parse_args()
+
+    reports = []
+    for _ in range(args.runs):
+        report, entries = run_once()
+        reports.append(report)
+
+    elapsed = statistics.median(report["elapsed"] for report in reports) * 1000
+    max_rss = statistics.median(report["max_rss"] for report in reports) / 1024
+    print(
+        f"加载插件（含 NoneBot 初始化与建表）: 中位数 {elapsed:.0f}ms，峰值内存 {max_rss:.0f}MB"
+    )
+
+    print(f"最后一次运行中最慢的 {args.top} 个顶层导入:")
+    for cumulative, name in sorted(entries, reverse=True)[: args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    failed = False
+    loaded = sorted({name for report in reports for name in report["loaded"]})
+    if loaded:
+        print(f"启动时导入了应延迟加载的模块: {', '.join(loaded)}")
+        failed = True
+    if args.budget and elapsed > args.budget:
+        print(f"加载耗时超过上限 {args.budget:.0f}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""NumPy 分段拟合与原 sklearn 逐段拟合的耗时、导入开销对比
+
+用法: python benchmarks/bench_regression.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+from _bootstrap import load_plugin, plugin_module
+
+
+def make_series(size: int, rng: np.random.Generator):
+    times = 1.7e9 + np.cumsum(rng.uniform(600, 6 * 3600, size))
+    steps = -rng.uniform(0, 3, size)
+    recharges = rng.random(size) < 0.05
+    steps[recharges] = rng.uniform(20, 100, recharges.sum())
+    values = 100 + np.cumsum(steps)
+    return times, values
+
+
+def sklearn_fit(times, values):
+    from sklearn.linear_model import LinearRegression
+
+    results = []
+    start = 0
+    for i in range(1, len(values) + 1):
+        if i == len(values) or values[i] > values[i - 1]:
+            if i - start > 1:
+                model = LinearRegression()
+                model.fit(times[start:i].reshape(-1, 1), values[start:i].reshape(-1, 1))
+                results.append((model.coef_[0][0], model.intercept_[0]))
+            start = i
+    return results
+
+
+def timed(func, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def import_cost(module: str):
+    """在新进程中导入模块，返回 (耗时 ms, 导入后 RSS MB)"""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = (time.perf_counter() - start) * 1000\n"
+        "status = open('/proc/self/status').read().split('VmRSS:')[1]\n"
+        "print(elapsed, int(status.split()[0]) / 1024)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), float(output[1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    load_plugin()
+    fit_segments = plugin_module("utils.regression").fit_segments
+
+    try:
+        import sklearn  # noqa: F401
+
+        has_sklearn = True
+    except ImportError:
+        has_sklearn = False
+        print("未安装 scikit-learn，仅测试 NumPy 实现")
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        times, values = make_series(size, rng)
+        fit = fit_segments(times, values)
+        line = f"n={size:<7} 段数={len(fit):<6} numpy={timed(fit_segments, times, values):8.2f}ms"
+
+        if has_sklearn:
+            expected = np.array(sklearn_fit(times, values))
+            multi = fit.counts > 1
+            np.testing.assert_allclose(fit.slopes[multi], expected[:, 0], rtol=1e-6)
+            line += f"  sklearn={timed(sklearn_fit, times, values, repeat=1):8.2f}ms"
+        print(line)
+
+    for module in ["numpy"] + (["sklearn.linear_model"] if has_sklearn else []):
+        elapsed, rss = import_cost(module)
+        print(f"import {module:<22} {elapsed:8.1f}ms  rss={rss:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
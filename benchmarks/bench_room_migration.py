@@ -0,0 +1,137 @@
+"""旧版（字符串宿舍字段 + UUID 主键）数据库迁移到 rooms 表前后的对比
+
+构造旧版结构的数据库并写入历史记录，加载插件时 init_db 会原地迁移，
+比较迁移前后每条读数占用的字节数以及单个宿舍的范围查询耗时。
+
+用法: python benchmarks/bench_room_migration.py --rows 1000000 --rooms 2000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from _bootstrap import load_plugin
+
+LEGACY_SCHEMA = """
+CREATE TABLE bindings (
+    id VARCHAR(36) NOT NULL PRIMARY KEY,
+    qq_number VARCHAR(20),
+    group_number VARCHAR(20),
+    campus VARCHAR(50) NOT NULL,
+    building VARCHAR(50) NOT NULL,
+    room VARCHAR(20) NOT NULL,
+    CONSTRAINT uq_qq UNIQUE (qq_number),
+    CONSTRAINT uq_group UNIQUE (group_number)
+);
+CREATE TABLE schedules (
+    id VARCHAR(36) NOT NULL PRIMARY KEY,
+    binding_id VARCHAR(36) NOT NULL REFERENCES bindings (id) ON DELETE CASCADE,
+    schedule_time VARCHAR(5) NOT NULL
+);
+CREATE TABLE electricity_history (
+    id VARCHAR(36) NOT NULL PRIMARY KEY,
+    record_time DATETIME,
+    electricity FLOAT NOT NULL,
+    campus VARCHAR(50) NOT NULL,
+    building VARCHAR(50) NOT NULL,
+    room VARCHAR(20) NOT NULL
+);
+CREATE INDEX ix_electricity_history_room_time
+    ON electricity_history (campus, building, room, record_time);
+"""
+
+
+def build_legacy(path: str, rows: int, rooms: int):
+    room_keys = [
+        ("云塘", f"至诚轩{i // 100 + 1}栋A区", f"A{i % 100:03d}") for i in range(rooms)
+    ]
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany(
+        "INSERT INTO bindings (id, qq_number, campus, building, room) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [(str(uuid.uuid4()), str(10000 + i), *key) for i, key in enumerate(room_keys)],
+    )
+    conn.executemany(
+        "INSERT INTO electricity_history VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (
+                str(uuid.uuid4()),
+                str(start + timedelta(minutes=i // rooms * 30)),
+                random.uniform(0, 200),
+                *room_keys[i % rooms],
+            )
+            for i in range(rows)
+        ),
+    )
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return room_keys
+
+
+def range_scan(path: str, sql: str, params_list) -> float:
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    for params in params_list:
+        conn.execute(sql, params).fetchall()
+    elapsed = (time.perf_counter() - start) / len(params_list) * 1000
+    conn.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--rooms", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="csust-bench-")
+    path = os.path.join(data_dir, "electricity.db")
+    room_keys = build_legacy(path, args.rows, args.rooms)
+    sample = random.sample(room_keys, min(args.repeat, len(room_keys)))
+
+    legacy_size = os.path.getsize(path)
+    legacy_scan = range_scan(
+        path,
+        "SELECT record_time, electricity FROM electricity_history "
+        "WHERE campus = ? AND building = ? AND room = ? ORDER BY record_time",
+        sample,
+    )
+
+    start = time.perf_counter()
+    load_plugin(data_storage_path=data_dir)
+    migrate_time = time.perf_counter() - start
+
+    new_size = os.path.getsize(path)
+    conn = sqlite3.connect(path)
+    room_ids = [
+        conn.execute(
+            "SELECT id FROM rooms WHERE campus = ? AND building = ? AND room = ?", key
+        ).fetchone()
+        for key in sample
+    ]
+    conn.close()
+    new_scan = range_scan(
+        path,
+        "SELECT record_time, electricity FROM electricity_history "
+        "WHERE room_id = ? ORDER BY record_time",
+        room_ids,
+    )
+
+    print(f"迁移（含加载插件）耗时 {migrate_time:.1f}s")
+    print(
+        f"旧结构: {legacy_size / args.rows:.1f} 字节/条, 范围查询 {legacy_scan:.2f}ms"
+    )
+    print(f"新结构: {new_size / args.rows:.1f} 字节/条, 范围查询 {new_scan:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""每个绑定一个 cron 任务与按分钟索引定时查询的启动与每分钟开销对比
+
+构造指定数量的绑定与定时查询（一半集中在几个常用时间点，其余分布在 06:00 之后），分别测量：
+旧方式读取全部 Schedule 对象并为每个绑定添加一个 cron 任务、APScheduler 处理一个
+到期分钟（取出到期任务、计算下次执行时间并写回任务存储）的耗时；新方式一次查询建立索引、
+查找空闲分钟与最繁忙分钟的绑定，以及按 ID 读取最繁忙分钟的绑定的耗时。
+
+用法: python benchmarks/bench_schedule_index.py --schedules 100000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from _bootstrap import load_plugin, plugin_module, sync_engine
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+POPULAR_TIMES = ["07:30", "08:00", "12:00", "18:00", "22:00", "22:30"]
+
+
+def random_time() -> str:
+    if random.random() < 0.5:
+        return random.choice(POPULAR_TIMES)
+    # 凌晨不设置定时查询，用于测量空闲分钟的开销
+    return f"{random.randrange(6, 24):02d}:{random.randrange(60):02d}"
+
+
+def seed(db, schedules: int, rooms: int):
+    engine = sync_engine()
+    binding_ids = [str(uuid.uuid4()) for _ in range(schedules)]
+    with engine.begin() as conn:
+        conn.execute(
+            db.Room.__table__.insert(),
+            [
+                {
+                    "campus": "云塘",
+                    "building": f"{i // 100 + 1}栋",
+                    "room": f"A{i % 100}",
+                }
+                for i in range(rooms)
+            ],
+        )
+        conn.execute(
+            db.Binding.__table__.insert(),
+            [
+                {"id": id, "qq_number": str(10000 + i), "room_id": i % rooms + 1}
+                for i, id in enumerate(binding_ids)
+            ],
+        )
+        conn.execute(
+            db.Schedule.__table__.insert(),
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "binding_id": id,
+                    "schedule_time": random_time(),
+                }
+                for id in binding_ids
+            ],
+        )
+    engine.dispose()
+
+
+async def noop(*args):
+    pass
+
+
+async def bench_legacy(repository):
+    start = time.perf_counter()
+    schedules = await repository.all()
+    legacy = AsyncIOScheduler()
+    legacy.start(paused=True)
+    for schedule in schedules:
+        hour, minute = schedule.schedule_time.split(":")
+        legacy.add_job(
+            noop,
+            "cron",
+            hour=int(hour),
+            minute=int(minute),
+            id=f"electricity_query_{schedule.binding_id}",
+            args=[schedule.binding_id],
+        )
+    startup = time.perf_counter() - start
+
+    # 与 APScheduler 处理到期任务的步骤相同，只是不真正执行任务
+    store = legacy._jobstores["default"]
+
+    def process(now):
+        due = store.get_due_jobs(now)
+        for job in due:
+            run_times = job._get_run_times(now)
+            job._modify(
+                next_run_time=job.trigger.get_next_fire_time(run_times[-1], now)
+            )
+            store.update_job(job)
+        return due
+
+    # 先处理 08:00 之前到期的任务，只统计 08:00 这一分钟
+    now = next(
+        job.next_run_time
+        for job in store.get_all_jobs()
+        if job.next_run_time.strftime("%H:%M") == "08:00"
+    )
+    process(now - timedelta(minutes=1))
+    start = time.perf_counter()
+    due = process(now)
+    tick = time.perf_counter() - start
+    legacy.shutdown(wait=False)
+    return len(schedules), startup, len(due), tick
+
+
+async def bench_index(scheduler, binding_repository):
+    start = time.perf_counter()
+    await scheduler.init_scheduler()
+    startup = time.perf_counter() - start
+    index = scheduler.schedule_index
+
+    rounds = 1000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        index._last_minute = None
+        index.due(datetime(2025, 1, 1, 3, 0))
+    idle_tick = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        index._last_minute = None
+        (_, binding_ids), *_ = index.due(datetime(2025, 1, 1, 8, 0))
+    busy_tick = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    bindings = await binding_repository.get_many(binding_ids)
+    load = time.perf_counter() - start
+    return startup, idle_tick, busy_tick, len(bindings), load
+
+
+async def run(args):
+    db = plugin_module("db.electricity_db")
+    repository = plugin_module("db.repository")
+    scheduler = plugin_module("utils.scheduler")
+
+    count, startup, due, tick = await bench_legacy(repository.schedule_repository)
+    print(
+        f"每个绑定一个任务: 启动 {startup * 1000:.0f}ms，共 {count} 个任务；"
+        f"08:00 处理 {due} 个到期任务 {tick * 1000:.1f}ms"
+    )
+
+    startup, idle_tick, busy_tick, bindings, load = await bench_index(
+        scheduler, repository.binding_repository
+    )
+    print(
+        f"按分钟索引: 启动 {startup * 1000:.0f}ms，共 1 个任务；"
+        f"空闲分钟 {idle_tick * 1e6:.1f}µs，08:00 查找 {busy_tick * 1e6:.1f}µs，"
+        f"读取 {bindings} 个绑定 {load * 1000:.1f}ms"
+    )
+    await db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schedules", type=int, default=100000)
+    parser.add_argument("--rooms", type=int, default=10000)
+    args = parser.parse_args()
+
+    load_plugin()
+    seed(plugin_module("db.electricity_db"), args.schedules, args.rooms)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""不同 SQLite 参数方案下的并发读写吞吐
+
+每个方案使用新的数据库，写入初始历史记录后，由若干写线程逐条提交新读数（与定时任务写入
+历史的方式相同），同时由若干读线程查询最新记录与最近 7 天的记录（与 /电量、/图表 相同），
+统计固定时长内的读写次数与 "database is locked" 错误数。
+
+用法: python benchmarks/bench_sqlite_profile.py --writers 4 --readers 8 --seconds 10
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from _bootstrap import load_plugin, plugin_module
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+
+def seed(engine, db, rooms: int, rows_per_room: int):
+    start = datetime.now() - timedelta(minutes=30 * rows_per_room)
+    with engine.begin() as conn:
+        conn.execute(
+            db.Room.__table__.insert(),
+            [
+                {"campus": "云塘", "building": "1栋", "room": f"A{i}"}
+                for i in range(rooms)
+            ],
+        )
+        conn.execute(
+            db.ElectricityHistory.__table__.insert(),
+            [
+                {
+                    "room_id": room_id,
+                    "record_time": start + timedelta(minutes=30 * i),
+                    "electricity": random.uniform(0, 200),
+                }
+                for room_id in range(1, rooms + 1)
+                for i in range(rows_per_room)
+            ],
+        )
+
+
+def run_profile(db, profile: str, args):
+    path = tempfile.mkdtemp(prefix="csust-sqlite-")
+    engine = create_engine(
+        f"sqlite:///{path}/electricity.db",
+        connect_args={"check_same_thread": False},
+        pool_size=args.writers + args.readers,
+    )
+    db.apply_sqlite_pragmas(engine, db.sqlite_pragmas(profile))
+    db.Base.metadata.create_all(bind=engine)
+    seed(engine, db, args.rooms, args.rows_per_room)
+
+    stop = threading.Event()
+    counts = {"write": 0, "read": 0, "locked": 0}
+    lock = threading.Lock()
+
+    def count(name: str):
+        with lock:
+            counts[name] += 1
+
+    def writer():
+        insert = db.ElectricityHistory.__table__.insert()
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        insert,
+                        {
+                            "room_id": random.randint(1, args.rooms),
+                            "record_time": datetime.now(),
+                            "electricity": random.uniform(0, 200),
+                        },
+                    )
+                count("write")
+            except OperationalError:
+                count("locked")
+
+    latest = text(
+        "SELECT electricity FROM electricity_history WHERE room_id = :room_id "
+        "ORDER BY record_time DESC LIMIT 1"
+    )
+    ranged = text(
+        "SELECT record_time, electricity FROM electricity_history "
+        "WHERE room_id = :room_id AND record_time >= :since ORDER BY record_time"
+    )
+
+    def reader():
+        while not stop.is_set():
+            room_id = random.randint(1, args.rooms)
+            try:
+                with engine.connect() as conn:
+                    conn.execute(latest, {"room_id": room_id}).all()
+                    conn.execute(
+                        ranged,
+                        {
+                            "room_id": room_id,
+                            "since": datetime.now() - timedelta(days=7),
+                        },
+                    ).all()
+                count("read")
+            except OperationalError:
+                count("locked")
+
+    threads = [threading.Thread(target=writer) for _ in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+
+    print(
+        f"{profile:<8} 写 {counts['write'] / args.seconds:8.1f}/s  "
+        f"读 {counts['read'] / args.seconds:8.1f}/s  "
+        f"locked {counts['locked']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", nargs="+", default=None)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--rows-per-room", type=int, default=500)
+    args = parser.parse_args()
+
+    load_plugin()
+    db = plugin_module("db.electricity_db")
+
+    print(f"writers={args.writers} readers={args.readers} seconds={args.seconds}")
+    for profile in args.profiles or db.SQLITE_PROFILES:
+        run_profile(db, profile, args)
+
+
+if __name__ == "__main__":
+    main()
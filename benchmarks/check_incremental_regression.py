@@ -0,0 +1,84 @@
+"""校验增量回归与 sklearn LinearRegression 的预测结果一致
+
+随机生成带充值的放电曲线，分别用 DischargeSegment 的累加量和原先
+「找出最后一段下降记录再用 sklearn 拟合」的方法预测电量耗尽时间并比较。
+
+用法: python benchmarks/check_incremental_regression.py --cases 500
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+from _bootstrap import load_plugin, plugin_module
+from sklearn.linear_model import LinearRegression
+
+
+def random_history(rng: random.Random, length: int):
+    time = datetime(2024, 1, 1) + timedelta(seconds=rng.uniform(0, 86400 * 365))
+    value = rng.uniform(20, 200)
+    records = []
+    for _ in range(length):
+        records.append((time, round(value, 2)))
+        time += timedelta(seconds=rng.uniform(600, 6 * 3600))
+        if rng.random() < 0.05:
+            value += rng.uniform(20, 100)
+        else:
+            value = max(0.0, value - rng.uniform(0, 3))
+    return records
+
+
+def sklearn_predict(records):
+    current_segment = []
+    for i in range(len(records)):
+        if i == 0 or records[i][1] <= records[i - 1][1]:
+            current_segment.append(records[i])
+        else:
+            current_segment = [records[i]]
+
+    if len(current_segment) < 2:
+        return None
+
+    times = np.array([t.timestamp() for t, _ in current_segment]).reshape(-1, 1)
+    values = np.array([v for _, v in current_segment]).reshape(-1, 1)
+    model = LinearRegression().fit(times, values)
+    m, b = model.coef_[0][0], model.intercept_[0]
+    if m >= 0:
+        return None
+    return datetime.fromtimestamp(-b / m)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    load_plugin()
+    DischargeSegment = plugin_module("db.electricity_db").DischargeSegment
+
+    rng = random.Random(args.seed)
+    max_error = 0.0
+    for _ in range(args.cases):
+        records = random_history(rng, rng.randint(1, 2000))
+        segment = DischargeSegment(room_id=0)
+        for record_time, value in records:
+            segment.push(record_time, value)
+
+        expected = sklearn_predict(records)
+        actual = segment.predict_empty_time()
+        if (expected is None) != (actual is None):
+            # 斜率恰好在 0 附近时两种算法可能落在不同一侧
+            raise AssertionError(f"预测结果不一致: sklearn={expected}, 增量={actual}")
+        if expected is not None:
+            horizon = abs((expected - records[-1][0]).total_seconds()) or 1.0
+            error = abs((expected - actual).total_seconds()) / horizon
+            max_error = max(max_error, error)
+
+    print(f"{args.cases} 组数据全部一致，最大相对误差 {max_error:.3e}")
+    assert max_error < 1e-6
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""pytest-benchmark 基准测试的公共夹具
+
+插件在整个测试会话中只加载一次，使用临时目录中的 SQLite 数据库；上游接口由
+stub_server 模拟，楼栋目录在加载后预先刷新，查询电量时不会请求楼栋列表。
+各测试使用不同的宿舍构造数据，互不影响。
+"""
+
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pytest
+from _bootstrap import load_plugin, plugin_module, sync_engine
+from stub_server import start_stub_server
+
+CAMPUS = "云塘"
+BUILDING = "至诚轩5栋A区"
+
+
+def discharge_curve(rows: int, step: float = 600.0, rate: float = 0.3):
+    """以当前时间结尾、每 step 秒一条的放电曲线，电量低于 10 度时充值 100 度
+
+    返回 (秒级时间戳, 电量) 两个数组
+    """
+    end = datetime.now().timestamp()
+    times = end - step * np.arange(rows)[::-1]
+    used = rate * (times - times[0]) / 3600
+    values = np.round(10 + (150 - 10 - used) % 100, 2)
+    return times, values
+
+
+@pytest.fixture(scope="session")
+def stub_server():
+    server, url = start_stub_server()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def plugin(stub_server, loop):
+    pkg = load_plugin(api_url=stub_server)
+    loop.run_until_complete(pkg.load_storage())
+    loop.run_until_complete(
+        plugin_module("utils.catalog").building_catalog.refresh(CAMPUS)
+    )
+    yield pkg
+    loop.run_until_complete(pkg.release_resources())
+
+
+@pytest.fixture(scope="session")
+def run(plugin, loop):
+    """在会话的事件循环中执行协程，供基准测试调用异步接口"""
+    return loop.run_until_complete
+
+
+@pytest.fixture(scope="session")
+def db(plugin):
+    return plugin_module("db.electricity_db")
+
+
+def insert_rooms(db, rooms: Iterable[str]) -> List[int]:
+    rooms = list(rooms)
+    engine = sync_engine()
+    with engine.begin() as conn:
+        conn.execute(
+            db.Room.__table__.insert(),
+            [{"campus": CAMPUS, "building": BUILDING, "room": room} for room in rooms],
+        )
+        ids = dict(
+            conn.execute(
+                db.Room.__table__.select()
+                .with_only_columns(db.Room.room, db.Room.id)
+                .where(db.Room.room.in_(rooms))
+            ).all()
+        )
+    engine.dispose()
+    return [ids[room] for room in rooms]
+
+
+def insert_history(db, room_id: int, times: np.ndarray, values: np.ndarray):
+    engine = sync_engine()
+    with engine.begin() as conn:
+        conn.execute(
+            db.ElectricityHistory.__table__.insert(),
+            [
+                {
+                    "room_id": room_id,
+                    "record_time": datetime.fromtimestamp(t),
+                    "electricity": float(v),
+                }
+                for t, v in zip(times.tolist(), values.tolist())
+            ],
+        )
+    engine.dispose()
+
+
+def insert_schedules(db, room_id: int, count: int) -> List[Tuple[str, str]]:
+    """为同一宿舍添加 count 个绑定，定时时间分散在一天中的各分钟"""
+    schedules = [
+        (str(uuid.uuid4()), f"{i // 60 % 24:02d}:{i % 60:02d}") for i in range(count)
+    ]
+    engine = sync_engine()
+    with engine.begin() as conn:
+        conn.execute(
+            db.Binding.__table__.insert(),
+            [
+                {"id": id, "qq_number": str(10000 + i), "room_id": room_id}
+                for i, (id, _) in enumerate(schedules)
+            ],
+        )
+        conn.execute(
+            db.Schedule.__table__.insert(),
+            [
+                {"id": str(uuid.uuid4()), "binding_id": id, "schedule_time": time_str}
+                for id, time_str in schedules
+            ],
+        )
+    engine.dispose()
+    return schedules
@@ -0,0 +1,263 @@
+"""离线负载测试：用模拟服务器回放 N 个绑定的查询、定时推送与图表请求
+
+构造 N 个绑定（多个绑定可能共用一个宿舍），按模拟服务器的放电曲线写入最近几天的历史记录，
+然后依次测量：
+  query    每个绑定查询一次电量（与 /电量 相同的调用链，含缓存、历史写入与预测）
+  schedule 所有绑定在同一分钟到期，经定时任务查询并通过发送队列推送，
+           延迟为从到期到消息发出的时间
+  graph    每个绑定生成一次图表（与 /图表 相同的缓存与渲染流程）
+输出每条路径的吞吐量与延迟分位数。
+
+用法: python benchmarks/load_test.py --bindings 1000 --rooms 300 --concurrency 50
+      python benchmarks/load_test.py --error-rate 0.2 --distribution lognormal
+"""
+
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+from _bootstrap import load_plugin, plugin_module, sync_engine
+from stub_server import (
+    BUILDINGS,
+    add_behavior_arguments,
+    behavior_from_args,
+    room_electricity,
+    start_stub_server,
+)
+
+CAMPUS = "云塘"
+BUILDING_NAMES = [item["building"] for item in BUILDINGS["0030000000002501"]]
+SCHEDULE_TIME = "08:00"
+
+
+def room_keys(rooms: int):
+    return [
+        (CAMPUS, BUILDING_NAMES[i % len(BUILDING_NAMES)], f"A{i // 2 + 100:03d}")
+        for i in range(rooms)
+    ]
+
+
+def seed(db, args):
+    """写入宿舍、绑定、定时查询与按小时采样的历史记录"""
+    keys = room_keys(args.rooms)
+    now = datetime.now()
+    engine = sync_engine()
+    with engine.begin() as conn:
+        conn.execute(
+            db.Room.__table__.insert(),
+            [{"campus": c, "building": b, "room": r} for c, b, r in keys],
+        )
+        binding_ids = [str(uuid.uuid4()) for _ in range(args.bindings)]
+        conn.execute(
+            db.Binding.__table__.insert(),
+            [
+                {
+                    "id": id,
+                    "qq_number": str(10000 + i),
+                    "room_id": random.randrange(args.rooms) + 1,
+                }
+                for i, id in enumerate(binding_ids)
+            ],
+        )
+        conn.execute(
+            db.Schedule.__table__.insert(),
+            [
+                {
+                    "id": str(uuid.uuid4()),
+                    "binding_id": id,
+                    "schedule_time": SCHEDULE_TIME,
+                }
+                for id in binding_ids
+            ],
+        )
+
+        hours = int(args.history_days * 24)
+        rows = []
+        for room_id, (_, _, room) in enumerate(keys, start=1):
+            previous = None
+            for h in range(hours, 0, -1):
+                record_time = now - timedelta(hours=h)
+                value = room_electricity(room, record_time.timestamp())
+                # 与插件一致，只记录有变化的读数
+                if value != previous:
+                    rows.append(
+                        {
+                            "room_id": room_id,
+                            "record_time": record_time,
+                            "electricity": value,
+                        }
+                    )
+                    previous = value
+        conn.execute(db.ElectricityHistory.__table__.insert(), rows)
+    engine.dispose()
+    return len(rows)
+
+
+def report(name: str, latencies, elapsed: float, errors: Counter):
+    latencies = np.array(latencies) * 1000
+    if not len(latencies):
+        print(f"{name:<8} 没有成功的请求")
+    else:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(
+            f"{name:<8} {len(latencies):6d} 次 {elapsed:7.2f}s "
+            f"{len(latencies) / elapsed:8.1f}/s  "
+            f"p50 {p50:7.1f}ms p95 {p95:7.1f}ms p99 {p99:7.1f}ms "
+            f"max {latencies.max():7.1f}ms"
+        )
+    for error, count in errors.most_common():
+        print(f"{'':<8} 失败 {count:6d} 次: {error}")
+
+
+async def run_each(items, concurrency: int, func):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], Counter()
+
+    async def one(item):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await func(item)
+            except Exception as e:
+                message = str(e).splitlines()[0] if str(e) else ""
+                errors[f"{type(e).__name__}: {message[:120]}"] += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(item) for item in items))
+    return latencies, time.perf_counter() - start, errors
+
+
+async def run_query(bindings, args):
+    electricity = plugin_module("utils.electricity")
+
+    async def query(binding):
+        await electricity.query_electricity(
+            binding.campus, binding.building, binding.room
+        )
+
+    return await run_each(bindings, args.concurrency, query)
+
+
+async def run_schedule(args):
+    scheduler = plugin_module("utils.scheduler")
+    dispatch = plugin_module("utils.dispatch")
+    delivered = []
+
+    class Bot:
+        async def send_private_msg(self, user_id, message):
+            await asyncio.sleep(args.send_latency)
+            delivered.append(time.perf_counter() - start)
+
+        async def send_group_msg(self, group_id, message):
+            await self.send_private_msg(group_id, message)
+
+    dispatch.get_bot = lambda: Bot()
+    hour, minute = map(int, SCHEDULE_TIME.split(":"))
+    due = scheduler.schedule_index.due(datetime.now().replace(hour=hour, minute=minute))
+    expected = sum(len(ids) for _, ids in due)
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(scheduler.query_and_send_batch(time_str, ids) for time_str, ids in due)
+    )
+    errors = Counter()
+    if len(delivered) < expected:
+        errors["未发出的消息"] = expected - len(delivered)
+    return delivered, time.perf_counter() - start, errors
+
+
+async def run_graph(bindings, args):
+    """与 handle_graph 相同的流程：按历史记录版本读取缓存，未命中时读取并渲染"""
+    history = plugin_module("db.repository").history_repository
+    electricity = plugin_module("utils.electricity")
+    chart_renderer = plugin_module("utils.render_pool").chart_renderer
+    graph_command = plugin_module("commands.graph")
+    max_points = electricity.config.graph_max_points
+    variant = f"{args.graph_days}d"
+
+    async def graph(binding):
+        since = graph_command.chart_window_start(timedelta(days=args.graph_days))
+        latest = await history.latest_id(binding.room_id, since)
+        if latest is None:
+            raise ValueError("没有查询到电量记录")
+        version = graph_command.chart_version(latest, since)
+        image = await electricity.chart_cache.get(binding.room_id, version, variant)
+        if image is None:
+            times, values = await history.load_arrays(binding.room_id, since)
+            location = f"{binding.campus}-{binding.building}-{binding.room}"
+            image = await chart_renderer.render(times, values, location, max_points)
+            await electricity.chart_cache.put(binding.room_id, version, image, variant)
+
+    return await run_each(bindings, args.graph_concurrency, graph)
+
+
+async def run(pkg, args):
+    repository = plugin_module("db.repository")
+    await pkg.load_storage()
+
+    ids = [binding_id for binding_id, _ in await repository.schedule_repository.times()]
+    bindings = await repository.binding_repository.get_many(ids)
+
+    print(f"bindings={len(bindings)} rooms={args.rooms} concurrency={args.concurrency}")
+    if "query" in args.paths:
+        report("query", *await run_query(bindings, args))
+    if "schedule" in args.paths:
+        # 定时推送与查询共用读数缓存，清空后模拟缓存已过期的情况
+        plugin_module("utils.electricity").reading_cache.clear()
+        report("schedule", *await run_schedule(args))
+    if "graph" in args.paths:
+        report("graph", *await run_graph(bindings, args))
+
+    breaker = plugin_module("csust_api").csust_api.circuit_breaker
+    print(
+        f"上游熔断 {breaker.opened} 次，拒绝 {breaker.rejected} 个请求；"
+        f"发送队列 {plugin_module('utils.dispatch').outbound_dispatcher.stats()}"
+    )
+    await pkg.release_resources()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bindings", type=int, default=1000)
+    parser.add_argument("--rooms", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--history-days", type=float, default=7)
+    parser.add_argument("--graph-days", type=int, default=7)
+    parser.add_argument("--send-latency", type=float, default=0.01)
+    parser.add_argument("--outbound-rate", type=float, default=0)
+    parser.add_argument("--cache-ttl", type=float, default=60)
+    parser.add_argument("--graph-workers", type=int, default=2)
+    # 超过渲染队列长度的请求会被直接拒绝，需要观察拒绝情况时调大
+    parser.add_argument("--graph-concurrency", type=int, default=8)
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        choices=["query", "schedule", "graph"],
+        default=["query", "schedule", "graph"],
+    )
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(behavior=behavior_from_args(args))
+    pkg = load_plugin(
+        api_url=url,
+        outbound_rate=args.outbound_rate,
+        outbound_target_rate=0,
+        reading_cache_ttl=args.cache_ttl,
+        graph_render_workers=args.graph_workers,
+    )
+    rows = seed(plugin_module("db.electricity_db"), args)
+    print(f"已写入 {rows} 条历史记录")
+    asyncio.run(run(pkg, args))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
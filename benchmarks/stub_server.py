@@ -0,0 +1,225 @@
+"""CSUST 电量接口的本地模拟服务器
+
+实现 synjones.onecard.query.elec.building 与 .roominfo 两个接口，可配置响应延迟分布、
+错误率与超时率；每个房间的电量按固定的放电速率（带昼夜变化）下降，低于阈值时自动充值，
+同一房间在同一时刻的读数是确定的，可用 room_electricity 在测试中直接计算。
+speed 大于 1 时模拟时间按倍数加速，便于在短时间内观察放电与充值。
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+
+BUILDINGS = {
+    "0030000000002501": [
+        {"building": "至诚轩5栋A区", "buildingid": "557"},
+        {"building": "至诚轩5栋B区", "buildingid": "558"},
+    ],
+    "0030000000002502": [
+        {"building": "西苑1栋", "buildingid": "101"},
+        {"building": "西苑2栋", "buildingid": "102"},
+    ],
+}
+
+LATENCY_DISTRIBUTIONS = ("constant", "exponential", "lognormal")
+
+# 电量低于该值时充值
+RECHARGE_THRESHOLD = 10.0
+# 放电曲线的起点（2024-01-01 00:00 UTC+8），此时每个房间为初始电量
+CURVE_ORIGIN = 1704038400
+
+
+def room_electricity(room_id: str, timestamp: float) -> float:
+    """房间在某一时刻（秒级时间戳）的电量
+
+    每个房间的平均用电速率、初始电量与每次充值的电量由房间号决定；用电速率白天高、
+    凌晨低。电量降到阈值以下时充值若干次，直到回到阈值之上
+    """
+    rng = random.Random(zlib.crc32(room_id.encode()))
+    rate = rng.uniform(0.05, 0.5)  # 度/小时
+    start = rng.uniform(30, 200)
+    amount = rng.choice([30, 50, 100, 200])
+    phase = rng.uniform(0, 2 * math.pi)
+
+    # 用电速率 rate * (1 + 0.6 * sin(ωt + phase)) 从 CURVE_ORIGIN 起的积分
+    hours = (timestamp - CURVE_ORIGIN) / 3600
+    omega = 2 * math.pi / 24
+    used = rate * (
+        hours - 0.6 / omega * (math.cos(omega * hours + phase) - math.cos(phase))
+    )
+
+    value = start - used
+    if value < RECHARGE_THRESHOLD:
+        value += math.ceil((RECHARGE_THRESHOLD - value) / amount) * amount
+    return round(value, 2)
+
+
+@dataclass
+class StubBehavior:
+    """模拟服务器的响应特性
+
+    latency 为平均延迟（秒），lognormal 分布下为中位数，sigma 控制长尾；
+    error_rate 为返回 HTTP 500 的比例，timeout_rate 为等待 timeout 秒后才响应的比例，
+    garbage_rate 为返回无法解析的响应的比例
+    """
+
+    latency: float = 0.0
+    distribution: str = "exponential"
+    sigma: float = 1.0
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    timeout: float = 30.0
+    garbage_rate: float = 0.0
+    speed: float = 1.0
+
+    def __post_init__(self):
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"未知的延迟分布: {self.distribution}")
+        self.started_at = time.time()
+
+    def delay(self) -> float:
+        if self.latency <= 0:
+            return 0.0
+        if self.distribution == "constant":
+            return self.latency
+        if self.distribution == "exponential":
+            return random.expovariate(1 / self.latency)
+        return random.lognormvariate(math.log(self.latency), self.sigma)
+
+    def fault(self) -> Optional[str]:
+        """本次请求要模拟的故障，None 表示正常响应"""
+        r = random.random()
+        for name, rate in (
+            ("error", self.error_rate),
+            ("timeout", self.timeout_rate),
+            ("garbage", self.garbage_rate),
+        ):
+            if r < rate:
+                return name
+            r -= rate
+        return None
+
+    def now(self) -> float:
+        """模拟时间（秒级时间戳）"""
+        real = time.time()
+        return self.started_at + (real - self.started_at) * self.speed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分两次写出，不关闭 Nagle 算法时长连接上每个请求都会多等一次延迟确认
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        funname = form.get("funname", [""])[0]
+        jsondata = json.loads(form.get("jsondata", ["{}"])[0])
+
+        behavior: StubBehavior = self.server.behavior
+        delay = behavior.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        fault = behavior.fault()
+        if fault == "error":
+            self.send_error(500)
+            return
+        if fault == "timeout":
+            time.sleep(behavior.timeout)
+
+        if funname == "synjones.onecard.query.elec.building":
+            aid = jsondata["query_elec_building"]["aid"]
+            body = {"query_elec_building": {"buildingtab": BUILDINGS.get(aid, [])}}
+        elif funname == "synjones.onecard.query.elec.roominfo":
+            room_id = jsondata["query_elec_roominfo"]["room"]["roomid"]
+            value = room_electricity(room_id, behavior.now())
+            # 消息中不包含房间号，避免房间号中的数字被当作电量解析
+            body = {
+                "query_elec_roominfo": {
+                    "error": "0",
+                    "errmsg": f"当前剩余电量{value}度",
+                }
+            }
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body, ensure_ascii=False).encode()
+        if fault == "garbage":
+            payload = b"<html>502 Bad Gateway</html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    behavior: Optional[StubBehavior] = None,
+) -> Tuple[ThreadingHTTPServer, str]:
+    """在后台线程中启动模拟服务器
+
+    只传 latency 时为平均延迟（秒）的指数分布、无故障；需要更多控制时传入 behavior
+    """
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.behavior = behavior or StubBehavior(latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/web/Common/Tsm.html"
+
+
+def add_behavior_arguments(parser):
+    """命令行参数，与 behavior_from_args 配合使用"""
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument(
+        "--distribution", choices=LATENCY_DISTRIBUTIONS, default="exponential"
+    )
+    parser.add_argument("--sigma", type=float, default=1.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--garbage-rate", type=float, default=0.0)
+    parser.add_argument("--speed", type=float, default=1.0)
+
+
+def behavior_from_args(args) -> StubBehavior:
+    return StubBehavior(
+        latency=args.latency,
+        distribution=args.distribution,
+        sigma=args.sigma,
+        error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate,
+        timeout=args.timeout,
+        garbage_rate=args.garbage_rate,
+        speed=args.speed,
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="CSUST 电量接口模拟服务器")
+    parser.add_argument("--port", type=int, default=8988)
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(port=args.port, behavior=behavior_from_args(args))
+    print(f"模拟服务器已启动: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,40 @@
+"""CSUSTElectricityAPI 的请求体构造、响应解析与完整查询"""
+
+import pytest
+from _bootstrap import plugin_module
+from conftest import BUILDING, CAMPUS
+from stub_server import room_electricity
+
+
+@pytest.fixture(scope="module")
+def api(plugin):
+    return plugin_module("csust_api").csust_api
+
+
+@pytest.fixture(scope="module")
+def room(api):
+    module = plugin_module("csust_api")
+    building = api.buildings_cache[CAMPUS][BUILDING]
+    return module.Room(id="A101", building=building)
+
+
+@pytest.mark.benchmark(group="api")
+def test_roominfo_body(benchmark, api, room):
+    body = benchmark(api._roominfo_body, room)
+    assert "A101" in body
+
+
+@pytest.mark.benchmark(group="api")
+def test_parse_electricity(benchmark, api, room):
+    result = {"query_elec_roominfo": {"error": "0", "errmsg": "当前剩余电量42.5度"}}
+    info = benchmark(api._parse_electricity, room, result)
+    assert info.value == 42.5
+
+
+@pytest.mark.benchmark(group="api")
+def test_aget_electricity(benchmark, api, run):
+    """经本地模拟服务器的完整查询，包含 HTTP 往返"""
+    info = benchmark(lambda: run(api.aget_electricity(CAMPUS, BUILDING, "A101")))
+    assert info.value == pytest.approx(
+        room_electricity("A101", info.fetched_at.timestamp()), abs=1
+    )
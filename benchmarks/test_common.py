@@ -0,0 +1,24 @@
+"""校区与楼栋名称校验"""
+
+import pytest
+from _bootstrap import plugin_module
+from conftest import BUILDING, CAMPUS
+
+
+@pytest.mark.benchmark(group="validate")
+@pytest.mark.parametrize(
+    "campus, building, valid",
+    [
+        (CAMPUS, None, True),
+        (CAMPUS, BUILDING, True),
+        (CAMPUS, "不存在的楼栋", False),
+        ("不存在的校区", BUILDING, False),
+    ],
+    ids=["campus", "building", "unknown-building", "unknown-campus"],
+)
+def test_validate_campus_building(benchmark, plugin, run, campus, building, valid):
+    common = plugin_module("utils.common")
+    is_valid, _ = benchmark(
+        lambda: run(common.validate_campus_building(campus, building))
+    )
+    assert is_valid == valid
@@ -0,0 +1,21 @@
+"""图表渲染耗时与图片大小"""
+
+import pytest
+from _bootstrap import plugin_module
+from conftest import BUILDING, CAMPUS, discharge_curve
+
+
+@pytest.mark.benchmark(group="graph")
+@pytest.mark.parametrize(
+    "rows", [1_000, 10_000, 100_000], ids=lambda rows: f"{rows}rows"
+)
+def test_generate_graph(benchmark, plugin, rows):
+    chart = plugin_module("utils.chart")
+    max_points = plugin_module("utils.electricity").config.graph_max_points
+    times, values = discharge_curve(rows)
+
+    image = benchmark(
+        chart.generate_graph, times, values, f"{CAMPUS}-{BUILDING}-A101", max_points
+    )
+    benchmark.extra_info["png_bytes"] = len(image)
+    assert image.startswith(b"\x89PNG")
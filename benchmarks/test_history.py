@@ -0,0 +1,68 @@
+"""电量历史记录的写入与耗尽时间预测"""
+
+import itertools
+
+import pytest
+from _bootstrap import plugin_module
+from conftest import BUILDING, CAMPUS, discharge_curve, insert_history, insert_rooms
+
+
+@pytest.mark.benchmark(group="history")
+def test_update_electricity_history(benchmark, plugin, db, run):
+    electricity = plugin_module("utils.electricity")
+    csust_api = plugin_module("csust_api")
+    room = "H001"
+    (room_id,) = insert_rooms(db, [room])
+    building = csust_api.csust_api.buildings_cache[CAMPUS][BUILDING]
+    # 每次写入的电量都不同，确保每次都插入一条记录
+    values = (200 - i * 0.01 for i in itertools.count())
+
+    def update():
+        info = csust_api.ElectricityInfo(
+            value=round(next(values), 2),
+            room=csust_api.Room(id=room, building=building),
+        )
+        return run(electricity.update_electricity_history(info, CAMPUS, BUILDING, room))
+
+    assert benchmark(update)
+
+
+@pytest.fixture(
+    scope="module", params=[10, 1_000, 100_000], ids=lambda rows: f"{rows}rows"
+)
+def history_room(request, db):
+    rows = request.param
+    room = f"P{rows}"
+    (room_id,) = insert_rooms(db, [room])
+    insert_history(db, room_id, *discharge_curve(rows))
+    return room, room_id
+
+
+@pytest.mark.benchmark(group="predict")
+def test_predict_empty_time(benchmark, history_room, run):
+    """已有放电段累加量时的预测"""
+    history = plugin_module("db.repository").history_repository
+    room, _ = history_room
+    run(history.predict_empty_time(CAMPUS, BUILDING, room))
+
+    result = benchmark(lambda: run(history.predict_empty_time(CAMPUS, BUILDING, room)))
+    assert result is not None
+
+
+@pytest.mark.benchmark(group="predict-rebuild")
+def test_predict_empty_time_rebuild(benchmark, history_room, db, run):
+    """没有累加量时从历史记录重建放电段后预测，耗时随记录数增长"""
+    history = plugin_module("db.repository").history_repository
+    room, room_id = history_room
+    segments = db.DischargeSegment.__table__
+
+    async def drop_segment():
+        async with db.engine.begin() as conn:
+            await conn.execute(segments.delete().where(segments.c.room_id == room_id))
+
+    result = benchmark.pedantic(
+        lambda: run(history.predict_empty_time(CAMPUS, BUILDING, room)),
+        setup=lambda: run(drop_segment()),
+        rounds=10,
+    )
+    assert result is not None
@@ -0,0 +1,27 @@
+"""指标记录与导出的开销"""
+
+import pytest
+from _bootstrap import plugin_module
+
+
+@pytest.mark.benchmark(group="metrics")
+def test_histogram_observe(benchmark, plugin):
+    histogram = plugin_module("utils.metrics").db_query_seconds
+    benchmark(lambda: histogram.labels("get_binding").observe(0.003))
+
+
+@pytest.mark.benchmark(group="metrics")
+def test_histogram_time(benchmark, plugin):
+    histogram = plugin_module("utils.metrics").db_query_seconds
+
+    def timed():
+        with histogram.labels("get_binding").time():
+            pass
+
+    benchmark(timed)
+
+
+@pytest.mark.benchmark(group="metrics")
+def test_render(benchmark, plugin):
+    text = benchmark(plugin_module("utils.metrics").metrics.render)
+    assert "# TYPE csust_electricity_upstream_request_seconds histogram" in text
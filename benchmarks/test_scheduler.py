@@ -0,0 +1,15 @@
+"""启动时加载定时查询"""
+
+import pytest
+from _bootstrap import plugin_module
+from conftest import insert_rooms, insert_schedules
+
+
+@pytest.mark.benchmark(group="scheduler")
+def test_init_scheduler(benchmark, db, run):
+    scheduler = plugin_module("utils.scheduler")
+    (room_id,) = insert_rooms(db, ["S001"])
+    insert_schedules(db, room_id, 10_000)
+
+    benchmark(lambda: run(scheduler.init_scheduler()))
+    assert len(scheduler.schedule_index) == 10_000
@@ -3,9 +3,9 @@ from nonebot.rule import to_me
 from nonebot.adapters.onebot.v11 import Event
 from nonebot.exception import FinishedException
 
-from ..db.electricity_db import ElectricityHistory, SessionLocal
+from ..db.repository import history_repository
 from ..utils.common import get_binding, get_sender_info
-
+from ..utils.electricity import chart_cache
 
 clear_command = on_command("清除历史", rule=to_me())
 
@@ -15,7 +15,7 @@ async def handle_clear(event: Event):
     try:
         sender_type, id = get_sender_info(event)
 
-        binding = get_binding(sender_type, id)
+        binding = await get_binding(sender_type, id)
         if not binding:
             await clear_command.finish(
                 "您还没有绑定宿舍，请先使用命令绑定宿舍\n"
@@ -23,15 +23,10 @@ async def handle_clear(event: Event):
             )
             return
 
-        with SessionLocal() as session:
-            session.query(ElectricityHistory).filter(
-                ElectricityHistory.campus == binding.campus,
-                ElectricityHistory.building == binding.building,
-                ElectricityHistory.room == binding.room,
-            ).delete()
-            session.commit()
+        await history_repository.clear(binding.room_id)
+        await chart_cache.purge([binding.room_id])
 
-            await clear_command.finish("历史电量记录已清除")
+        await clear_command.finish("历史电量记录已清除")
     except FinishedException:
         pass
     except Exception as e:
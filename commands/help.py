@@ -16,7 +16,7 @@ async def handle_help(event: Event):
 如果需要绑定宿舍，可以使用“/绑定 [校区] [宿舍楼] [宿舍号]”进行绑定
 解绑宿舍使用“/解绑”命令
 绑定后可使用“/电量”命令直接查询绑定宿舍的电量
-绑定后可使用“/图表”命令查看电量变化趋势和预测电量耗尽时间
+绑定后可使用“/图表”命令查看电量变化趋势和预测电量耗尽时间，可加时间范围如“/图表 7d”
 绑定后可使用“/定时查询 [时间]”命令设置每天定时查询电量状态
 如果需要取消定时查询，使用“/取消定时查询”命令
 如果需要清除历史记录，使用“/清除历史”命令
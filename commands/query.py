@@ -4,9 +4,9 @@ from nonebot.exception import FinishedException
 from nonebot.params import CommandArg
 from nonebot.rule import to_me
 
-from ..csust_api import csust_api
+from ..utils.catalog import building_catalog
 from ..utils.common import get_binding, get_sender_info, validate_campus_building
-from ..utils.electricity import query_electricity
+from ..utils.electricity import query_electricity, stale_notice
 
 query_command = on_command("电量", rule=to_me())
 
@@ -19,7 +19,7 @@ async def handle_query(event: Event, args: Message = CommandArg()):
         args_text = args.extract_plain_text().strip()
         if not args_text:
             # 绑定宿舍查询
-            binding = get_binding(sender_type, id)
+            binding = await get_binding(sender_type, id)
             if not binding:
                 await query_command.finish(
                     "您还没有绑定宿舍，请先使用命令绑定宿舍\n"
@@ -27,7 +27,7 @@ async def handle_query(event: Event, args: Message = CommandArg()):
                 )
                 return
 
-            electricity_info, empty_time = query_electricity(
+            electricity_info, empty_time = await query_electricity(
                 binding.campus, binding.building, binding.room
             )
 
@@ -37,6 +37,7 @@ async def handle_query(event: Event, args: Message = CommandArg()):
                 f"楼栋：{binding.building}\n"
                 f"房间：{binding.room}\n"
                 f"剩余电量：{electricity_info.value} 度"
+                f"{stale_notice(electricity_info)}"
             )
 
             # 如果有预测结果，添加到消息中
@@ -52,12 +53,12 @@ async def handle_query(event: Event, args: Message = CommandArg()):
                 # 查看校区对应的宿舍楼列表
                 campus = params[0]
 
-                is_valid, error_msg = validate_campus_building(campus)
+                is_valid, error_msg = await validate_campus_building(campus)
                 if not is_valid:
                     await query_command.finish(error_msg)
                     return
 
-                buildings = csust_api.get_buildings(campus)
+                buildings = await building_catalog.get_buildings(campus)
                 message = f"{campus}校区的宿舍楼有：\n"
                 for building in buildings:
                     message += f"{building}\n"
@@ -66,14 +67,17 @@ async def handle_query(event: Event, args: Message = CommandArg()):
                 # 查询特定宿舍电量
                 campus, building, room = params
 
-                is_valid, error_msg = validate_campus_building(campus, building)
+                is_valid, error_msg = await validate_campus_building(campus, building)
                 if not is_valid:
                     await query_command.finish(error_msg)
                     return
 
-                electricity_info, empty_time = query_electricity(campus, building, room)
+                electricity_info, empty_time = await query_electricity(
+                    campus, building, room
+                )
 
                 message = f"{campus}校区 {building} {room} 的剩余电量为：{electricity_info.value}度"
+                message += stale_notice(electricity_info)
 
                 # 如果有预测结果，添加到消息中
                 if empty_time:
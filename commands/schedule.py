@@ -4,12 +4,10 @@ from nonebot.exception import FinishedException
 from nonebot.params import CommandArg
 from nonebot.rule import to_me
 
-from ..db.electricity_db import Schedule, SessionLocal
+from ..db.repository import schedule_repository
 from ..utils.common import get_binding, get_sender_info
-from ..utils.electricity import validate_time_format
-from ..utils.scheduler import add_schedule_job, init_scheduler, remove_schedule_job
-
-init_scheduler()
+from ..utils.electricity import normalize_time_format, validate_time_format
+from ..utils.scheduler import add_schedule_job, remove_schedule_job
 
 schedule_command = on_command("定时查询", rule=to_me())
 cancel_schedule_command = on_command("取消定时查询", rule=to_me())
@@ -32,8 +30,9 @@ async def handle_schedule(event: Event, args: Message = CommandArg()):
                 "时间格式错误，请使用HH:MM格式（例如：08:00，要使用英文冒号）"
             )
             return
+        time_arg = normalize_time_format(time_arg)
 
-        binding = get_binding(sender_type, id)
+        binding = await get_binding(sender_type, id)
         if not binding:
             await schedule_command.finish(
                 "您还没有绑定宿舍，请先使用命令绑定宿舍\n"
@@ -41,30 +40,23 @@ async def handle_schedule(event: Event, args: Message = CommandArg()):
             )
             return
 
-        with SessionLocal() as session:
-            existing_schedule = (
-                session.query(Schedule)
-                .filter(Schedule.binding_id == binding.id)
-                .first()
+        existing_schedule = await schedule_repository.get_by_binding(binding.id)
+
+        if existing_schedule:
+            await schedule_command.finish(
+                f"您已设置了定时查询：{existing_schedule.schedule_time}\n"
+                f"如需修改，请先取消现有定时查询"
             )
+            return
 
-            if existing_schedule:
-                await schedule_command.finish(
-                    f"您已设置了定时查询：{existing_schedule.schedule_time}\n"
-                    f"如需修改，请先取消现有定时查询"
-                )
-                return
+        await schedule_repository.create(binding.id, time_arg)
 
-            new_schedule = Schedule(binding_id=binding.id, schedule_time=time_arg)
-            session.add(new_schedule)
-            session.commit()
+        # 添加定时任务
+        add_schedule_job(binding.id, time_arg)
 
-            # 添加定时任务
-            add_schedule_job(binding.id, time_arg)
-
-            await schedule_command.finish(
-                f"定时查询设置成功，将在每天 {time_arg} 自动查询电量"
-            )
+        await schedule_command.finish(
+            f"定时查询设置成功，将在每天 {time_arg} 自动查询电量"
+        )
 
     except FinishedException:
         pass
@@ -77,29 +69,23 @@ async def handle_cancel_schedule(event: Event, args: Message = CommandArg()):
     try:
         sender_type, id = get_sender_info(event)
 
-        binding = get_binding(sender_type, id)
+        binding = await get_binding(sender_type, id)
         if not binding:
             await cancel_schedule_command.finish("您还没有绑定宿舍，无法取消定时查询")
             return
 
-        with SessionLocal() as session:
-            schedule = (
-                session.query(Schedule)
-                .filter(Schedule.binding_id == binding.id)
-                .first()
-            )
+        schedule = await schedule_repository.get_by_binding(binding.id)
 
-            if not schedule:
-                await cancel_schedule_command.finish("您没有设置定时查询")
-                return
+        if not schedule:
+            await cancel_schedule_command.finish("您没有设置定时查询")
+            return
 
-            # 移除定时任务
-            remove_schedule_job(binding.id)
+        # 移除定时任务
+        remove_schedule_job(binding.id)
 
-            session.delete(schedule)
-            session.commit()
+        await schedule_repository.delete_by_binding(binding.id)
 
-            await cancel_schedule_command.finish("定时查询已取消")
+        await cancel_schedule_command.finish("定时查询已取消")
 
     except FinishedException:
         pass
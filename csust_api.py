@@ -1,10 +1,19 @@
+import asyncio
 import json
+import random
 import re
-from dataclasses import dataclass
-from typing import Dict, List
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import quote_plus, urlencode
 
-import requests
-from nonebot import logger
+import httpx
+from nonebot import get_plugin_config, logger
+
+from .config import Config
+from .utils.circuit_breaker import CircuitBreaker, CircuitOpenError, RetryBudget
+from .utils.metrics import metrics, upstream_errors, upstream_request_seconds
+from .utils.rate_limit import TokenBucket
 
 
 @dataclass
@@ -36,11 +45,13 @@ class ElectricityInfo:
     value: float
     room: Room
     raw_message: str = ""
+    # 读数获取时间；stale 为 True 时是上游不可用时从历史记录取出的旧读数
+    fetched_at: datetime = field(default_factory=datetime.now)
+    stale: bool = False
+
 
-proxies = {
-    "http": None,
-    "https": None,
-}
+# (校区, 楼栋, 房间号)
+RoomKey = Tuple[str, str, str]
 
 
 class CSUSTElectricityAPI:
@@ -49,199 +60,369 @@ class CSUSTElectricityAPI:
 
     CAMPUS_MAP = {"云塘": "0030000000002501", "金盆岭": "0030000000002502"}
 
-    def __init__(self):
+    ROOM_PLACEHOLDER = "__ROOM_ID__"
+
+    BUILDING_FUNNAME = "synjones.onecard.query.elec.building"
+    ROOMINFO_FUNNAME = "synjones.onecard.query.elec.roominfo"
+
+    def __init__(
+        self,
+        query_url: Optional[str] = None,
+        pool_size: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        keepalive_expiry: float = 30.0,
+        max_concurrency: int = 8,
+        rate_limit: float = 0.0,
+        max_retries: int = 2,
+        retry_backoff: float = 0.5,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ):
         self.campuses: Dict[str, Campus] = {
             name: Campus(name=name, id=campus_id)
             for name, campus_id in self.CAMPUS_MAP.items()
         }
         self.buildings_cache: Dict[str, Dict[str, Building]] = {}
 
+        self.query_url = query_url or self.QUERY_URL
+        self.limits = httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+
+        self._async_client: Optional[httpx.AsyncClient] = None
+
+        # 对上游服务器的并发数与请求速率限制
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = TokenBucket(rate_limit)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        # 上游故障时的熔断与重试
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+
+        # 按楼栋预先序列化的房间查询请求体，每次查询只需填入房间号
+        self._roominfo_templates: Dict[Tuple[str, str], List[str]] = {}
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        # 长连接复用，trust_env=False 与原先禁用代理的行为保持一致
+        if self._async_client is None or self._async_client.is_closed:
+            self._async_client = httpx.AsyncClient(
+                headers=self.HEADERS,
+                limits=self.limits,
+                timeout=self.timeout,
+                trust_env=False,
+            )
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    @staticmethod
+    def _encode(funname: str, jsondata: dict) -> str:
+        return urlencode(
+            {"jsondata": json.dumps(jsondata), "funname": funname, "json": "true"}
+        )
+
+    async def _apost_once(self, body: str, funname: str) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        try:
+            async with self._semaphore:
+                await self.rate_limiter.acquire()
+                with upstream_request_seconds.labels(funname).time():
+                    response = await self.async_client.post(
+                        self.query_url, content=body
+                    )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPError as e:
+            raise ConnectionError(f"连接服务器失败: {e}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"解析服务器响应失败: {e}")
+
+    async def _apost(self, body: str, funname: str) -> dict:
+        """经熔断器发出请求，连接失败时在重试预算内按指数退避重试"""
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            try:
+                self.circuit_breaker.check()
+            except CircuitOpenError:
+                upstream_errors.labels(funname, "circuit_open").inc()
+                raise
+            try:
+                result = await self._apost_once(body, funname)
+            except ConnectionError:
+                upstream_errors.labels(funname, "connection").inc()
+                self.circuit_breaker.record(failed=True)
+                attempt += 1
+                if attempt > self.max_retries or not self.retry_budget.try_retry():
+                    raise
+            except ValueError:
+                # 响应无法解析同样说明上游异常，但重试通常无济于事
+                upstream_errors.labels(funname, "invalid_response").inc()
+                self.circuit_breaker.record(failed=True)
+                raise
+            else:
+                self.circuit_breaker.record(failed=False)
+                return result
+
+            # 全抖动退避，避免大量请求同时重试
+            await asyncio.sleep(
+                random.uniform(0, self.retry_backoff * 2 ** (attempt - 1))
+            )
+
     def get_campuses(self) -> List[Campus]:
         return list(self.campuses.values())
 
     def get_campus_names(self) -> List[str]:
         return list(self.campuses.keys())
 
-    def get_buildings(self, campus_name: str) -> Dict[str, Building]:
+    def _get_campus(self, campus_name: str) -> Campus:
         if campus_name not in self.campuses:
             raise ValueError(
                 f"无效的校区名称: {campus_name}，可用校区: {', '.join(self.get_campus_names())}"
             )
+        return self.campuses[campus_name]
+
+    @staticmethod
+    def _building_query(campus: Campus) -> dict:
+        return {
+            "query_elec_building": {
+                "aid": campus.id,
+                "account": "000001",
+                "area": {
+                    "area": campus.display_name,
+                    "areaname": campus.display_name,
+                },
+            }
+        }
 
-        campus = self.campuses[campus_name]
-
-        if campus_name in self.buildings_cache:
-            return self.buildings_cache[campus_name]
+    def _parse_buildings(self, campus: Campus, result: dict) -> Dict[str, Building]:
+        if "query_elec_building" not in result:
+            raise ValueError(f"API返回数据格式错误: {result}")
 
-        data = {
-            "jsondata": {
-                "query_elec_building": {
-                    "aid": campus.id,
-                    "account": "000001",
-                    "area": {
-                        "area": campus.display_name,
-                        "areaname": campus.display_name,
-                    },
-                }
-            },
-            "funname": "synjones.onecard.query.elec.building",
-            "json": "true",
-        }
+        building_info = result.get("query_elec_building", {}).get("buildingtab", [])
 
-        try:
-            response = requests.post(
-                self.QUERY_URL,
-                headers=self.HEADERS,
-                data={
-                    "jsondata": json.dumps(data["jsondata"]),
-                    "funname": data["funname"],
-                    "json": data["json"],
-                },
-                proxies=proxies
+        building_dict = {}
+        for item in building_info:
+            building = Building(
+                name=item["building"], id=item["buildingid"], campus=campus
             )
-            response.raise_for_status()
-            result = response.json()
-
-            if "query_elec_building" not in result:
-                raise ValueError(f"API返回数据格式错误: {result}")
+            building_dict[building.name] = building
 
-            building_info = result.get("query_elec_building", {}).get("buildingtab", [])
+        if not building_dict:
+            raise ValueError(f"未能获取到{campus.name}校区的楼栋信息")
 
-            building_dict = {}
-            for item in building_info:
-                building = Building(
-                    name=item["building"], id=item["buildingid"], campus=campus
-                )
-                building_dict[building.name] = building
+        sorted_buildings = {
+            k: v
+            for k, v in sorted(building_dict.items(), key=lambda item: int(item[1].id))
+        }
 
-            if not building_dict:
-                raise ValueError(f"未能获取到{campus_name}校区的楼栋信息")
+        self.buildings_cache[campus.name] = sorted_buildings
+        logger.info(
+            f"成功获取到{campus.name}校区的楼栋信息，共 {len(sorted_buildings)} 个楼栋"
+        )
+        return sorted_buildings
 
-            sorted_buildings = {
-                k: v
-                for k, v in sorted(
-                    building_dict.items(), key=lambda item: int(item[1].id)
-                )
-            }
+    async def aget_buildings(
+        self, campus_name: str, refresh: bool = False
+    ) -> Dict[str, Building]:
+        campus = self._get_campus(campus_name)
 
-            self.buildings_cache[campus_name] = sorted_buildings
-            logger.info(
-                f"成功获取到{campus_name}校区的楼栋信息，共 {len(sorted_buildings)} 个楼栋"
-            )
-            return sorted_buildings
+        if not refresh and campus_name in self.buildings_cache:
+            return self.buildings_cache[campus_name]
 
-        except requests.exceptions.RequestException as e:
-            raise ConnectionError(f"连接服务器失败: {e}")
-        except json.JSONDecodeError as e:
-            raise ValueError(f"解析服务器响应失败: {e}")
+        result = await self._apost(
+            self._encode(self.BUILDING_FUNNAME, self._building_query(campus)),
+            self.BUILDING_FUNNAME,
+        )
+        return self._parse_buildings(campus, result)
 
-    def get_all_buildings(self) -> Dict[str, Dict[str, Building]]:
+    async def aget_all_buildings(self) -> Dict[str, Dict[str, Building]]:
         result = {}
         for campus_name in self.campuses:
-            result[campus_name] = self.get_buildings(campus_name)
+            result[campus_name] = await self.aget_buildings(campus_name)
         return result
 
-    def get_electricity(
-        self, campus_name: str, building_name: str, room_id: str
-    ) -> ElectricityInfo:
-        if campus_name not in self.campuses:
-            raise ValueError(
-                f"无效的校区名称: {campus_name}，可用校区: {', '.join(self.get_campus_names())}"
-            )
-
-        campus = self.campuses[campus_name]
-
-        buildings = self.get_buildings(campus_name)
-
+    @staticmethod
+    def _resolve_room(
+        buildings: Dict[str, Building], building_name: str, room_id: str
+    ) -> Room:
         if building_name not in buildings:
             raise ValueError(
                 f"无效的楼栋名称: {building_name}，可用楼栋: {', '.join(buildings.keys())}"
             )
 
-        building = buildings[building_name]
-
         if not room_id or not isinstance(room_id, str):
             raise ValueError("房间号不能为空且必须是字符串")
 
-        room = Room(id=room_id, building=building)
-
-        query_params = {
-            "jsondata": {
-                "query_elec_roominfo": {
-                    "aid": campus.id,
-                    "account": "000001",
-                    "room": {"roomid": room_id, "room": room_id},
-                    "floor": {"floorid": "", "floor": ""},
-                    "area": {
-                        "area": campus.display_name,
-                        "areaname": campus.display_name,
-                    },
-                    "building": {"buildingid": building.id, "building": ""},
-                }
-            },
-            "funname": "synjones.onecard.query.elec.roominfo",
-            "json": "true",
-        }
-
-        try:
-            encoded_data = {
-                "jsondata": json.dumps(query_params["jsondata"]),
-                "funname": query_params["funname"],
-                "json": query_params["json"],
+        return Room(id=room_id, building=buildings[building_name])
+
+    @staticmethod
+    def _roominfo_query(building: Building, room_id: str) -> dict:
+        campus = building.campus
+        return {
+            "query_elec_roominfo": {
+                "aid": campus.id,
+                "account": "000001",
+                "room": {"roomid": room_id, "room": room_id},
+                "floor": {"floorid": "", "floor": ""},
+                "area": {
+                    "area": campus.display_name,
+                    "areaname": campus.display_name,
+                },
+                "building": {"buildingid": building.id, "building": ""},
             }
-            response = requests.post(
-                self.QUERY_URL, headers=self.HEADERS, data=encoded_data, proxies=proxies
-            )
-            response.raise_for_status()
-
-            result = response.json()
-
-            if "query_elec_roominfo" not in result:
-                raise ValueError(f"API返回数据格式错误: {result}")
-
-            info = result.get("query_elec_roominfo", {})
-
-            if "error" in info and info["error"] != "0":
-                error_msg = info.get("errmsg", "未知错误")
-                raise ValueError(f"查询失败: {error_msg}")
-
-            electricity_msg: str = info.get("errmsg", "")
-
-            if not electricity_msg:
-                raise ValueError("未返回电量信息")
+        }
 
-            match = re.search(r"(\d+(\.\d+)?)", electricity_msg)
-            if not match:
-                raise ValueError(f"无法从返回结果中解析电量数值: {electricity_msg}")
+    def _roominfo_body(self, room: Room) -> str:
+        building = room.building
+        key = (building.campus.id, building.id)
+        parts = self._roominfo_templates.get(key)
+        if parts is None:
+            # 用占位符生成一次完整的请求体，之后按占位符切开复用
+            parts = self._encode(
+                self.ROOMINFO_FUNNAME,
+                self._roominfo_query(building, self.ROOM_PLACEHOLDER),
+            ).split(self.ROOM_PLACEHOLDER)
+            self._roominfo_templates[key] = parts
 
-            electricity_value = float(match.group())
+        # 房间号需要与 json.dumps + urlencode 的转义结果一致
+        encoded_room = quote_plus(json.dumps(room.id)[1:-1])
+        return encoded_room.join(parts)
 
-            return ElectricityInfo(
-                value=electricity_value, room=room, raw_message=electricity_msg
-            )
+    @staticmethod
+    def _parse_electricity(room: Room, result: dict) -> ElectricityInfo:
+        if "query_elec_roominfo" not in result:
+            raise ValueError(f"API返回数据格式错误: {result}")
 
-        except requests.exceptions.RequestException as e:
-            raise ConnectionError(f"连接服务器失败: {e}")
-        except json.JSONDecodeError as e:
-            raise ValueError(f"解析服务器响应失败: {e}")
+        info = result.get("query_elec_roominfo", {})
 
+        if "error" in info and info["error"] != "0":
+            error_msg = info.get("errmsg", "未知错误")
+            raise ValueError(f"查询失败: {error_msg}")
 
-csust_api = CSUSTElectricityAPI()
+        electricity_msg: str = info.get("errmsg", "")
 
+        if not electricity_msg:
+            raise ValueError("未返回电量信息")
 
-if __name__ == "__main__":
-    api = CSUSTElectricityAPI()
+        match = re.search(r"(\d+(\.\d+)?)", electricity_msg)
+        if not match:
+            raise ValueError(f"无法从返回结果中解析电量数值: {electricity_msg}")
 
-    campuses = api.get_campuses()
-    logger.info(f"可用校区: {[campus.name for campus in campuses]}")
+        electricity_value = float(match.group())
 
-    for campus in campuses:
-        buildings = api.get_buildings(campus.name)
-        logger.info(f"{campus.name}校区楼栋: {list(buildings.keys())}")
+        return ElectricityInfo(
+            value=electricity_value, room=room, raw_message=electricity_msg
+        )
 
-    try:
-        info = api.get_electricity("云塘", "至诚轩5栋A区", "A544")
-        logger.info(f"房间 {info.room.id} 电量: {info.value} 度")
-        logger.info(f"原始消息: {info.raw_message}")
-    except Exception as e:
-        logger.error(f"查询失败: {e}")
+    async def aget_electricity(
+        self, campus_name: str, building_name: str, room_id: str
+    ) -> ElectricityInfo:
+        self._get_campus(campus_name)
+        room = self._resolve_room(
+            await self.aget_buildings(campus_name), building_name, room_id
+        )
+
+        return await self._afetch_room(room)
+
+    async def _afetch_room(self, room: Room) -> ElectricityInfo:
+        result = await self._apost(self._roominfo_body(room), self.ROOMINFO_FUNNAME)
+        return self._parse_electricity(room, result)
+
+    async def aget_electricity_many(
+        self, rooms: Iterable[RoomKey]
+    ) -> Dict[RoomKey, Union[ElectricityInfo, Exception]]:
+        """批量查询多个宿舍的电量
+
+        每个校区的楼栋信息只获取一次，重复的宿舍只查询一次；
+        并发数与速率受实例的上游限制约束。单个宿舍失败时对应的值为异常对象，
+        不影响其他宿舍的结果
+        """
+        results: Dict[RoomKey, Union[ElectricityInfo, Exception]] = {}
+        resolved: Dict[RoomKey, Room] = {}
+        buildings: Dict[str, Union[Dict[str, Building], Exception]] = {}
+
+        for key in dict.fromkeys(rooms):
+            campus_name, building_name, room_id = key
+            if campus_name not in buildings:
+                try:
+                    buildings[campus_name] = await self.aget_buildings(campus_name)
+                except Exception as e:
+                    buildings[campus_name] = e
+
+            campus_buildings = buildings[campus_name]
+            if isinstance(campus_buildings, Exception):
+                results[key] = campus_buildings
+                continue
+            try:
+                resolved[key] = self._resolve_room(
+                    campus_buildings, building_name, room_id
+                )
+            except ValueError as e:
+                results[key] = e
+
+        fetched = await asyncio.gather(
+            *(self._afetch_room(room) for room in resolved.values()),
+            return_exceptions=True,
+        )
+        results.update(zip(resolved.keys(), fetched))
+        return results
+
+
+plugin_config = get_plugin_config(Config).csust_electricity
+
+csust_api = CSUSTElectricityAPI(
+    query_url=plugin_config.api_url,
+    pool_size=plugin_config.http_pool_size,
+    connect_timeout=plugin_config.http_connect_timeout,
+    read_timeout=plugin_config.http_read_timeout,
+    keepalive_expiry=plugin_config.http_keepalive_expiry,
+    max_concurrency=plugin_config.upstream_concurrency,
+    rate_limit=plugin_config.upstream_rate_limit,
+    max_retries=plugin_config.upstream_max_retries,
+    retry_backoff=plugin_config.upstream_retry_backoff,
+    circuit_breaker=CircuitBreaker(
+        failure_rate=plugin_config.upstream_breaker_failure_rate,
+        min_requests=plugin_config.upstream_breaker_min_requests,
+        window=plugin_config.upstream_breaker_window,
+        open_timeout=plugin_config.upstream_breaker_open_timeout,
+        half_open_probes=plugin_config.upstream_breaker_probes,
+    ),
+    retry_budget=RetryBudget(ratio=plugin_config.upstream_retry_budget),
+)
+
+metrics.gauge(
+    "upstream_circuit_state",
+    "上游熔断器当前状态，当前状态为 1，其余为 0",
+    ("state",),
+    callback=lambda: {
+        (state,): int(csust_api.circuit_breaker.state == state)
+        for state in (
+            CircuitBreaker.CLOSED,
+            CircuitBreaker.OPEN,
+            CircuitBreaker.HALF_OPEN,
+        )
+    },
+)
+metrics.counter(
+    "upstream_circuit_events_total",
+    "上游熔断器打开次数（opened）与熔断期间被拒绝的请求数（rejected）",
+    ("event",),
+    callback=lambda: {
+        ("opened",): csust_api.circuit_breaker.opened,
+        ("rejected",): csust_api.circuit_breaker.rejected,
+    },
+)
@@ -1,25 +1,45 @@
+import os
+import re
 import uuid
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Union
 
 from nonebot import get_plugin_config
+from nonebot.log import logger
 from sqlalchemy import (
     CheckConstraint,
     Column,
     DateTime,
     Float,
     ForeignKey,
+    Index,
+    Integer,
     String,
     UniqueConstraint,
-    create_engine,
+    event,
+    inspect,
+    text,
 )
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import declarative_base, declared_attr, relationship
 
 from ..config import Config
 
 Base = declarative_base()
 
 
+class Room(Base):
+    __tablename__ = "rooms"
+
+    id: int = Column(Integer, primary_key=True, autoincrement=True, comment="主键")
+    campus: str = Column(String(50), nullable=False, comment="校区名称")
+    building: str = Column(String(50), nullable=False, comment="楼栋名称")
+    room: str = Column(String(20), nullable=False, comment="房间号")
+
+    __table_args__ = (UniqueConstraint("campus", "building", "room", name="uq_room"),)
+
+
 class Binding(Base):
     __tablename__ = "bindings"
 
@@ -31,14 +51,28 @@ class Binding(Base):
     )
     qq_number: Optional[str] = Column(String(20), nullable=True, comment="QQ号")
     group_number: Optional[str] = Column(String(20), nullable=True, comment="群号")
-    campus = Column(String(50), nullable=False, comment="校区名称")
-    building = Column(String(50), nullable=False, comment="楼栋名称")
-    room = Column(String(20), nullable=False, comment="房间号")
+    room_id: int = Column(
+        Integer, ForeignKey("rooms.id"), nullable=False, comment="宿舍ID"
+    )
 
+    # 绑定对象通常在会话关闭后使用，宿舍信息随绑定一起加载
+    location = relationship("Room", lazy="joined")
     schedules = relationship(
         "Schedule", back_populates="binding", cascade="all, delete-orphan"
     )
 
+    @property
+    def campus(self) -> str:
+        return self.location.campus
+
+    @property
+    def building(self) -> str:
+        return self.location.building
+
+    @property
+    def room(self) -> str:
+        return self.location.room
+
     __table_args__ = (
         CheckConstraint(
             "qq_number IS NOT NULL OR group_number IS NOT NULL",
@@ -74,38 +108,300 @@ class Schedule(Base):
     binding = relationship("Binding", back_populates="schedules")
 
 
+class CatalogBuilding(Base):
+    __tablename__ = "building_catalog"
+
+    campus = Column(String(50), primary_key=True, comment="校区名称")
+    name = Column(String(50), primary_key=True, comment="楼栋名称")
+    building_id = Column(String(20), nullable=False, comment="楼栋ID")
+    fetched_at: datetime = Column(
+        DateTime, nullable=False, default=datetime.now, comment="获取时间"
+    )
+
+
 class ElectricityHistory(Base):
     __tablename__ = "electricity_history"
 
-    id: str = Column(
-        String(36),
-        primary_key=True,
-        default=lambda: str(uuid.uuid4()),
-        comment="主键UUID",
+    id: int = Column(Integer, primary_key=True, autoincrement=True, comment="主键")
+    room_id: int = Column(
+        Integer,
+        ForeignKey("rooms.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="宿舍ID",
     )
     record_time: datetime = Column(DateTime, default=datetime.now, comment="记录时间")
     electricity: float = Column(Float, nullable=False, comment="电量值")
-    campus = Column(String(50), nullable=False, comment="校区名称")
-    building = Column(String(50), nullable=False, comment="楼栋名称")
-    room = Column(String(20), nullable=False, comment="房间号")
 
+    __table_args__ = (
+        Index("ix_electricity_history_room_time", "room_id", "record_time"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class RollupMixin:
+    """按时间段汇总的电量记录，用于替代超过保留期的原始记录"""
+
+    @declared_attr
+    def room_id(cls):
+        return Column(
+            Integer,
+            ForeignKey("rooms.id", ondelete="CASCADE"),
+            primary_key=True,
+            comment="宿舍ID",
+        )
+
+    bucket_start = Column(DateTime, primary_key=True, comment="时间段起点")
+    first_time = Column(DateTime, nullable=False, comment="第一条记录时间")
+    first_value = Column(Float, nullable=False, comment="第一条记录电量")
+    last_time = Column(DateTime, nullable=False, comment="最后一条记录时间")
+    last_value = Column(Float, nullable=False, comment="最后一条记录电量")
+    min_value = Column(Float, nullable=False, comment="最低电量")
+    max_value = Column(Float, nullable=False, comment="最高电量")
+    consumption = Column(Float, nullable=False, comment="用电量（电量下降之和）")
+    recharges = Column(Integer, nullable=False, comment="充值次数（电量上升次数）")
+    samples = Column(Integer, nullable=False, comment="汇总的原始记录数")
+
+
+class HourlyRollup(RollupMixin, Base):
+    __tablename__ = "electricity_hourly"
+
+    @staticmethod
+    def truncate(value: datetime) -> datetime:
+        return value.replace(minute=0, second=0, microsecond=0)
 
-config = get_plugin_config(Config)
-database_path = config.csust_electricity.data_storage_path
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{database_path}/electricity.db"
 
-engine = create_engine(
+class DailyRollup(RollupMixin, Base):
+    __tablename__ = "electricity_daily"
+
+    @staticmethod
+    def truncate(value: datetime) -> datetime:
+        return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class DischargeSegment(Base):
+    """宿舍当前放电段的线性回归累加量
+
+    时间以放电段起点为原点（秒），避免时间戳平方后损失精度
+    """
+
+    __tablename__ = "discharge_segments"
+
+    room_id: int = Column(
+        Integer,
+        ForeignKey("rooms.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="宿舍ID",
+    )
+    start_time: datetime = Column(DateTime, nullable=False, comment="放电段起点时间")
+    last_value: float = Column(Float, nullable=False, comment="最近一次电量值")
+    n: int = Column(Integer, nullable=False, comment="样本数")
+    sum_t: float = Column(Float, nullable=False, comment="Σt")
+    sum_v: float = Column(Float, nullable=False, comment="Σv")
+    sum_tt: float = Column(Float, nullable=False, comment="Σt²")
+    sum_tv: float = Column(Float, nullable=False, comment="Σtv")
+
+    def reset(self, record_time: datetime, value: float):
+        self.start_time = record_time
+        self.n = 0
+        self.sum_t = self.sum_v = self.sum_tt = self.sum_tv = 0.0
+        self.add(record_time, value)
+
+    def add(self, record_time: datetime, value: float):
+        t = (record_time - self.start_time).total_seconds()
+        self.n += 1
+        self.sum_t += t
+        self.sum_v += value
+        self.sum_tt += t * t
+        self.sum_tv += t * value
+        self.last_value = value
+
+    def push(self, record_time: datetime, value: float):
+        """加入一条新读数，电量上升说明充值了，重新开始一段"""
+        if not self.n or value > self.last_value:
+            self.reset(record_time, value)
+        else:
+            self.add(record_time, value)
+
+    def predict_empty_time(self) -> Optional[datetime]:
+        if self.n < 2:
+            return None
+
+        denominator = self.n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 0:
+            return None
+
+        m = (self.n * self.sum_tv - self.sum_t * self.sum_v) / denominator
+        # 如果斜率为正或为零，则电量在增加，不需要预测
+        if m >= 0:
+            return None
+
+        b = (self.sum_v - m * self.sum_t) / self.n
+        return self.start_time + timedelta(seconds=-b / m)
+
+
+SQLITE_PROFILES: Dict[str, Dict[str, Union[int, str]]] = {
+    # SQLite 默认设置：回滚日志，读写互相阻塞
+    "default": {},
+    # WAL 模式下读写互不阻塞，synchronous=NORMAL 只在检查点时同步，
+    # 断电可能丢失最后几个事务但不会损坏数据库
+    "balanced": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 64 * 1024 * 1024,
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+    },
+    # 每次提交都同步到磁盘
+    "durable": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "temp_store": "MEMORY",
+    },
+}
+
+PRAGMA_NAME_PATTERN = re.compile(r"^\w+$")
+PRAGMA_VALUE_PATTERN = re.compile(r"^-?\w+$")
+
+
+def sqlite_pragmas(
+    profile: str, overrides: Optional[Dict[str, Union[int, str]]] = None
+) -> Dict[str, Union[int, str]]:
+    """参数方案与单项覆盖合并后的 PRAGMA"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"无效的 SQLite 参数方案: {profile}，可用方案: {', '.join(SQLITE_PROFILES)}"
+        )
+
+    pragmas = {**SQLITE_PROFILES[profile], **(overrides or {})}
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME_PATTERN.match(name) or not PRAGMA_VALUE_PATTERN.match(
+            str(value)
+        ):
+            raise ValueError(f"无效的 PRAGMA 设置: {name}={value}")
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine: Engine, pragmas: Dict[str, Union[int, str]]):
+    """在每个新建的数据库连接上执行 PRAGMA"""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def database_url(data_storage_path: str, url: str = "") -> str:
+    """未配置数据库地址时使用数据存储路径下的 SQLite 数据库"""
+    if url:
+        return url
+    os.makedirs(data_storage_path, exist_ok=True)
+    return f"sqlite+aiosqlite:///{data_storage_path}/electricity.db"
+
+
+config = get_plugin_config(Config).csust_electricity
+SQLALCHEMY_DATABASE_URL = database_url(config.data_storage_path, config.database_url)
+
+engine = create_async_engine(
     SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    connect_args=(
+        {"check_same_thread": False}
+        if SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+        else {}
+    ),
     echo=False,
 )
+apply_sqlite_pragmas(
+    engine.sync_engine,
+    sqlite_pragmas(config.sqlite_profile, config.sqlite_pragmas),
+)
+
+# 会话关闭后仍会使用查询到的对象，提交时不让属性过期
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+def _migrate_room_keys(conn: Connection):
+    """将旧版按字符串保存宿舍信息的表迁移为引用 rooms 表的整数键"""
+    logger.info("正在迁移数据库: 规范化宿舍信息到 rooms 表...")
+    # 重命名旧表时不改写 schedules 对 bindings 的外键引用
+    conn.execute(text("PRAGMA legacy_alter_table=ON"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_electricity_history_room_time"))
+    conn.execute(text("ALTER TABLE bindings RENAME TO bindings_legacy"))
+    conn.execute(
+        text("ALTER TABLE electricity_history RENAME TO electricity_history_legacy")
+    )
+
+    Base.metadata.create_all(bind=conn)
+
+    conn.execute(
+        text(
+            "INSERT OR IGNORE INTO rooms (campus, building, room) "
+            "SELECT campus, building, room FROM bindings_legacy "
+            "UNION SELECT campus, building, room FROM electricity_history_legacy"
+        )
+    )
+    conn.execute(
+        text(
+            "INSERT INTO bindings (id, qq_number, group_number, room_id) "
+            "SELECT b.id, b.qq_number, b.group_number, r.id "
+            "FROM bindings_legacy b JOIN rooms r "
+            "ON r.campus = b.campus AND r.building = b.building AND r.room = b.room"
+        )
+    )
+    conn.execute(
+        text(
+            "INSERT INTO electricity_history (room_id, record_time, electricity) "
+            "SELECT r.id, h.record_time, h.electricity "
+            "FROM electricity_history_legacy h JOIN rooms r "
+            "ON r.campus = h.campus AND r.building = h.building AND r.room = h.room "
+            "ORDER BY r.id, h.record_time"
+        )
+    )
+
+    conn.execute(text("DROP TABLE bindings_legacy"))
+    conn.execute(text("DROP TABLE electricity_history_legacy"))
+    conn.execute(text("PRAGMA legacy_alter_table=OFF"))
+
+
+def migrate_db(conn: Connection) -> bool:
+    """迁移旧版数据库结构，并为已存在的数据库补齐新增的索引
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    返回是否迁移了旧版结构（需要回收空间）
+    """
+    inspector = inspect(conn)
+    history_columns = {
+        column["name"] for column in inspector.get_columns("electricity_history")
+    }
+    # 旧版结构只可能出现在 SQLite 数据库中
+    migrated = "campus" in history_columns
+    if migrated:
+        _migrate_room_keys(conn)
+        inspector = inspect(conn)
 
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logger.info(f"正在为 {table.name} 创建索引 {index.name}...")
+                index.create(bind=conn)
+    return migrated
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
 
+async def init_db():
+    """创建缺少的表并迁移旧版数据库，需要在使用数据库前调用一次"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        migrated = await conn.run_sync(migrate_db)
 
-if __name__ == "__main__":
-    init_db()
+    if migrated:
+        # 回收旧表占用的空间
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM"))
+        logger.info("数据库迁移完成")
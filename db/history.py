@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from sqlalchemy import Float, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from .electricity_db import DailyRollup, ElectricityHistory, HourlyRollup
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# 历史记录中的时间均为不带时区的本地时间，数组中的时间戳按「把本地时间当作 UTC」换算，
+# 只用于计算时间差与绘图，换算回 datetime 时请使用 from_epoch
+EPOCH = datetime(1970, 1, 1)
+
+
+class epoch_seconds(FunctionElement):
+    """在数据库中把时间列换算为秒级时间戳，避免逐行构造 datetime 对象
+
+    SQLite 的 julianday 精度为毫秒，对拟合与绘图已经足够
+    """
+
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(epoch_seconds)
+def _compile_epoch_seconds(element, compiler, **kw):
+    return f"EXTRACT(EPOCH FROM {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(epoch_seconds, "sqlite")
+def _compile_epoch_seconds_sqlite(element, compiler, **kw):
+    return (
+        f"((julianday({compiler.process(element.clauses, **kw)}) - 2440587.5)"
+        " * 86400.0)"
+    )
+
+
+def to_epoch(value: datetime) -> float:
+    return (value - EPOCH).total_seconds()
+
+
+def from_epoch(seconds: float) -> datetime:
+    return EPOCH + timedelta(seconds=float(seconds))
+
+
+def _load_rollup_points(
+    session: Session, model, room_id: int, since: Optional[datetime]
+) -> "np.ndarray":
+    """把汇总记录展开为每段的第一条与最后一条读数"""
+    import numpy as np
+
+    stmt = (
+        select(
+            epoch_seconds(model.first_time),
+            model.first_value,
+            epoch_seconds(model.last_time),
+            model.last_value,
+        )
+        .where(model.room_id == room_id)
+        .order_by(model.bucket_start)
+    )
+    if since is not None:
+        stmt = stmt.where(model.last_time >= since)
+
+    rows = np.array(session.execute(stmt).all(), dtype=np.float64).reshape(-1, 4)
+    points = rows.reshape(-1, 2)
+    # 只有一条记录的时间段不重复输出
+    keep = np.ones(len(points), dtype=bool)
+    keep[1::2] = rows[:, 2] != rows[:, 0]
+    if since is not None:
+        keep &= points[:, 0] >= to_epoch(since)
+    return points[keep]
+
+
+def load_history_arrays(
+    session: Session,
+    room_id: int,
+    since: Optional[datetime] = None,
+    chunk_size: int = 10000,
+) -> Tuple["np.ndarray", "np.ndarray"]:
+    """按时间顺序读取宿舍的 (时间戳, 电量) 数组
+
+    原始记录只查询两列并分块流式读取；超过保留期的部分来自按天、按小时汇总的记录，
+    各层记录的时间互不重叠，按从旧到新的顺序拼接即可。直接返回连续的 float64 数组
+    """
+    # numpy 只在第一次读取历史数组（/图表 或重建预测累加量）时导入，不拖慢插件启动
+    import numpy as np
+
+    chunks = [
+        _load_rollup_points(session, DailyRollup, room_id, since),
+        _load_rollup_points(session, HourlyRollup, room_id, since),
+    ]
+    stmt = (
+        select(
+            epoch_seconds(ElectricityHistory.record_time),
+            ElectricityHistory.electricity,
+        )
+        .where(ElectricityHistory.room_id == room_id)
+        .order_by(ElectricityHistory.record_time)
+    )
+    if since is not None:
+        stmt = stmt.where(ElectricityHistory.record_time >= since)
+
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    chunks.extend(
+        np.array(partition, dtype=np.float64).reshape(-1, 2)
+        for partition in result.partitions()
+    )
+
+    data = np.concatenate(chunks)
+    return np.ascontiguousarray(data[:, 0]), np.ascontiguousarray(data[:, 1])
@@ -0,0 +1,595 @@
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from sqlalchemy import delete, exists, func, select, tuple_, union
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from ..csust_api import RoomKey
+from .electricity_db import (
+    Binding,
+    DailyRollup,
+    DischargeSegment,
+    ElectricityHistory,
+    HourlyRollup,
+    Room,
+    Schedule,
+    SessionLocal,
+)
+from .history import from_epoch, load_history_arrays
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+async def find_room(
+    session: AsyncSession, campus: str, building: str, room: str
+) -> Optional[Room]:
+    return await session.scalar(
+        select(Room).where(
+            Room.campus == campus, Room.building == building, Room.room == room
+        )
+    )
+
+
+async def get_or_create_rooms(
+    session: AsyncSession, keys: Iterable[RoomKey], chunk_size: int = 500
+) -> Dict[RoomKey, int]:
+    """批量获取宿舍对应的宿舍ID，不存在的宿舍一并创建"""
+    keys = list(dict.fromkeys(keys))
+    room_ids: Dict[RoomKey, int] = {}
+
+    async def load(chunk: List[RoomKey]):
+        rows = await session.execute(
+            select(Room.campus, Room.building, Room.room, Room.id).where(
+                tuple_(Room.campus, Room.building, Room.room).in_(chunk)
+            )
+        )
+        for campus, building, room, room_id in rows:
+            room_ids[(campus, building, room)] = room_id
+
+    for i in range(0, len(keys), chunk_size):
+        await load(keys[i : i + chunk_size])
+
+    missing = [key for key in keys if key not in room_ids]
+    if missing:
+        # 多个实例共用数据库时可能同时创建同一个宿舍
+        insert = (
+            postgresql_insert
+            if session.bind.dialect.name == "postgresql"
+            else sqlite_insert
+        )
+        await session.execute(
+            insert(Room).on_conflict_do_nothing(),
+            [
+                {"campus": campus, "building": building, "room": room}
+                for campus, building, room in missing
+            ],
+        )
+        for i in range(0, len(missing), chunk_size):
+            await load(missing[i : i + chunk_size])
+    return room_ids
+
+
+def rebuild_discharge_segment(session: Session, room_id: int) -> DischargeSegment:
+    """从历史记录重建宿舍当前放电段的回归累加量"""
+    import numpy as np
+
+    from ..utils.regression import segment_starts, segment_sums
+
+    segment = DischargeSegment(room_id=room_id)
+    times, values = load_history_arrays(session, room_id)
+    if not len(times):
+        return segment
+
+    # 只需要最后一段放电记录
+    start = segment_starts(values)[-1]
+    n, sum_t, sum_v, sum_tt, sum_tv = segment_sums(
+        times[start:], values[start:], np.zeros(1, dtype=np.intp)
+    )
+    segment.start_time = from_epoch(times[start])
+    segment.last_value = float(values[-1])
+    segment.n = int(n[0])
+    segment.sum_t = float(sum_t[0])
+    segment.sum_v = float(sum_v[0])
+    segment.sum_tt = float(sum_tt[0])
+    segment.sum_tv = float(sum_tv[0])
+    return segment
+
+
+# 汇总记录的时间段键 (宿舍ID, 时间段起点)
+BucketKey = Tuple[int, datetime]
+
+ROLLUP_COLUMNS = (
+    "first_time",
+    "first_value",
+    "last_time",
+    "last_value",
+    "min_value",
+    "max_value",
+    "consumption",
+    "recharges",
+    "samples",
+)
+
+
+def _raw_record(row) -> dict:
+    """把一条原始记录视为只有一个样本的汇总记录"""
+    return {
+        "room_id": row.room_id,
+        "first_time": row.record_time,
+        "first_value": row.electricity,
+        "last_time": row.record_time,
+        "last_value": row.electricity,
+        "min_value": row.electricity,
+        "max_value": row.electricity,
+        "consumption": 0.0,
+        "recharges": 0,
+        "samples": 1,
+    }
+
+
+def _rollup_record(row) -> dict:
+    return {
+        "room_id": row.room_id,
+        **{column: getattr(row, column) for column in ROLLUP_COLUMNS},
+    }
+
+
+def merge_rollup(bucket: Optional[dict], record: dict, previous: Optional[float]):
+    """按时间顺序把一条记录并入时间段，previous 为该宿舍上一条记录的电量
+
+    相邻两条记录之间的电量下降计入用电量，上升计为一次充值
+    """
+    consumption, recharges = record["consumption"], record["recharges"]
+    if previous is not None:
+        if record["first_value"] < previous:
+            consumption += previous - record["first_value"]
+        elif record["first_value"] > previous:
+            recharges += 1
+
+    if bucket is None:
+        return {**record, "consumption": consumption, "recharges": recharges}
+
+    bucket["last_time"] = record["last_time"]
+    bucket["last_value"] = record["last_value"]
+    bucket["min_value"] = min(bucket["min_value"], record["min_value"])
+    bucket["max_value"] = max(bucket["max_value"], record["max_value"])
+    bucket["consumption"] += consumption
+    bucket["recharges"] += recharges
+    bucket["samples"] += record["samples"]
+    return bucket
+
+
+class BindingRepository:
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def get(self, binding_id: str) -> Optional[Binding]:
+        async with self.session_factory() as session:
+            return await session.get(Binding, binding_id)
+
+    async def get_many(
+        self, binding_ids: List[str], chunk_size: int = 500
+    ) -> List[Binding]:
+        """按ID批量读取绑定，分块查询避免 SQL 参数过多"""
+        bindings: List[Binding] = []
+        async with self.session_factory() as session:
+            for i in range(0, len(binding_ids), chunk_size):
+                bindings.extend(
+                    await session.scalars(
+                        select(Binding).where(
+                            Binding.id.in_(binding_ids[i : i + chunk_size])
+                        )
+                    )
+                )
+        return bindings
+
+    async def get_by_sender(self, sender_type: str, id: str) -> Optional[Binding]:
+        column = Binding.qq_number if sender_type == "user" else Binding.group_number
+        async with self.session_factory() as session:
+            return await session.scalar(select(Binding).where(column == id))
+
+    async def create(
+        self, sender_type: str, id: str, campus: str, building: str, room: str
+    ) -> Binding:
+        async with self.session_factory() as session:
+            room_id = (await get_or_create_rooms(session, [(campus, building, room)]))[
+                (campus, building, room)
+            ]
+            binding = Binding(room_id=room_id)
+            if sender_type == "group":
+                binding.group_number = id
+            else:
+                binding.qq_number = id
+            session.add(binding)
+            await session.commit()
+            await session.refresh(binding, ["location"])
+            return binding
+
+    async def delete(self, binding_id: str):
+        """删除绑定及其定时查询"""
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(Schedule).where(Schedule.binding_id == binding_id)
+            )
+            await session.execute(delete(Binding).where(Binding.id == binding_id))
+            await session.commit()
+
+    async def bound_rooms(self) -> List[RoomKey]:
+        """所有至少有一个绑定的宿舍"""
+        async with self.session_factory() as session:
+            rows = await session.execute(
+                select(Room.campus, Room.building, Room.room)
+                .join(Binding, Binding.room_id == Room.id)
+                .distinct()
+            )
+            return [tuple(row) for row in rows]
+
+
+class ScheduleRepository:
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def all(self) -> List[Schedule]:
+        async with self.session_factory() as session:
+            return list(await session.scalars(select(Schedule)))
+
+    async def get_by_binding(self, binding_id: str) -> Optional[Schedule]:
+        async with self.session_factory() as session:
+            return await session.scalar(
+                select(Schedule).where(Schedule.binding_id == binding_id)
+            )
+
+    async def create(self, binding_id: str, schedule_time: str) -> Schedule:
+        async with self.session_factory() as session:
+            schedule = Schedule(binding_id=binding_id, schedule_time=schedule_time)
+            session.add(schedule)
+            await session.commit()
+            return schedule
+
+    async def delete_by_binding(self, binding_id: str):
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(Schedule).where(Schedule.binding_id == binding_id)
+            )
+            await session.commit()
+
+    async def times(self) -> List[Tuple[str, str]]:
+        """所有定时查询的 (绑定ID, 时间)，只查询这两列"""
+        async with self.session_factory() as session:
+            return [
+                (binding_id, schedule_time)
+                for binding_id, schedule_time in await session.execute(
+                    select(Schedule.binding_id, Schedule.schedule_time)
+                )
+            ]
+
+
+class HistoryRepository:
+    def __init__(self, session_factory: async_sessionmaker):
+        self.session_factory = session_factory
+
+    async def add_readings(
+        self, readings: Dict[RoomKey, float], chunk_size: int = 500
+    ) -> Dict[RoomKey, int]:
+        """批量写入电量读数，只记录电量有变化的宿舍，返回有变化的宿舍及其ID
+
+        上一次的电量取自放电段累加量（与最后一条历史记录一致），
+        所有变化的记录在同一个事务中批量插入
+        """
+        if not readings:
+            return {}
+
+        try:
+            return await self._add_readings(readings, chunk_size)
+        except IntegrityError:
+            # 并发写入同一宿舍时可能同时新建放电段，回滚后按已有的放电段重新写入
+            return await self._add_readings(readings, chunk_size)
+
+    async def _add_readings(
+        self, readings: Dict[RoomKey, float], chunk_size: int
+    ) -> Dict[RoomKey, int]:
+        async with self.session_factory() as session:
+            room_ids = await get_or_create_rooms(session, readings.keys(), chunk_size)
+
+            ids = list(room_ids.values())
+            segments: Dict[int, DischargeSegment] = {}
+            for i in range(0, len(ids), chunk_size):
+                for segment in await session.scalars(
+                    select(DischargeSegment).where(
+                        DischargeSegment.room_id.in_(ids[i : i + chunk_size])
+                    )
+                ):
+                    segments[segment.room_id] = segment
+
+            # 没有累加量的宿舍中，只有已有历史记录的才需要重建
+            missing = [room_id for room_id in ids if room_id not in segments]
+            with_history = set()
+            for i in range(0, len(missing), chunk_size):
+                chunk = missing[i : i + chunk_size]
+                with_history.update(
+                    await session.scalars(
+                        union(
+                            *(
+                                select(model.room_id).where(model.room_id.in_(chunk))
+                                for model in (
+                                    ElectricityHistory,
+                                    HourlyRollup,
+                                    DailyRollup,
+                                )
+                            )
+                        )
+                    )
+                )
+
+            record_time = datetime.now()
+            rows = []
+            changed: Dict[RoomKey, int] = {}
+            for key, value in readings.items():
+                room_id = room_ids[key]
+                segment = segments.get(room_id)
+                if segment is None:
+                    if room_id in with_history:
+                        # 旧数据库没有累加量时先从历史记录重建一次
+                        segment = await session.run_sync(
+                            rebuild_discharge_segment, room_id
+                        )
+                    else:
+                        segment = DischargeSegment(room_id=room_id)
+                    session.add(segment)
+                    segments[room_id] = segment
+
+                if segment.n and segment.last_value == value:
+                    continue
+
+                rows.append(
+                    {
+                        "room_id": room_id,
+                        "record_time": record_time,
+                        "electricity": value,
+                    }
+                )
+                segment.push(record_time, value)
+                changed[key] = room_id
+
+            if rows:
+                await session.execute(ElectricityHistory.__table__.insert(), rows)
+            # 没有变化时新建的宿舍记录也需要提交
+            await session.commit()
+        return changed
+
+    async def latest_reading(
+        self, campus: str, building: str, room: str
+    ) -> Optional[Tuple[datetime, float]]:
+        """宿舍最近一次记录的 (时间, 电量)，原始记录已被汇总时取最新的汇总记录"""
+        async with self.session_factory() as session:
+            room_obj = await find_room(session, campus, building, room)
+            if room_obj is None:
+                return None
+
+            latest = (
+                await session.execute(
+                    select(
+                        ElectricityHistory.record_time, ElectricityHistory.electricity
+                    )
+                    .where(ElectricityHistory.room_id == room_obj.id)
+                    .order_by(ElectricityHistory.record_time.desc())
+                    .limit(1)
+                )
+            ).first()
+            for model in (HourlyRollup, DailyRollup):
+                if latest is not None:
+                    break
+                latest = (
+                    await session.execute(
+                        select(model.last_time, model.last_value)
+                        .where(model.room_id == room_obj.id)
+                        .order_by(model.bucket_start.desc())
+                        .limit(1)
+                    )
+                ).first()
+            return None if latest is None else (latest[0], latest[1])
+
+    async def predict_empty_time(
+        self, campus: str, building: str, room: str
+    ) -> Optional[datetime]:
+        async with self.session_factory() as session:
+            room_obj = await find_room(session, campus, building, room)
+            if room_obj is None:
+                return None
+
+            room_id = room_obj.id
+            segment = await session.get(DischargeSegment, room_id)
+            if segment is None:
+                # 旧数据库没有累加量时先从历史记录重建一次
+                segment = await session.run_sync(rebuild_discharge_segment, room_id)
+                if not segment.n:
+                    return None
+                session.add(segment)
+                try:
+                    await session.commit()
+                except IntegrityError:
+                    # 并发请求已经重建并写入了放电段
+                    await session.rollback()
+                    segment = await session.get(DischargeSegment, room_id)
+
+            return segment.predict_empty_time()
+
+    async def latest_id(
+        self, room_id: int, since: Optional[datetime] = None
+    ) -> Optional[int]:
+        """最新一条记录的ID，可作为历史记录的版本号
+
+        时间范围内只有汇总记录时返回 0，没有任何记录时返回 None
+        """
+        stmt = (
+            select(ElectricityHistory.id)
+            .where(ElectricityHistory.room_id == room_id)
+            .order_by(ElectricityHistory.record_time.desc())
+            .limit(1)
+        )
+        if since is not None:
+            stmt = stmt.where(ElectricityHistory.record_time >= since)
+        async with self.session_factory() as session:
+            latest = await session.scalar(stmt)
+            if latest is not None:
+                return latest
+
+            for model in (HourlyRollup, DailyRollup):
+                condition = model.room_id == room_id
+                if since is not None:
+                    condition &= model.last_time >= since
+                if await session.scalar(select(exists().where(condition))):
+                    return 0
+            return None
+
+    async def load_arrays(
+        self, room_id: int, since: Optional[datetime] = None
+    ) -> Tuple["np.ndarray", "np.ndarray"]:
+        async with self.session_factory() as session:
+            return await session.run_sync(load_history_arrays, room_id, since)
+
+    async def clear(self, room_id: int):
+        """删除宿舍的全部历史记录"""
+        async with self.session_factory() as session:
+            await session.execute(
+                delete(ElectricityHistory).where(ElectricityHistory.room_id == room_id)
+            )
+            await session.execute(
+                delete(DischargeSegment).where(DischargeSegment.room_id == room_id)
+            )
+            for model in (HourlyRollup, DailyRollup):
+                await session.execute(delete(model).where(model.room_id == room_id))
+            await session.commit()
+
+    async def room_ids(self) -> List[int]:
+        async with self.session_factory() as session:
+            return list(await session.scalars(select(Room.id).order_by(Room.id)))
+
+    async def compact(
+        self,
+        source: Type[Union[ElectricityHistory, HourlyRollup]],
+        target: Type[Union[HourlyRollup, DailyRollup]],
+        room_ids: List[int],
+        cutoff: datetime,
+        chunk_size: int = 5000,
+    ) -> Tuple[int, Set[int]]:
+        """把一批宿舍 cutoff 之前的 source 记录汇总到 target 并删除，只处理一个分块
+
+        cutoff 需要与 target 的时间段对齐。返回 (处理的记录数, 涉及的宿舍ID)，
+        处理的记录数等于 chunk_size 时可能还有剩余记录
+        """
+        raw = source is ElectricityHistory
+        time_column = source.record_time if raw else source.bucket_start
+
+        async with self.session_factory() as session:
+            rows = (
+                (
+                    await session.execute(
+                        select(source)
+                        .where(source.room_id.in_(room_ids), time_column < cutoff)
+                        .order_by(source.room_id, time_column)
+                        .limit(chunk_size)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            if not rows:
+                return 0, set()
+
+            touched = {row.room_id for row in rows}
+
+            # 每个宿舍已汇总部分的最后一条电量，用于计算跨分块的用电量与充值次数；
+            # 汇总记录自身已经包含与上一条记录之间的变化，只有原始记录需要
+            previous: Dict[int, float] = {}
+            for model in (DailyRollup, HourlyRollup) if raw else ():
+                latest = (
+                    select(model.room_id, func.max(model.bucket_start))
+                    .where(model.room_id.in_(touched))
+                    .group_by(model.room_id)
+                )
+                # 较新一层的记录覆盖较旧一层
+                for room_id, last_value in await session.execute(
+                    select(model.room_id, model.last_value).where(
+                        tuple_(model.room_id, model.bucket_start).in_(latest)
+                    )
+                ):
+                    previous[room_id] = last_value
+
+            buckets: Dict[BucketKey, dict] = {}
+            for row in rows:
+                record = _raw_record(row) if raw else _rollup_record(row)
+                key = (row.room_id, target.truncate(record["first_time"]))
+                buckets[key] = merge_rollup(
+                    buckets.get(key), record, previous.get(row.room_id)
+                )
+                if raw:
+                    previous[row.room_id] = record["last_value"]
+
+            # 分块边界上的时间段可能已经部分汇总过，需要与已有记录合并
+            keys = list(buckets)
+            existing = {
+                (row.room_id, row.bucket_start): row
+                for row in (
+                    await session.scalars(
+                        select(target).where(
+                            tuple_(target.room_id, target.bucket_start).in_(keys)
+                        )
+                    )
+                )
+            }
+            for key, row in existing.items():
+                bucket = buckets[key]
+                merged = _rollup_record(row)
+                merged["last_time"] = bucket["last_time"]
+                merged["last_value"] = bucket["last_value"]
+                merged["min_value"] = min(merged["min_value"], bucket["min_value"])
+                merged["max_value"] = max(merged["max_value"], bucket["max_value"])
+                merged["consumption"] += bucket["consumption"]
+                merged["recharges"] += bucket["recharges"]
+                merged["samples"] += bucket["samples"]
+                buckets[key] = merged
+                await session.delete(row)
+            await session.flush()
+
+            await session.execute(
+                target.__table__.insert(),
+                [
+                    {**bucket, "room_id": room_id, "bucket_start": bucket_start}
+                    for (room_id, bucket_start), bucket in buckets.items()
+                ],
+            )
+
+            # 分块删除已汇总的记录，避免 SQL 参数过多
+            for i in range(0, len(rows), 500):
+                chunk = rows[i : i + 500]
+                if raw:
+                    condition = source.id.in_([row.id for row in chunk])
+                else:
+                    condition = tuple_(source.room_id, source.bucket_start).in_(
+                        [(row.room_id, row.bucket_start) for row in chunk]
+                    )
+                await session.execute(delete(source).where(condition))
+            await session.commit()
+
+        return len(rows), touched
+
+
+binding_repository = BindingRepository(SessionLocal)
+schedule_repository = ScheduleRepository(SessionLocal)
+history_repository = HistoryRepository(SessionLocal)
@@ -0,0 +1,24 @@
+"""单元测试的公共夹具
+
+与基准测试共用 benchmarks/_bootstrap.py 加载插件，数据库位于临时目录中，
+不会请求上游接口
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from _bootstrap import load_plugin, plugin_module  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def plugin():
+    return load_plugin()
+
+
+@pytest.fixture(scope="session")
+def cache(plugin):
+    return plugin_module("utils.cache")
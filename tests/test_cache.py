@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+
+def test_cancelled_leader_does_not_cancel_followers(cache):
+    reading_cache = cache.ReadingCache(ttl=60, max_size=10)
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "value"
+
+    async def main():
+        leader = asyncio.create_task(reading_cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(reading_cache.get_or_fetch("key", fetch))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+        release.set()
+        assert await follower == ("value", False)
+
+    asyncio.run(main())
+    assert calls == 1
+    assert reading_cache.get("key") == "value"
+    assert reading_cache.stats()["inflight"] == 0
+
+
+def test_fetch_error_is_passed_to_followers(cache):
+    reading_cache = cache.ReadingCache(ttl=60, max_size=10)
+
+    async def fetch():
+        await asyncio.sleep(0)
+        raise ConnectionError("上游不可用")
+
+    async def main():
+        return await asyncio.gather(
+            reading_cache.get_or_fetch("key", fetch),
+            reading_cache.get_or_fetch("key", fetch),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert reading_cache.get("key") is None
+    assert reading_cache.stats()["inflight"] == 0
+
+
+def test_chart_cache_invalidate_and_purge(cache, tmp_path):
+    chart_cache = cache.ChartCache(max_bytes=1024, disk_path=tmp_path)
+
+    async def main():
+        await chart_cache.put(1, "10", b"one", "7d")
+        await chart_cache.put(1, "11", b"one-newer", "7d")
+        await chart_cache.put(1, "10", b"all", "all")
+        await chart_cache.put(2, "20", b"two", "7d")
+        assert sorted(file.name for file in tmp_path.iterdir()) == [
+            "1-7d-11.png",
+            "1-all-10.png",
+            "2-7d-20.png",
+        ]
+
+        chart_cache.invalidate(1)
+        assert chart_cache.stats()["entries"] == 1
+        # 磁盘上的同版本图表仍然可用
+        assert await chart_cache.get(1, "11", "7d") == b"one-newer"
+
+        await chart_cache.purge([1])
+        assert await chart_cache.get(1, "11", "7d") is None
+        assert await chart_cache.get(2, "20", "7d") == b"two"
+        assert [file.name for file in tmp_path.iterdir()] == ["2-7d-20.png"]
+
+    asyncio.run(main())
+    assert chart_cache.size == len(b"two")
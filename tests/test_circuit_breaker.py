@@ -0,0 +1,261 @@
+import asyncio
+
+import pytest
+from _bootstrap import plugin_module
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def breaker_module(plugin):
+    return plugin_module("utils.circuit_breaker")
+
+
+@pytest.fixture
+def clock(breaker_module, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(breaker_module, "time", clock)
+    return clock
+
+
+def make_breaker(module, **kwargs):
+    kwargs = {
+        "failure_rate": 0.5,
+        "min_requests": 4,
+        "window": 10.0,
+        "open_timeout": 30.0,
+        **kwargs,
+    }
+    return module.CircuitBreaker(**kwargs)
+
+
+def trip(module, breaker):
+    for failed in (False, True, False, True):
+        breaker.check()
+        breaker.record(failed=failed)
+    assert breaker.state == module.CircuitBreaker.OPEN
+
+
+def test_breaker_opens_on_failure_rate(breaker_module, clock):
+    module = breaker_module
+    breaker = make_breaker(module)
+    # 请求数不足 min_requests 时不打开
+    for _ in range(3):
+        breaker.check()
+        breaker.record(failed=True)
+    assert breaker.state == module.CircuitBreaker.CLOSED
+
+    # 失败记录移出统计窗口后不再计入
+    clock.advance(10)
+    for failed in (False, False, False, True):
+        breaker.check()
+        breaker.record(failed=failed)
+    assert breaker.state == module.CircuitBreaker.CLOSED
+
+    # 6 次中失败 3 次，达到 50%
+    for failed in (True, True):
+        breaker.check()
+        breaker.record(failed=failed)
+    assert breaker.state == module.CircuitBreaker.OPEN
+    assert breaker.opened == 1
+
+
+def test_breaker_rejects_while_open(breaker_module, clock):
+    module = breaker_module
+    breaker = make_breaker(module)
+    trip(module, breaker)
+
+    clock.advance(12)
+    with pytest.raises(module.CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_after == pytest.approx(18)
+    assert breaker.rejected == 1
+
+    # 打开前发出的请求的结果不改变状态
+    breaker.record(failed=False)
+    assert breaker.state == module.CircuitBreaker.OPEN
+
+
+def test_half_open_success_closes(breaker_module, clock):
+    module = breaker_module
+    breaker = make_breaker(module, half_open_probes=2)
+    trip(module, breaker)
+
+    clock.advance(30)
+    breaker.check()
+    assert breaker.state == module.CircuitBreaker.HALF_OPEN
+    breaker.check()
+    breaker.record(failed=False)
+    assert breaker.state == module.CircuitBreaker.HALF_OPEN
+    breaker.record(failed=False)
+    assert breaker.state == module.CircuitBreaker.CLOSED
+
+    # 关闭后重新开始统计，之前的失败不计入
+    for _ in range(3):
+        breaker.check()
+        breaker.record(failed=True)
+    assert breaker.state == module.CircuitBreaker.CLOSED
+
+
+def test_half_open_failure_reopens(breaker_module, clock):
+    module = breaker_module
+    breaker = make_breaker(module)
+    trip(module, breaker)
+
+    clock.advance(30)
+    breaker.check()
+    breaker.record(failed=True)
+    assert breaker.state == module.CircuitBreaker.OPEN
+    assert breaker.opened == 2
+
+    # 重新打开后等待完整的 open_timeout
+    clock.advance(29)
+    with pytest.raises(module.CircuitOpenError):
+        breaker.check()
+    clock.advance(1)
+    breaker.check()
+    assert breaker.state == module.CircuitBreaker.HALF_OPEN
+
+
+def test_half_open_limits_probes(breaker_module, clock):
+    module = breaker_module
+    breaker = make_breaker(module, half_open_probes=2)
+    trip(module, breaker)
+
+    clock.advance(30)
+    breaker.check()
+    breaker.check()
+    with pytest.raises(module.CircuitOpenError):
+        breaker.check()
+    assert breaker.rejected == 1
+
+    # 探测请求一直没有结果时，超过 open_timeout 后重新开始一轮探测
+    clock.advance(31)
+    breaker.check()
+    breaker.check()
+    with pytest.raises(module.CircuitOpenError):
+        breaker.check()
+    breaker.record(failed=False)
+    breaker.record(failed=False)
+    assert breaker.state == module.CircuitBreaker.CLOSED
+
+
+def test_retry_budget(breaker_module, clock):
+    module = breaker_module
+    budget = module.RetryBudget(ratio=0.5, min_retries=1, window=10.0)
+
+    # 没有请求时只允许 min_retries 次
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    for _ in range(4):
+        budget.record_request()
+    # 1 + 0.5 × 4 = 3 次，已用 1 次
+    assert budget.try_retry()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+    # 超出窗口的请求与重试都不再计入
+    clock.advance(10)
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_retry()
+    assert budget.try_retry()
+    assert not budget.try_retry()
+
+
+class FakeRandom:
+    """记录退避的上限，直接返回 0 不实际等待"""
+
+    def __init__(self):
+        self.bounds = []
+
+    def uniform(self, low: float, high: float) -> float:
+        self.bounds.append((low, high))
+        return 0.0
+
+
+@pytest.fixture
+def fake_random(plugin, monkeypatch):
+    fake_random = FakeRandom()
+    monkeypatch.setattr(plugin_module("csust_api"), "random", fake_random)
+    return fake_random
+
+
+@pytest.fixture
+def api(breaker_module, clock, fake_random):
+    return plugin_module("csust_api").CSUSTElectricityAPI(
+        max_retries=3,
+        retry_backoff=0.5,
+        circuit_breaker=make_breaker(breaker_module, min_requests=100),
+        retry_budget=breaker_module.RetryBudget(ratio=0, min_retries=100),
+    )
+
+
+def script(api, monkeypatch, outcomes):
+    """让每次请求依次抛出 outcomes 中的异常，或返回其中的结果"""
+    calls = []
+
+    async def apost_once(body, funname):
+        outcome = outcomes[len(calls)]
+        calls.append(body)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(api, "_apost_once", apost_once)
+    return calls
+
+
+def test_apost_retries_with_jittered_backoff(api, monkeypatch, fake_random):
+    calls = script(
+        api,
+        monkeypatch,
+        [ConnectionError("a"), ConnectionError("b"), ConnectionError("c"), {"ok": 1}],
+    )
+    assert asyncio.run(api._apost("body", "fun")) == {"ok": 1}
+    assert len(calls) == 4
+    # 全抖动：等待时间在 0 与指数增长的上限之间均匀选取
+    assert fake_random.bounds == [(0, 0.5), (0, 1.0), (0, 2.0)]
+
+
+def test_apost_gives_up_after_max_retries(api, monkeypatch, fake_random):
+    calls = script(api, monkeypatch, [ConnectionError(str(i)) for i in range(4)])
+    with pytest.raises(ConnectionError, match="3"):
+        asyncio.run(api._apost("body", "fun"))
+    assert len(calls) == 4
+    assert len(fake_random.bounds) == 3
+
+
+def test_apost_respects_retry_budget(api, monkeypatch, breaker_module):
+    api.retry_budget = breaker_module.RetryBudget(ratio=0, min_retries=1)
+    calls = script(api, monkeypatch, [ConnectionError("a"), ConnectionError("b")])
+    with pytest.raises(ConnectionError, match="b"):
+        asyncio.run(api._apost("body", "fun"))
+    assert len(calls) == 2
+
+
+def test_apost_does_not_retry_invalid_response(api, monkeypatch, fake_random):
+    calls = script(api, monkeypatch, [ValueError("bad json")])
+    with pytest.raises(ValueError):
+        asyncio.run(api._apost("body", "fun"))
+    assert len(calls) == 1
+    assert fake_random.bounds == []
+
+
+def test_apost_stops_when_circuit_opens(api, monkeypatch, breaker_module):
+    api.circuit_breaker = make_breaker(breaker_module, min_requests=2)
+    calls = script(api, monkeypatch, [ConnectionError("a"), ConnectionError("b")])
+    # 第二次失败打开熔断器，之后的重试直接被拒绝，不再访问上游
+    with pytest.raises(breaker_module.CircuitOpenError):
+        asyncio.run(api._apost("body", "fun"))
+    assert len(calls) == 2
@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+from _bootstrap import plugin_module
+from nonebot.exception import ApiNotAvailable, NetworkError
+
+
+class FixedRandom:
+    """退避不加抖动，便于检查等待时间"""
+
+    @staticmethod
+    def uniform(low: float, high: float) -> float:
+        return 1.0
+
+
+@pytest.fixture
+def dispatch(plugin, monkeypatch):
+    module = plugin_module("utils.dispatch")
+    monkeypatch.setattr(module, "random", FixedRandom())
+    return module
+
+
+def make_dispatcher(dispatch, **kwargs):
+    kwargs = {
+        "rate": 0,
+        "burst": 1,
+        "target_rate": 0,
+        "target_burst": 1,
+        "workers": 1,
+        "max_retries": 2,
+        "retry_backoff": 0.01,
+        **kwargs,
+    }
+    return dispatch.OutboundDispatcher(**kwargs)
+
+
+def script(dispatcher, monkeypatch, outcomes=()):
+    """让每次发送依次抛出 outcomes 中的异常，之后的发送成功；返回 (时间, 目标) 列表"""
+    calls = []
+
+    async def call(target, message):
+        calls.append((time.monotonic(), target))
+        if len(calls) <= len(outcomes):
+            raise outcomes[len(calls) - 1]
+
+    monkeypatch.setattr(dispatcher, "_call", call)
+    return calls
+
+
+def record_delays(dispatcher, monkeypatch):
+    delays = []
+    put_later = dispatcher._put_later
+
+    def record(delay, priority, item):
+        delays.append(delay)
+        put_later(delay, priority, item)
+
+    monkeypatch.setattr(dispatcher, "_put_later", record)
+    return delays
+
+
+def run(dispatcher, *sends):
+    async def main():
+        try:
+            return await asyncio.gather(
+                *(dispatcher.send(target, "msg") for target in sends),
+                return_exceptions=True,
+            )
+        finally:
+            await dispatcher.close()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "make_error",
+    [
+        lambda dispatch: ApiNotAvailable("OneBot V11"),
+        lambda dispatch: dispatch.BotUnavailable(),
+    ],
+    ids=["api_not_available", "bot_unavailable"],
+)
+def test_retries_errors_before_sending(dispatch, monkeypatch, make_error):
+    error = make_error(dispatch)
+    dispatcher = make_dispatcher(dispatch)
+    calls = script(dispatcher, monkeypatch, [error])
+    delays = record_delays(dispatcher, monkeypatch)
+
+    assert run(dispatcher, ("private", 1)) == [None]
+    assert len(calls) == 2
+    assert delays == [pytest.approx(0.01)]
+    assert (dispatcher.sent, dispatcher.failed, dispatcher.retried) == (1, 0, 1)
+
+
+def test_retry_backoff_doubles_until_exhausted(dispatch, monkeypatch):
+    dispatcher = make_dispatcher(dispatch, max_retries=2)
+    error = dispatch.BotUnavailable("no bot")
+    calls = script(dispatcher, monkeypatch, [error] * 3)
+    delays = record_delays(dispatcher, monkeypatch)
+
+    (result,) = run(dispatcher, ("group", 1))
+    assert result is error
+    assert len(calls) == 3
+    assert delays == [pytest.approx(0.01), pytest.approx(0.02)]
+    assert calls[2][0] - calls[1][0] >= 0.02 - 0.005
+    assert (dispatcher.sent, dispatcher.failed, dispatcher.retried) == (0, 1, 2)
+
+
+@pytest.mark.parametrize(
+    "error", [NetworkError("OneBot V11", "reset"), asyncio.TimeoutError()]
+)
+def test_does_not_retry_errors_after_sending(dispatch, monkeypatch, error):
+    # 协议端可能已经发出了消息，重试会重复发送
+    dispatcher = make_dispatcher(dispatch)
+    calls = script(dispatcher, monkeypatch, [error])
+
+    (result,) = run(dispatcher, ("private", 1))
+    assert result is error
+    assert len(calls) == 1
+    assert (dispatcher.sent, dispatcher.failed, dispatcher.retried) == (0, 1, 0)
+
+
+def test_global_bucket_paces_sends(dispatch, monkeypatch):
+    dispatcher = make_dispatcher(dispatch, rate=50, burst=1, workers=4)
+    calls = script(dispatcher, monkeypatch)
+
+    targets = [("private", i) for i in range(6)]
+    assert run(dispatcher, *targets) == [None] * 6
+    times = sorted(t for t, _ in calls)
+    # 突发 1 条之后每 1/50 秒发送一条
+    assert times[-1] - times[0] >= 5 / 50 - 0.01
+    assert dispatcher.sent == 6
+
+
+def test_target_bucket_does_not_block_other_targets(dispatch, monkeypatch):
+    dispatcher = make_dispatcher(dispatch, target_rate=20, target_burst=1)
+    calls = script(dispatcher, monkeypatch)
+
+    a, b = ("group", 1), ("group", 2)
+    assert run(dispatcher, a, a, a, b) == [None] * 4
+    # a 的额度用完后延后重新入队，b 的消息先发出
+    assert [target for _, target in calls] == [a, b, a, a]
+    a_times = [t for t, target in calls if target == a]
+    for previous, current in zip(a_times, a_times[1:]):
+        assert current - previous >= 1 / 20 - 0.01
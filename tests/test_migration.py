@@ -0,0 +1,146 @@
+from _bootstrap import plugin_module
+from sqlalchemy import create_engine, text
+
+# 最初版本的表结构，宿舍信息以字符串保存在绑定与历史记录中
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE bindings (
+        id VARCHAR(36) NOT NULL,
+        qq_number VARCHAR(20),
+        group_number VARCHAR(20),
+        campus VARCHAR(50) NOT NULL,
+        building VARCHAR(50) NOT NULL,
+        room VARCHAR(20) NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT check_contact_exists
+            CHECK (qq_number IS NOT NULL OR group_number IS NOT NULL),
+        CONSTRAINT check_single_contact
+            CHECK ((qq_number IS NULL AND group_number IS NOT NULL) OR
+                   (qq_number IS NOT NULL AND group_number IS NULL)),
+        CONSTRAINT uq_qq UNIQUE (qq_number),
+        CONSTRAINT uq_group UNIQUE (group_number)
+    )
+    """,
+    """
+    CREATE TABLE electricity_history (
+        id VARCHAR(36) NOT NULL,
+        record_time DATETIME,
+        electricity FLOAT NOT NULL,
+        campus VARCHAR(50) NOT NULL,
+        building VARCHAR(50) NOT NULL,
+        room VARCHAR(20) NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    """
+    CREATE TABLE schedules (
+        id VARCHAR(36) NOT NULL,
+        binding_id VARCHAR(36) NOT NULL,
+        schedule_time VARCHAR(5) NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(binding_id) REFERENCES bindings (id) ON DELETE CASCADE
+    )
+    """,
+]
+
+BINDINGS = [
+    ("b1", "10001", None, "云塘", "至诚轩5栋A区", "A101"),
+    ("b2", None, "20001", "云塘", "至诚轩5栋A区", "A101"),
+    ("b3", "10002", None, "金盆岭", "西苑2栋", "305"),
+]
+SCHEDULES = [("s1", "b1", "08:00"), ("s2", "b1", "21:30"), ("s3", "b3", "12:00")]
+HISTORY = [
+    ("h1", "2025-01-01 08:00:00.000000", 50.0, "云塘", "至诚轩5栋A区", "A101"),
+    ("h2", "2025-01-01 09:00:00.000000", 49.5, "云塘", "至诚轩5栋A区", "A101"),
+    ("h3", "2025-01-01 08:30:00.000000", 12.0, "金盆岭", "西苑2栋", "305"),
+    # 只有历史记录、已解除绑定的宿舍
+    ("h4", "2025-01-01 10:00:00.000000", 7.25, "云塘", "至善轩1栋", "110"),
+]
+
+
+def create_baseline(path):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO bindings VALUES (:0, :1, :2, :3, :4, :5)"),
+            [{str(i): v for i, v in enumerate(row)} for row in BINDINGS],
+        )
+        conn.execute(
+            text("INSERT INTO schedules VALUES (:0, :1, :2)"),
+            [{str(i): v for i, v in enumerate(row)} for row in SCHEDULES],
+        )
+        conn.execute(
+            text("INSERT INTO electricity_history VALUES (:0, :1, :2, :3, :4, :5)"),
+            [{str(i): v for i, v in enumerate(row)} for row in HISTORY],
+        )
+    return engine
+
+
+def migrate(db, engine) -> bool:
+    # 与 init_db 相同：先补齐缺少的表，再迁移旧版结构
+    with engine.begin() as conn:
+        db.Base.metadata.create_all(bind=conn)
+        return db.migrate_db(conn)
+
+
+def snapshot(engine):
+    """数据库中全部表结构与数据"""
+    with engine.connect() as conn:
+        schema = conn.execute(
+            text("SELECT type, name, sql FROM sqlite_master ORDER BY type, name")
+        ).all()
+        tables = [name for kind, name, _ in schema if kind == "table"]
+        rows = {
+            table: conn.execute(text(f'SELECT * FROM "{table}" ORDER BY 1')).all()
+            for table in tables
+        }
+    return schema, rows
+
+
+def test_migrate_room_keys(plugin, tmp_path):
+    db = plugin_module("db.electricity_db")
+    engine = create_baseline(tmp_path / "electricity.db")
+    db.apply_sqlite_pragmas(engine, {"foreign_keys": "ON"})
+    try:
+        assert migrate(db, engine)
+
+        with engine.connect() as conn:
+            bindings = conn.execute(
+                text(
+                    "SELECT b.id, b.qq_number, b.group_number, "
+                    "r.campus, r.building, r.room "
+                    "FROM bindings b JOIN rooms r ON r.id = b.room_id"
+                )
+            ).all()
+            schedules = conn.execute(
+                text("SELECT id, binding_id, schedule_time FROM schedules")
+            ).all()
+            history = conn.execute(
+                text(
+                    "SELECT h.record_time, h.electricity, "
+                    "r.campus, r.building, r.room "
+                    "FROM electricity_history h JOIN rooms r ON r.id = h.room_id"
+                )
+            ).all()
+            rooms = conn.execute(text("SELECT COUNT(*) FROM rooms")).scalar()
+            legacy = conn.execute(
+                text("SELECT name FROM sqlite_master WHERE name LIKE '%legacy%'")
+            ).all()
+            violations = conn.execute(text("PRAGMA foreign_key_check")).all()
+
+        assert sorted(bindings) == sorted(BINDINGS)
+        # 定时任务仍指向原来的绑定
+        assert sorted(schedules) == sorted(SCHEDULES)
+        assert sorted(history) == sorted(row[1:] for row in HISTORY)
+        # 同一宿舍的绑定与历史记录共用一条 rooms 记录
+        assert rooms == 3
+        assert legacy == []
+        assert violations == []
+
+        before = snapshot(engine)
+        assert not migrate(db, engine)
+        assert snapshot(engine) == before
+    finally:
+        engine.dispose()
@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+import pytest
+from _bootstrap import plugin_module
+
+
+@pytest.fixture
+def render_pool(plugin):
+    return plugin_module("utils.render_pool")
+
+
+def discharge(rows: int):
+    times = 1.7e9 + 600.0 * np.arange(rows)
+    return times, np.round(100 - 0.05 * np.arange(rows), 2)
+
+
+def test_worker_does_not_import_plugin(render_pool):
+    async def main():
+        worker = await render_pool.RenderWorker.start()
+        try:
+            image = await worker.call("render", *discharge(100), "测试", 0)
+            return image, await worker.call("modules")
+        finally:
+            worker.kill()
+            await worker.process.wait()
+
+    image, modules = asyncio.run(main())
+    assert image.startswith(b"\x89PNG")
+    assert "matplotlib" in modules
+    assert "nonebot" not in modules
+    assert not any(name.startswith("nonebot.") for name in modules)
+
+
+def test_timeout_only_fails_the_slow_render(render_pool):
+    renderer = render_pool.ChartRenderer(workers=2, timeout=30, max_pending=8)
+    slow_done = asyncio.Event()
+
+    async def main():
+        # 预先启动两个渲染进程，避免启动时间计入超时
+        await asyncio.gather(
+            renderer.render(*discharge(10), "a"), renderer.render(*discharge(10), "b")
+        )
+        renderer.timeout = 3
+        try:
+            slow = asyncio.ensure_future(renderer.render(*discharge(2_000_000), "slow"))
+            await asyncio.sleep(0.2)
+            fast = await renderer.render(*discharge(100), "fast", 100)
+            with pytest.raises(TimeoutError):
+                await slow
+            slow_done.set()
+            # 超时的进程被结束，之后的渲染使用新的进程
+            after = await renderer.render(*discharge(100), "after", 100)
+            return fast, after
+        finally:
+            await renderer.close()
+
+    fast, after = asyncio.run(main())
+    assert slow_done.is_set()
+    assert fast.startswith(b"\x89PNG") and after.startswith(b"\x89PNG")
+    assert renderer.pending == 0
+
+
+def test_render_error_keeps_worker(render_pool):
+    renderer = render_pool.ChartRenderer(workers=1, timeout=30, max_pending=8)
+
+    async def main():
+        try:
+            with pytest.raises(render_pool.RenderError):
+                await renderer.render(np.array([]), np.array([]), "empty")
+            (worker,) = renderer._idle
+            await renderer.render(*discharge(10), "ok")
+            assert renderer._idle == [worker]
+        finally:
+            await renderer.close()
+
+    asyncio.run(main())
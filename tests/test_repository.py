@@ -0,0 +1,265 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from _bootstrap import plugin_module, sync_engine
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+CAMPUS = "云塘"
+BUILDING = "至诚轩5栋A区"
+
+
+def seed_room_without_segment(db, room: str):
+    """按没有放电段累加量的旧数据库构造一个有历史记录的宿舍"""
+    now = datetime.now()
+    engine = sync_engine()
+    with engine.begin() as conn:
+        room_id = conn.execute(
+            db.Room.__table__.insert(),
+            {"campus": CAMPUS, "building": BUILDING, "room": room},
+        ).inserted_primary_key[0]
+        conn.execute(
+            db.ElectricityHistory.__table__.insert(),
+            [
+                {
+                    "room_id": room_id,
+                    "record_time": now - timedelta(hours=10 - i),
+                    "electricity": 50.0 - i,
+                }
+                for i in range(10)
+            ],
+        )
+    engine.dispose()
+    return room_id
+
+
+def test_concurrent_segment_rebuild(plugin):
+    db = plugin_module("db.electricity_db")
+    repository = plugin_module("db.repository").history_repository
+    seed_room_without_segment(db, "R001")
+    seed_room_without_segment(db, "R002")
+
+    async def main():
+        try:
+            predictions = await asyncio.gather(
+                *(
+                    repository.predict_empty_time(CAMPUS, BUILDING, "R001")
+                    for _ in range(4)
+                )
+            )
+            changed = await asyncio.gather(
+                *(
+                    repository.add_readings({(CAMPUS, BUILDING, "R002"): 39.0})
+                    for _ in range(4)
+                )
+            )
+        finally:
+            await db.engine.dispose()
+        return predictions, changed
+
+    predictions, changed = asyncio.run(main())
+    assert len(set(predictions)) == 1 and predictions[0] is not None
+    # 读数相同，只有第一次写入会被记录
+    assert sum(map(len, changed)) == 1
+
+
+# 汇总测试使用固定的过去时间，不会与其他测试写入的近期记录重叠
+START = datetime(2026, 1, 1, 0, 3)
+NOW = START + timedelta(days=7)
+
+
+def readings(step_minutes: int = 7, days: float = 6.5):
+    """每 step_minutes 分钟一条的放电记录，每 400 条充值一次
+
+    其中一次充值正好落在整点，检查充值跨越时间段边界的情况
+    """
+    rows, value = [], 100.0
+    count = int(days * 24 * 60 / step_minutes)
+    for i in range(count):
+        record_time = START + timedelta(minutes=step_minutes * i)
+        if i and (i % 400 == 0 or record_time == datetime(2026, 1, 5, 1)):
+            value += 60
+        else:
+            value = round(value - 0.05, 2)
+        rows.append((record_time, value))
+    return rows
+
+
+def insert_room(db, room: str, rows) -> int:
+    engine = sync_engine()
+    with engine.begin() as conn:
+        room_id = conn.execute(
+            db.Room.__table__.insert(),
+            {"campus": CAMPUS, "building": BUILDING, "room": room},
+        ).inserted_primary_key[0]
+        conn.execute(
+            db.ElectricityHistory.__table__.insert(),
+            [{"room_id": room_id, "record_time": t, "electricity": v} for t, v in rows],
+        )
+    engine.dispose()
+    return room_id
+
+
+def changes(values):
+    """相邻记录之间的 (电量下降之和, 上升次数)"""
+    consumption, recharges = 0.0, 0
+    for previous, value in zip(values, values[1:]):
+        if value < previous:
+            consumption += previous - value
+        elif value > previous:
+            recharges += 1
+    return consumption, recharges
+
+
+def tiers(db, room_id: int):
+    """宿舍的 (按天汇总, 按小时汇总, 原始记录)，各自按时间排序"""
+    engine = sync_engine()
+    with engine.connect() as conn:
+        result = [
+            [
+                dict(row._mapping)
+                for row in conn.execute(
+                    select(model.__table__)
+                    .where(model.room_id == room_id)
+                    .order_by(model.bucket_start)
+                )
+            ]
+            for model in (db.DailyRollup, db.HourlyRollup)
+        ]
+        result.append(
+            conn.execute(
+                select(
+                    db.ElectricityHistory.record_time,
+                    db.ElectricityHistory.electricity,
+                )
+                .where(db.ElectricityHistory.room_id == room_id)
+                .order_by(db.ElectricityHistory.record_time)
+            ).all()
+        )
+    engine.dispose()
+    return result
+
+
+class _Rooms:
+    """只让汇总任务处理指定宿舍的仓库"""
+
+    def __init__(self, repository, room_ids):
+        self.repository = repository
+        self.ids = room_ids
+
+    async def room_ids(self):
+        return self.ids
+
+    def __getattr__(self, name):
+        return getattr(self.repository, name)
+
+
+def compact(room_ids, chunk_size: int):
+    db = plugin_module("db.electricity_db")
+    repository = plugin_module("db.repository").history_repository
+    retention = plugin_module("utils.retention").HistoryRetention(
+        _Rooms(repository, room_ids),
+        raw_retention=timedelta(days=2),
+        hourly_retention=timedelta(days=4),
+        chunk_size=chunk_size,
+    )
+
+    async def main():
+        try:
+            await retention.compact(NOW)
+        finally:
+            await db.engine.dispose()
+
+    asyncio.run(main())
+
+
+@pytest.fixture(scope="module")
+def compacted(plugin):
+    """同样的记录分别用很小与很大的分块汇总"""
+    db = plugin_module("db.electricity_db")
+    rows = readings()
+    small = insert_room(db, "C001", rows)
+    large = insert_room(db, "C002", rows)
+    compact([small], chunk_size=7)
+    compact([large], chunk_size=100_000)
+    return db, rows, small, large
+
+
+def test_compaction_conserves_consumption_and_recharges(compacted):
+    db, rows, room_id, _ = compacted
+    daily, hourly, raw = tiers(db, room_id)
+    assert daily and hourly and raw
+    # 三层记录的时间互不重叠
+    assert daily[-1]["last_time"] < hourly[0]["first_time"]
+    assert hourly[-1]["last_time"] < raw[0][0]
+    assert raw[0][0] >= NOW - timedelta(days=2) - timedelta(hours=1)
+
+    consumption, recharges = changes([v for _, v in rows])
+    # 汇总记录包含与上一条记录之间的变化，剩余原始记录从最后一个时间段的电量接续
+    rest = changes([hourly[-1]["last_value"]] + [v for _, v in raw])
+    rollups = daily + hourly
+    assert sum(r["consumption"] for r in rollups) + rest[0] == pytest.approx(
+        consumption
+    )
+    assert sum(r["recharges"] for r in rollups) + rest[1] == recharges
+    assert sum(r["samples"] for r in rollups) + len(raw) == len(rows)
+
+
+def test_compaction_keeps_recharge_steps(compacted):
+    db, rows, room_id, _ = compacted
+    daily, hourly, _ = tiers(db, room_id)
+    bucket = next(r for r in hourly if r["bucket_start"] == datetime(2026, 1, 5, 1))
+    # 整点的充值记录是该小时的第一条，上升计入该小时而不是前一小时
+    assert bucket["recharges"] == 1
+    assert bucket["first_value"] > bucket["max_value"] - 1
+    assert bucket["max_value"] - bucket["min_value"] < 1
+    assert sum(r["recharges"] for r in daily) == sum(
+        1
+        for (t, v), (_, previous) in zip(rows[1:], rows)
+        if v > previous and t < daily[-1]["last_time"] + timedelta(seconds=1)
+    )
+
+
+def test_compaction_chunks_merge_like_one_pass(compacted):
+    db, _, small, large = compacted
+
+    def strip(rows):
+        return [{k: v for k, v in row.items() if k != "room_id"} for row in rows]
+
+    small_tiers, large_tiers = tiers(db, small), tiers(db, large)
+    for small_rows, large_rows in zip(small_tiers[:2], large_tiers[:2]):
+        assert len(small_rows) == len(large_rows)
+        for a, b in zip(strip(small_rows), strip(large_rows)):
+            assert a.keys() == b.keys()
+            for key, value in a.items():
+                if isinstance(value, float):
+                    assert value == pytest.approx(b[key]), key
+                else:
+                    assert value == b[key], key
+    assert small_tiers[2] == large_tiers[2]
+
+
+def test_compaction_is_idempotent(compacted):
+    db, _, room_id, _ = compacted
+    before = tiers(db, room_id)
+    compact([room_id], chunk_size=7)
+    assert tiers(db, room_id) == before
+
+
+def test_history_arrays_continuous_after_compaction(compacted):
+    db, rows, room_id, _ = compacted
+    history = plugin_module("db.history")
+    engine = sync_engine()
+    with engine.connect() as conn:
+        times, values = history.load_history_arrays(Session(conn), room_id)
+    engine.dispose()
+
+    original = {history.to_epoch(t): v for t, v in rows}
+    assert (times[1:] > times[:-1]).all()
+    # julianday 的精度为毫秒
+    assert times[0] == pytest.approx(history.to_epoch(rows[0][0]), abs=0.01)
+    assert times[-1] == pytest.approx(history.to_epoch(rows[-1][0]), abs=0.01)
+    # 每个点都是真实的读数，时间段首尾的电量不变
+    for t, v in zip(times.tolist(), values.tolist()):
+        assert original[round(t)] == pytest.approx(v)
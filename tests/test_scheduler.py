@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from _bootstrap import plugin_module
+
+
+def test_due_matches_unpadded_times(plugin):
+    scheduler = plugin_module("utils.scheduler")
+    index = scheduler.ScheduleIndex()
+    # 数据库中早期保存的时间没有补零
+    index.load([("a", "8:00"), ("b", "08:05")])
+    index.add("c", "8:5")
+
+    assert index.due(datetime(2026, 1, 1, 8, 0, 30)) == [("08:00", ["a"])]
+    [(time_str, ids)] = index.due(datetime(2026, 1, 1, 8, 5))
+    assert time_str == "08:05"
+    assert sorted(ids) == ["b", "c"]
+
+
+def test_due_catches_up_missed_minutes(plugin):
+    scheduler = plugin_module("utils.scheduler")
+    index = scheduler.ScheduleIndex()
+    index.load([("a", "8:01"), ("b", "8:02")])
+
+    assert index.due(datetime(2026, 1, 1, 8, 0)) == []
+    due = index.due(datetime(2026, 1, 1, 8, 2))
+    assert [(time_str, sorted(ids)) for time_str, ids in due] == [
+        ("08:01", ["a"]),
+        ("08:02", ["b"]),
+    ]
@@ -0,0 +1,235 @@
+import asyncio
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+T = TypeVar("T")
+
+
+class ReadingCache(Generic[T]):
+    """带 TTL 与 LRU 容量限制的读数缓存
+
+    同一个 key 的并发未命中只会触发一次 fetch，其余调用等待同一个结果
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+        self._inflight: Dict[Hashable, "asyncio.Task[T]"] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: Hashable) -> Optional[T]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: T, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable[T]]
+    ) -> Tuple[T, bool]:
+        """返回 (值, 是否真正请求了上游)"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value, False
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            # shield 保证等待方被取消时不会影响共享的请求
+            return await asyncio.shield(task), False
+
+        self.misses += 1
+        # 请求在独立的任务中执行，发起方被取消时其余等待方仍能拿到结果
+        task = asyncio.ensure_future(self._fetch(key, fetch))
+        # 所有等待方都已取消时避免 "exception was never retrieved" 警告
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return await asyncio.shield(task), True
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[T]]) -> T:
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+        self.put(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+class ChartCache:
+    """按宿舍与历史记录版本缓存渲染好的图表
+
+    内存层按图片字节数做 LRU 淘汰，可选的磁盘层在重启后仍然有效。
+    缓存键包含历史记录版本，有新读数时旧图表自然不会再命中，invalidate 只需
+    按宿舍索引丢弃内存中的条目；磁盘读写都在线程中执行，不阻塞事件循环
+    """
+
+    def __init__(self, max_bytes: int, disk_path: Optional[Path] = None):
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        if disk_path is not None:
+            disk_path.mkdir(parents=True, exist_ok=True)
+
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[str, bytes]]" = OrderedDict()
+        # 宿舍 -> 内存中已缓存的图表类型
+        self._variants: Dict[int, Set[str]] = {}
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, room_id: int, variant: str, version: str) -> Path:
+        assert self.disk_path is not None
+        return self.disk_path / f"{room_id}-{variant}-{version}.png"
+
+    def _read_file(self, file: Path) -> Optional[bytes]:
+        try:
+            return file.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_file(self, room_id: int, variant: str, version: str, image: bytes):
+        assert self.disk_path is not None
+        file = self._file(room_id, variant, version)
+        # 同一宿舍同一类图表只保留最新版本
+        for old in self.disk_path.glob(f"{room_id}-{variant}-*.png"):
+            if old != file:
+                old.unlink(missing_ok=True)
+        file.write_bytes(image)
+
+    def _remove_files(self, room_ids: Set[int]):
+        """一次遍历缓存目录，删除这些宿舍的全部图表"""
+        assert self.disk_path is not None
+        for file in self.disk_path.glob("*.png"):
+            room_id, _, _ = file.name.partition("-")
+            if room_id.isdigit() and int(room_id) in room_ids:
+                file.unlink(missing_ok=True)
+
+    def _pop(self, key: Tuple[int, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= len(entry[1])
+
+        room_id, variant = key
+        variants = self._variants.get(room_id)
+        if variants is not None:
+            variants.discard(variant)
+            if not variants:
+                del self._variants[room_id]
+
+    def _store(self, key: Tuple[int, str], version: str, image: bytes):
+        self._pop(key)
+        if len(image) > self.max_bytes:
+            return
+
+        self._entries[key] = (version, image)
+        self._variants.setdefault(key[0], set()).add(key[1])
+        self.size += len(image)
+        while self.size > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    async def get(
+        self, room_id: int, version: str, variant: str = "all"
+    ) -> Optional[bytes]:
+        key = (room_id, variant)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        if self.disk_path is not None:
+            image = await asyncio.to_thread(
+                self._read_file, self._file(room_id, variant, version)
+            )
+            if image is not None:
+                self._store(key, version, image)
+                self.hits += 1
+                return image
+
+        self.misses += 1
+        return None
+
+    async def put(self, room_id: int, version: str, image: bytes, variant: str = "all"):
+        self._store((room_id, variant), version, image)
+
+        if self.disk_path is not None:
+            await asyncio.to_thread(self._write_file, room_id, variant, version, image)
+
+    def invalidate(self, room_id: int):
+        """丢弃宿舍在内存中的图表
+
+        用于有新读数的情况：版本已经变化，磁盘上的旧版本不会再被读取，
+        会在下一次写入同类图表时删除
+        """
+        for variant in list(self._variants.get(room_id, ())):
+            self._pop((room_id, variant))
+
+    async def purge(self, room_ids: Iterable[int]):
+        """删除宿舍在内存与磁盘中的全部图表
+
+        用于历史记录被清除或汇总、而最新记录的ID可能不变的情况
+        """
+        room_ids = set(room_ids)
+        for room_id in room_ids:
+            self.invalidate(room_id)
+        if self.disk_path is not None and room_ids:
+            await asyncio.to_thread(self._remove_files, room_ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
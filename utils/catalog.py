@@ -0,0 +1,153 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from nonebot import get_plugin_config, require
+from nonebot.log import logger
+
+require("nonebot_plugin_apscheduler")
+
+from nonebot_plugin_apscheduler import scheduler
+from sqlalchemy import delete, select
+
+from ..config import Config
+from ..csust_api import Building, CSUSTElectricityAPI, csust_api
+from ..db.electricity_db import CatalogBuilding, SessionLocal
+
+config = get_plugin_config(Config).csust_electricity
+
+
+class BuildingCatalog:
+    """持久化的楼栋目录
+
+    启动时从数据库加载，不访问网络；过期后继续返回旧数据，同时在后台刷新。
+    楼栋索引与 CSUSTElectricityAPI.buildings_cache 共享，查询电量时无需再次请求楼栋列表。
+    """
+
+    def __init__(self, api: CSUSTElectricityAPI, max_age: timedelta):
+        self.api = api
+        self.max_age = max_age
+        self.fetched_at: Dict[str, datetime] = {}
+        self._refreshing: Dict[str, "asyncio.Task[Dict[str, Building]]"] = {}
+        # 后台刷新任务，保留引用避免任务在完成前被回收
+        self._revalidating: Dict[str, "asyncio.Task[None]"] = {}
+
+    @property
+    def index(self) -> Dict[str, Dict[str, Building]]:
+        return self.api.buildings_cache
+
+    async def load(self):
+        """从数据库加载楼栋目录"""
+        async with SessionLocal() as session:
+            rows = list(await session.scalars(select(CatalogBuilding)))
+
+        grouped: Dict[str, Dict[str, Building]] = {}
+        for row in rows:
+            campus = self.api.campuses.get(row.campus)
+            if campus is None:
+                continue
+            grouped.setdefault(row.campus, {})[row.name] = Building(
+                name=row.name, id=row.building_id, campus=campus
+            )
+            fetched_at = self.fetched_at.get(row.campus)
+            if fetched_at is None or row.fetched_at < fetched_at:
+                self.fetched_at[row.campus] = row.fetched_at
+
+        for campus_name, buildings in grouped.items():
+            self.index[campus_name] = dict(
+                sorted(buildings.items(), key=lambda item: int(item[1].id))
+            )
+
+        logger.info(
+            f"已从数据库加载楼栋目录: "
+            f"{', '.join(f'{k} {len(v)} 个楼栋' for k, v in grouped.items()) or '无'}"
+        )
+
+    def is_stale(self, campus_name: str) -> bool:
+        fetched_at = self.fetched_at.get(campus_name)
+        return fetched_at is None or datetime.now() - fetched_at > self.max_age
+
+    async def _save(self, campus_name: str, buildings: Dict[str, Building]):
+        fetched_at = datetime.now()
+        async with SessionLocal() as session:
+            await session.execute(
+                delete(CatalogBuilding).where(CatalogBuilding.campus == campus_name)
+            )
+            session.add_all(
+                CatalogBuilding(
+                    campus=campus_name,
+                    name=building.name,
+                    building_id=building.id,
+                    fetched_at=fetched_at,
+                )
+                for building in buildings.values()
+            )
+            await session.commit()
+        self.fetched_at[campus_name] = fetched_at
+
+    async def refresh(self, campus_name: str) -> Dict[str, Building]:
+        """从上游刷新校区楼栋列表，同一校区同时只会有一个刷新请求"""
+        task = self._refreshing.get(campus_name)
+        if task is None:
+            task = asyncio.create_task(self._refresh(campus_name))
+            self._refreshing[campus_name] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(campus_name, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, campus_name: str) -> Dict[str, Building]:
+        buildings = await self.api.aget_buildings(campus_name, refresh=True)
+        await self._save(campus_name, buildings)
+        return buildings
+
+    def _revalidate(self, campus_name: str):
+        if (
+            not self.is_stale(campus_name)
+            or campus_name in self._refreshing
+            or campus_name in self._revalidating
+        ):
+            return
+
+        async def revalidate():
+            try:
+                await self.refresh(campus_name)
+            except Exception as e:
+                logger.warning(f"后台刷新{campus_name}校区楼栋目录失败: {str(e)}")
+
+        task = asyncio.create_task(revalidate())
+        self._revalidating[campus_name] = task
+        task.add_done_callback(lambda _: self._revalidating.pop(campus_name, None))
+
+    async def get_buildings(self, campus_name: str) -> Dict[str, Building]:
+        buildings = self.index.get(campus_name)
+        if buildings is None:
+            # 目录中没有数据时只能等待上游返回
+            return await self.refresh(campus_name)
+
+        self._revalidate(campus_name)
+        return buildings
+
+    async def lookup(self, campus_name: str, building_name: str) -> Optional[Building]:
+        return (await self.get_buildings(campus_name)).get(building_name)
+
+    async def refresh_stale(self):
+        """定时任务：刷新所有过期的校区楼栋目录"""
+        for campus_name in self.api.get_campus_names():
+            if not self.is_stale(campus_name):
+                continue
+            try:
+                await self.refresh(campus_name)
+            except Exception as e:
+                logger.warning(f"刷新{campus_name}校区楼栋目录失败: {str(e)}")
+
+
+building_catalog = BuildingCatalog(
+    csust_api, max_age=timedelta(seconds=config.building_catalog_max_age)
+)
+
+scheduler.add_job(
+    building_catalog.refresh_stale,
+    "interval",
+    seconds=config.building_catalog_refresh_interval,
+    id="building_catalog_refresh",
+    replace_existing=True,
+)
@@ -0,0 +1,171 @@
+import io
+from datetime import datetime, timedelta
+
+import matplotlib
+import numpy as np
+from matplotlib.artist import setp
+from matplotlib.dates import AutoDateLocator, DateFormatter, DayLocator, date2num
+from matplotlib.figure import Figure
+
+from .downsample import lttb_indices, segment_budgets
+from .regression import fit_segments
+
+matplotlib.rcParams["font.sans-serif"] = [
+    "Noto Sans Mono CJK SC"
+]  # 用来正常显示中文标签
+matplotlib.rcParams["axes.unicode_minus"] = False  # 用来正常显示负号
+
+# 历史记录的时间戳是相对该时刻的秒数（本地时间）
+EPOCH = datetime(1970, 1, 1)
+
+# 只为最近几段添加图例、功率与耗尽时间标注，段数很多时避免文字互相重叠
+ANNOTATED_SEGMENTS = 5
+
+
+def generate_graph(
+    times: np.ndarray, values: np.ndarray, location: str, max_points: int = 0
+) -> bytes:
+    """绘制电量变化与分段拟合图，返回 PNG 图片数据
+
+    只使用面向对象的 Figure 接口，不依赖 pyplot 的全局状态。
+    max_points 大于 0 时散点按段降采样到约 max_points 个，拟合仍使用全部数据；
+    图例与标注只针对最近 ANNOTATED_SEGMENTS 段
+    """
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    # 一次性完成分段与各段的线性拟合
+    fit = fit_segments(times, values)
+    budgets = segment_budgets(fit.counts, max_points)
+
+    vibrant_cmap = matplotlib.colormaps["Set1"]
+    num_colors = max(9, len(fit))
+    colors = vibrant_cmap(np.linspace(0, 1, num_colors))
+
+    # 创建图表并设置大小
+    fig = Figure(figsize=(12, 8))
+    ax = fig.subplots()
+
+    # 时间戳整体换算为 matplotlib 的日期数值，不为每条记录创建 datetime
+    dates = times / 86400 + date2num(EPOCH)
+    min_date = EPOCH + timedelta(seconds=float(times.min()))
+    max_date = EPOCH + timedelta(seconds=float(times.max()))
+
+    # 对于预测到电量为0的点，可能需要更大的时间范围
+    prediction_dates = []
+
+    first_annotated = len(fit) - ANNOTATED_SEGMENTS
+
+    for idx, color in zip(range(len(fit)), colors):
+        start, end = fit.starts[idx], fit.ends[idx]
+        annotated = idx >= first_annotated
+        seg_times = dates[start:end]
+        seg_values = values[start:end]
+
+        if len(seg_times) > 1:
+            m = fit.slopes[idx]
+            b = fit.intercepts[idx]
+
+            ref_time_num = seg_times[0]
+            ref_value = seg_values[0]
+            slope_per_day = m * 86400
+
+            ax.axline(
+                (ref_time_num, ref_value),
+                slope=slope_per_day,
+                linestyle="--",
+                color=color,
+                label=f"段 {idx + 1} (拟合)" if annotated else None,
+            )
+
+            if annotated:
+                # 计算功率信息
+                duration_hours = (times[end - 1] - times[start]) / 3600
+                energy_used = seg_values[0] - seg_values[-1]
+                avg_power_kWh = (
+                    energy_used / duration_hours if duration_hours > 0 else 0
+                )
+                avg_power_W = avg_power_kWh * 1000
+
+                # 标注平均功率
+                mid_time = seg_times[len(seg_times) // 2]
+                mid_value = np.mean(seg_values)
+                label = f"{avg_power_kWh:.2f} 度/小时\n({avg_power_W:.2f} W)"
+                ax.text(
+                    mid_time, mid_value, label, color=color, fontsize=12, ha="center"
+                )
+
+                # 预测电量耗尽时间点
+                if m < 0:
+                    y0_crossing_time_ts = -b / m
+                    y0_crossing_time = EPOCH + timedelta(seconds=y0_crossing_time_ts)
+                    prediction_dates.append(y0_crossing_time)
+
+                    # 绘制预测的零点
+                    ax.scatter(
+                        [date2num(y0_crossing_time)],
+                        [0],
+                        color=color,
+                        zorder=5,
+                        s=50,
+                        marker="X",
+                    )
+                    ax.text(
+                        date2num(y0_crossing_time),
+                        0,
+                        f"预计电量耗尽:\n{y0_crossing_time.strftime('%m-%d %H:%M')}",
+                        color=color,
+                        fontsize=9,
+                        ha="center",
+                        va="bottom",
+                        rotation=45,
+                    )
+
+        # 只对散点降采样，段首尾（充值点）总会保留
+        keep = lttb_indices(times[start:end], seg_values, budgets[idx])
+        ax.scatter(
+            seg_times[keep],
+            seg_values[keep],
+            label=f"段 {idx + 1}" if annotated else None,
+            color=color,
+        )
+
+    # 调整x轴的范围以包含预测点
+    if prediction_dates:
+        max_prediction = max(prediction_dates)
+        if max_prediction > max_date:
+            max_date = max_prediction
+
+    # 确保图表范围至少包括一周
+    date_range = max_date - min_date
+    if date_range.days < 7:
+        max_date = min_date + timedelta(days=7)
+
+    # 再额外增加两天，确保能看到预测点
+    max_date += timedelta(days=2)
+
+    ax.xaxis_date()
+    ax.set_xlim(date2num(min_date), date2num(max_date))
+
+    # 设置每天一个网格，时间跨度较长时由 matplotlib 自动选择间隔
+    if (max_date - min_date).days <= 31:
+        ax.xaxis.set_major_locator(DayLocator())
+    else:
+        ax.xaxis.set_major_locator(AutoDateLocator())
+    ax.xaxis.set_major_formatter(DateFormatter("%m-%d"))
+    ax.grid(True, which="major", axis="both", linestyle="-")
+
+    # 旋转x轴日期标签以避免重叠
+    setp(ax.get_xticklabels(), rotation=45, ha="right")
+
+    ax.set_title(f"电量变化与拟合 - {location}", fontsize=16)
+    ax.set_xlabel("日期", fontsize=12)
+    ax.set_ylabel("电量 (度)", fontsize=12)
+    ax.set_ylim(bottom=0)
+    ax.legend()
+
+    fig.tight_layout()
+    img_bytes_io = io.BytesIO()
+    fig.savefig(img_bytes_io, format="png", dpi=100)
+
+    return img_bytes_io.getvalue()
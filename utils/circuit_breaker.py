@@ -0,0 +1,137 @@
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器打开期间直接拒绝请求，不再访问上游"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"服务器暂时不可用，{retry_after:.0f} 秒后重试")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """按最近一段时间的失败率熔断
+
+    关闭状态下统计最近 window 秒内的请求，请求数不少于 min_requests 且失败率达到
+    failure_rate 时打开；打开 open_timeout 秒后进入半开状态，只放行 half_open_probes 个
+    探测请求，全部成功则关闭，任一失败则重新打开
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_requests: int = 10,
+        window: float = 60.0,
+        open_timeout: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.open_timeout = open_timeout
+        self.half_open_probes = max(1, half_open_probes)
+
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        # (时间, 是否失败)
+        self._results: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._probes = 0
+        self._probe_successes = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def _prune(self, now: float):
+        while self._results and self._results[0][0] <= now - self.window:
+            _, failed = self._results.popleft()
+            self._failures -= failed
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.opened += 1
+        self._results.clear()
+        self._failures = 0
+
+    def _half_open(self, now: float):
+        self.state = self.HALF_OPEN
+        self.opened_at = now
+        self._probes = 0
+        self._probe_successes = 0
+
+    def check(self):
+        """请求前调用，熔断期间抛出 CircuitOpenError"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.open_timeout - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(remaining)
+            self._half_open(now)
+
+        if self.state == self.HALF_OPEN:
+            # 探测请求被取消等原因迟迟没有结果时，重新开始一轮探测
+            if now - self.opened_at > self.open_timeout:
+                self._half_open(now)
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(self.open_timeout)
+            self._probes += 1
+
+    def record(self, failed: bool):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            if failed:
+                self._open(now)
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self.state = self.CLOSED
+            return
+        if self.state == self.OPEN:
+            # 打开前已发出的请求，结果不再统计
+            return
+
+        self._results.append((now, failed))
+        self._failures += failed
+        self._prune(now)
+        total = len(self._results)
+        if total >= self.min_requests and self._failures >= self.failure_rate * total:
+            self._open(now)
+
+
+class RetryBudget:
+    """限制重试请求占全部请求的比例，上游整体故障时不因重试成倍放大请求量
+
+    最近 window 秒内的重试次数不超过 min_retries + ratio × 请求次数
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window: float = 10.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _prune(self, events: Deque[float], now: float):
+        while events and events[0] <= now - self.window:
+            events.popleft()
+
+    def record_request(self):
+        self._requests.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        now = time.monotonic()
+        self._prune(self._requests, now)
+        self._prune(self._retries, now)
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            return False
+        self._retries.append(now)
+        return True
@@ -0,0 +1,101 @@
+import math
+import time
+from typing import Dict, List
+
+from nonebot import get_plugin_config, require
+from nonebot.log import logger
+
+require("nonebot_plugin_apscheduler")
+
+from nonebot_plugin_apscheduler import scheduler
+
+from ..config import Config
+from ..csust_api import CSUSTElectricityAPI, RoomKey, csust_api
+from ..db.repository import binding_repository
+from .electricity import reading_cache, update_electricity_history_many
+
+config = get_plugin_config(Config).csust_electricity
+
+
+class ReadingCollector:
+    """后台轮询所有已绑定宿舍的电量，历史记录不再依赖用户查询
+
+    每个宿舍每 interval 秒采集一次。任务每 tick 秒执行一次，每次只采集最久未采集的
+    一部分宿舍，请求因此均匀分布在整个周期内而不是集中发出。采集到的读数按原有的
+    「电量变化才记录」规则写入历史，并在 freshness 秒内直接用于用户查询。
+    """
+
+    def __init__(
+        self,
+        api: CSUSTElectricityAPI,
+        interval: float,
+        tick: float,
+        freshness: float,
+    ):
+        self.api = api
+        self.interval = interval
+        self.tick = min(tick, interval) if interval > 0 else tick
+        self.freshness = freshness
+        self.collected_at: Dict[RoomKey, float] = {}
+
+    def due_rooms(self, rooms: List[RoomKey], now: float) -> List[RoomKey]:
+        """本次需要采集的宿舍，数量按周期内均摊"""
+        # 已解绑的宿舍不再跟踪
+        bound = set(rooms)
+        for key in [key for key in self.collected_at if key not in bound]:
+            del self.collected_at[key]
+
+        due = [
+            key
+            for key in rooms
+            if now - self.collected_at.get(key, -math.inf) >= self.interval
+        ]
+        due.sort(key=lambda key: self.collected_at.get(key, -math.inf))
+
+        budget = math.ceil(len(rooms) * self.tick / self.interval)
+        return due[:budget]
+
+    async def collect(self):
+        """定时任务：采集一批到期宿舍的电量"""
+        now = time.monotonic()
+        due = self.due_rooms(await binding_repository.bound_rooms(), now)
+        if not due:
+            return
+
+        results = await self.api.aget_electricity_many(due)
+
+        readings = []
+        for key, result in results.items():
+            # 失败的宿舍同样等到下个周期再查询，避免持续重试
+            self.collected_at[key] = now
+            if isinstance(result, Exception):
+                logger.warning(f"电量采集: {' '.join(key)} 查询出错: {str(result)}")
+                continue
+
+            reading_cache.put(key, result, ttl=self.freshness)
+            readings.append((key, result))
+
+        changed = await update_electricity_history_many(readings)
+        logger.debug(
+            f"电量采集: 查询了 {len(due)} 个宿舍，{len(changed)} 个电量有变化，"
+            f"{len(due) - len(readings)} 个失败"
+        )
+
+
+reading_collector = ReadingCollector(
+    csust_api,
+    interval=config.collector_interval,
+    tick=config.collector_tick,
+    freshness=config.collector_freshness,
+)
+
+if config.collector_interval > 0:
+    scheduler.add_job(
+        reading_collector.collect,
+        "interval",
+        seconds=reading_collector.tick,
+        # 多个实例或重启后不在同一时刻开始采集
+        jitter=reading_collector.tick / 2,
+        id="electricity_collector",
+        replace_existing=True,
+    )
@@ -4,7 +4,10 @@ from nonebot.adapters.onebot.v11 import Event, GroupMessageEvent, PrivateMessage
 from nonebot.exception import FinishedException
 
 from ..csust_api import csust_api
-from ..db.electricity_db import Binding, SessionLocal
+from ..db.electricity_db import Binding
+from ..db.repository import binding_repository
+from .catalog import building_catalog
+from .metrics import db_query_seconds
 
 
 def get_sender_info(event: Event) -> Tuple[Literal["user", "group"], str]:
@@ -16,21 +19,18 @@ def get_sender_info(event: Event) -> Tuple[Literal["user", "group"], str]:
         raise FinishedException("不支持的消息类型")
 
 
-def get_binding(sender_type: str, id: str) -> Optional[Binding]:
-    with SessionLocal() as session:
-        if sender_type == "user":
-            return session.query(Binding).filter(Binding.qq_number == id).first()
-        else:
-            return session.query(Binding).filter(Binding.group_number == id).first()
+async def get_binding(sender_type: str, id: str) -> Optional[Binding]:
+    with db_query_seconds.labels("get_binding").time():
+        return await binding_repository.get_by_sender(sender_type, id)
 
 
-def validate_campus_building(
+async def validate_campus_building(
     campus: str, building: Optional[str] = None
 ) -> Tuple[bool, str]:
     if campus not in csust_api.get_campus_names():
         return False, "校区名称错误，请检查输入\nTips：校区名称为「金盆岭」或「云塘」"
 
-    if building and building not in csust_api.get_buildings(campus):
+    if building and await building_catalog.lookup(campus, building) is None:
         return (
             False,
             "楼栋名称错误，请检查输入\nTips：发送「电量 校区」可以查看校区宿舍楼",
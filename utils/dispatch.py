@@ -0,0 +1,315 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from nonebot import get_bot, get_plugin_config
+from nonebot.adapters import Bot
+from nonebot.exception import ApiNotAvailable
+from nonebot.log import logger
+
+from ..config import Config
+from .metrics import metrics, outbound_delivery_seconds, outbound_send_seconds
+from .rate_limit import TokenBucket
+
+config = get_plugin_config(Config).csust_electricity
+
+# 发送目标 ("private" 或 "group", QQ号或群号)
+Target = Tuple[str, int]
+
+# 数值越小越先发送；交互回复不经过队列，见 account_interactive_message
+PRIORITY_SCHEDULED = 1
+
+
+class BotUnavailable(Exception):
+    """没有已连接的 Bot，通常是协议端正在重连"""
+
+
+# 可以重试的临时故障，只包括请求发出前的错误。NetworkError 与超时可能发生在协议端
+# 已经发出消息之后，重试会重复发送，因此直接失败
+TRANSIENT_ERRORS = (ApiNotAvailable, BotUnavailable)
+
+# 发送队列的工作协程中为 True，用于区分队列发出的消息与交互回复
+_dispatching: ContextVar[bool] = ContextVar(
+    "csust_electricity_dispatching", default=False
+)
+
+
+@dataclass(eq=False)
+class OutboundMessage:
+    target: Target
+    message: Any
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+class OutboundDispatcher:
+    """带限速、重试与优先级的消息发送队列
+
+    全局与每个目标各有一个令牌桶；某个目标的额度用完时消息延后重新入队，不阻塞发往其他目标
+    的消息。交互回复不经过队列，由 on_calling_api 钩子直接扣除令牌，队列中的推送随之让出额度
+    """
+
+    # 最多保留的目标令牌桶数，超出时淘汰最久未使用的
+    MAX_TARGETS = 4096
+    # 计算发送延迟分位数时保留的最近样本数
+    LATENCY_SAMPLES = 1024
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        target_rate: float,
+        target_burst: float,
+        workers: int,
+        max_retries: int,
+        retry_backoff: float,
+    ):
+        self.global_bucket = TokenBucket(rate, burst)
+        self.target_rate = target_rate
+        self.target_burst = target_burst
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self._target_buckets: "OrderedDict[Target, TokenBucket]" = OrderedDict()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._delayed: Set[asyncio.TimerHandle] = set()
+        self._pending: Set[OutboundMessage] = set()
+        self._seq = itertools.count()
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.interactive = 0
+        self._latencies: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+        self._call_times: Deque[float] = deque(maxlen=self.LATENCY_SAMPLES)
+
+    def _target_bucket(self, target: Target) -> TokenBucket:
+        bucket = self._target_buckets.get(target)
+        if bucket is None:
+            bucket = TokenBucket(self.target_rate, self.target_burst)
+            self._target_buckets[target] = bucket
+            while len(self._target_buckets) > self.MAX_TARGETS:
+                self._target_buckets.popitem(last=False)
+        self._target_buckets.move_to_end(target)
+        return bucket
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._worker()) for _ in range(self.workers)
+            ]
+
+    def _put(self, priority: int, item: OutboundMessage):
+        assert self._queue is not None
+        self._queue.put_nowait((priority, next(self._seq), item))
+
+    def _put_later(self, delay: float, priority: int, item: OutboundMessage):
+        loop = asyncio.get_running_loop()
+
+        def put():
+            self._delayed.discard(handle)
+            self._put(priority, item)
+
+        handle = loop.call_later(delay, put)
+        self._delayed.add(handle)
+
+    async def send(
+        self, target: Target, message: Any, priority: int = PRIORITY_SCHEDULED
+    ):
+        """把消息放入队列并等待发送完成，重试耗尽后抛出最后一次的异常"""
+        self._start()
+        item = OutboundMessage(
+            target, message, asyncio.get_running_loop().create_future()
+        )
+        self._pending.add(item)
+        self._put(priority, item)
+        try:
+            await item.future
+        finally:
+            self._pending.discard(item)
+
+    def consume(self, target: Optional[Target]):
+        """记录一条不经过队列的消息占用的额度"""
+        self.interactive += 1
+        self.global_bucket.consume()
+        if target is not None:
+            self._target_bucket(target).consume()
+
+    async def _call(self, target: Target, message: Any):
+        try:
+            bot = get_bot()
+        except ValueError as e:
+            raise BotUnavailable(str(e)) from e
+
+        kind, id = target
+        if kind == "group":
+            await bot.send_group_msg(group_id=id, message=message)
+        else:
+            await bot.send_private_msg(user_id=id, message=message)
+
+    async def _deliver(self, priority: int, item: OutboundMessage):
+        item.attempts += 1
+        start = time.monotonic()
+        try:
+            await self._call(item.target, item.message)
+        except TRANSIENT_ERRORS as e:
+            if item.attempts > self.max_retries:
+                self._finish(item, e)
+                return
+            # 指数退避并加入随机抖动，避免同时失败的消息同时重试
+            delay = self.retry_backoff * 2 ** (item.attempts - 1)
+            delay *= random.uniform(0.5, 1.5)
+            self.retried += 1
+            logger.warning(
+                f"发送消息给 {item.target[1]} 失败，{delay:.1f} 秒后重试: {str(e)}"
+            )
+            self._put_later(delay, priority, item)
+        except Exception as e:
+            self._finish(item, e)
+        else:
+            now = time.monotonic()
+            self._call_times.append(now - start)
+            self._latencies.append(now - item.enqueued_at)
+            outbound_send_seconds.observe(now - start)
+            outbound_delivery_seconds.observe(now - item.enqueued_at)
+            self._finish(item)
+
+    def _finish(self, item: OutboundMessage, error: Optional[Exception] = None):
+        if error is None:
+            self.sent += 1
+        else:
+            self.failed += 1
+        if item.future.done():
+            return
+        if error is None:
+            item.future.set_result(None)
+        else:
+            item.future.set_exception(error)
+
+    async def _worker(self):
+        _dispatching.set(True)
+        queue = self._queue
+        assert queue is not None
+        while True:
+            priority, _, item = await queue.get()
+            try:
+                if item.future.done():
+                    continue
+                # 目标额度不足时延后重新入队，先发送其他目标的消息
+                wait = self._target_bucket(item.target).delay()
+                if wait > 0:
+                    self._put_later(wait, priority, item)
+                    continue
+                await self.global_bucket.acquire()
+                self._target_bucket(item.target).consume()
+                await self._deliver(priority, item)
+            except Exception as e:
+                self._finish(item, e)
+            finally:
+                queue.task_done()
+
+    async def close(self):
+        for handle in self._delayed:
+            handle.cancel()
+        self._delayed.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+        for item in self._pending:
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("消息发送队列已关闭"))
+
+    @staticmethod
+    def _percentile(samples: Deque[float], q: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "delayed": len(self._delayed),
+            "pending": len(self._pending),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "interactive": self.interactive,
+            "latency_p50": self._percentile(self._latencies, 0.5),
+            "latency_p95": self._percentile(self._latencies, 0.95),
+            "send_p95": self._percentile(self._call_times, 0.95),
+        }
+
+
+def message_target(api: str, data: Dict[str, Any]) -> Optional[Target]:
+    """从 OneBot 发送消息的 API 参数中取出发送目标，不是发送消息的 API 时返回 None"""
+    if api == "send_msg":
+        kind = data.get("message_type") or (
+            "group" if data.get("group_id") is not None else "private"
+        )
+        api = f"send_{kind}_msg"
+
+    id = data.get("group_id" if api == "send_group_msg" else "user_id")
+    if api not in ("send_private_msg", "send_group_msg") or id is None:
+        return None
+    return ("group" if api == "send_group_msg" else "private", int(id))
+
+
+outbound_dispatcher = OutboundDispatcher(
+    rate=config.outbound_rate,
+    burst=config.outbound_burst,
+    target_rate=config.outbound_target_rate,
+    target_burst=config.outbound_target_burst,
+    workers=config.outbound_workers,
+    max_retries=config.outbound_max_retries,
+    retry_backoff=config.outbound_retry_backoff,
+)
+
+metrics.counter(
+    "outbound_messages_total",
+    "消息发送结果：队列发出（sent）、失败（failed）、重试（retried）与不经过队列的交互回复"
+    "（interactive）",
+    ("result",),
+    callback=lambda: {
+        ("sent",): outbound_dispatcher.sent,
+        ("failed",): outbound_dispatcher.failed,
+        ("retried",): outbound_dispatcher.retried,
+        ("interactive",): outbound_dispatcher.interactive,
+    },
+)
+
+
+def _queue_sizes() -> Dict[Tuple[str, ...], float]:
+    stats = outbound_dispatcher.stats()
+    return {("queued",): stats["queued"], ("delayed",): stats["delayed"]}
+
+
+metrics.gauge(
+    "outbound_queue_size",
+    "发送队列中等待发送（queued）与等待限速或重试（delayed）的消息数",
+    ("state",),
+    callback=_queue_sizes,
+)
+
+
+@Bot.on_calling_api
+async def account_interactive_message(bot: Bot, api: str, data: Dict[str, Any]):
+    """交互回复直接发送，只扣除额度，使排队中的定时推送为其让路"""
+    if _dispatching.get():
+        return
+    target = message_target(api, data)
+    if target is not None:
+        outbound_dispatcher.consume(target)
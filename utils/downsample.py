@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets 降采样，返回保留点的下标
+
+    首尾两个点总是保留，其余每个桶保留与相邻桶构成三角形面积最大的点，
+    能较好地保留曲线的形状
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.intp)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
+
+
+def segment_budgets(counts: np.ndarray, max_points: int) -> np.ndarray:
+    """按各段点数比例分配降采样后的点数，每段至少保留首尾与一个中间点"""
+    total = counts.sum()
+    if max_points <= 0 or total <= max_points:
+        return counts
+    budgets = np.maximum(3, np.round(counts * max_points / total).astype(np.intp))
+    return np.minimum(budgets, counts)
@@ -1,104 +1,145 @@
 from datetime import datetime
-from typing import Optional, Tuple
-
-import numpy as np
-from sklearn.linear_model import LinearRegression
-
-from ..csust_api import ElectricityInfo, csust_api
-from ..db.electricity_db import ElectricityHistory, SessionLocal
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from nonebot import get_plugin_config
+from nonebot.log import logger
+
+from ..config import Config
+from ..csust_api import Building, Campus, ElectricityInfo, Room, RoomKey, csust_api
+from ..db.repository import history_repository
+from .cache import ChartCache, ReadingCache
+from .metrics import db_query_seconds, metrics
+
+config = get_plugin_config(Config).csust_electricity
+
+reading_cache: ReadingCache[ElectricityInfo] = ReadingCache(
+    ttl=config.reading_cache_ttl, max_size=config.reading_cache_size
+)
+
+chart_cache = ChartCache(
+    max_bytes=config.chart_cache_max_bytes,
+    disk_path=(
+        Path(config.data_storage_path) / "charts" if config.chart_cache_disk else None
+    ),
+)
+
+metrics.counter(
+    "cache_requests_total",
+    "缓存查询次数，result 为 hit、miss 或 coalesced（合并到正在进行的请求）",
+    ("cache", "result"),
+    callback=lambda: {
+        ("reading", "hit"): reading_cache.hits,
+        ("reading", "miss"): reading_cache.misses,
+        ("reading", "coalesced"): reading_cache.coalesced,
+        ("chart", "hit"): chart_cache.hits,
+        ("chart", "miss"): chart_cache.misses,
+    },
+)
+metrics.gauge(
+    "chart_cache_bytes",
+    "图表缓存占用的内存（字节）",
+    callback=lambda: {(): chart_cache.size},
+)
+
+
+async def update_electricity_history_many(
+    readings: Iterable[Tuple[RoomKey, ElectricityInfo]],
+) -> List[RoomKey]:
+    """批量写入电量读数，只记录电量有变化的宿舍，返回有变化的宿舍"""
+    with db_query_seconds.labels("update_electricity_history").time():
+        changed = await history_repository.add_readings(
+            {key: electricity_info.value for key, electricity_info in readings}
+        )
+    for room_id in changed.values():
+        chart_cache.invalidate(room_id)
+    return list(changed)
 
 
-def update_electricity_history(
+async def update_electricity_history(
     electricity_info: ElectricityInfo,
     campus: str,
     building: str,
     room: str,
 ) -> bool:
-    with SessionLocal() as session:
-        last_record = (
-            session.query(ElectricityHistory)
-            .filter(
-                ElectricityHistory.campus == campus,
-                ElectricityHistory.building == building,
-                ElectricityHistory.room == room,
-            )
-            .order_by(ElectricityHistory.record_time.desc())
-            .first()
-        )
-        if not last_record or last_record.electricity != electricity_info.value:
-            session.add(
-                ElectricityHistory(
-                    electricity=electricity_info.value,
-                    campus=campus,
-                    building=building,
-                    room=room,
-                )
-            )
-            session.commit()
-            return True
-        return False
-
-
-def predict_empty_time(campus: str, building: str, room: str) -> Optional[datetime]:
-    with SessionLocal() as session:
-        records = (
-            session.query(ElectricityHistory)
-            .filter(
-                ElectricityHistory.campus == campus,
-                ElectricityHistory.building == building,
-                ElectricityHistory.room == room,
-            )
-            .order_by(ElectricityHistory.record_time.desc())
-            .all()
+    return bool(
+        await update_electricity_history_many(
+            [((campus, building, room), electricity_info)]
         )
+    )
 
-        if len(records) < 2:
-            return None
-
-        # 转换成降序时间顺序的记录
-        records.reverse()
-
-        # 找出最后一段连续下降的记录
-        current_segment = []
-        for i in range(len(records)):
-            if i == 0 or records[i].electricity <= records[i - 1].electricity:
-                current_segment.append((records[i].record_time, records[i].electricity))
-            else:
-                # 电量增加了，说明充值了，重新开始记录
-                current_segment = [(records[i].record_time, records[i].electricity)]
 
-        # 如果最后一段只有一个点，无法预测
-        if len(current_segment) < 2:
-            return None
-
-        # 使用线性回归预测
-        times = np.array([t[0].timestamp() for t in current_segment]).reshape(-1, 1)
-        values = np.array([v[1] for v in current_segment]).reshape(-1, 1)
-
-        model = LinearRegression()
-        model.fit(times, values)
+async def predict_empty_time(
+    campus: str, building: str, room: str
+) -> Optional[datetime]:
+    with db_query_seconds.labels("predict_empty_time").time():
+        return await history_repository.predict_empty_time(campus, building, room)
 
-        m = model.coef_[0][0]
-        b = model.intercept_[0]
 
-        # 如果斜率为正或为零，则电量在增加，不需要预测
-        if m >= 0:
-            return None
+async def stale_electricity(
+    campus: str, building: str, room: str
+) -> Optional[ElectricityInfo]:
+    """上游不可用时使用的最近一次记录的电量，没有记录时返回 None"""
+    latest = await history_repository.latest_reading(campus, building, room)
+    if latest is None:
+        return None
+
+    recorded_at, value = latest
+    campus_obj = csust_api.campuses.get(campus) or Campus(name=campus, id="")
+    building_obj = csust_api.buildings_cache.get(campus, {}).get(building) or Building(
+        name=building, id="", campus=campus_obj
+    )
+    return ElectricityInfo(
+        value=value,
+        room=Room(id=room, building=building_obj),
+        fetched_at=recorded_at,
+        stale=True,
+    )
+
+
+async def query_electricity(
+    campus: str, building: str, room: str
+) -> Tuple[ElectricityInfo, Optional[datetime]]:
+    try:
+        electricity_info, fetched = await reading_cache.get_or_fetch(
+            (campus, building, room),
+            lambda: csust_api.aget_electricity(campus, building, room),
+        )
+    except ConnectionError as e:
+        # 上游故障或熔断期间退回最近一次记录的电量，并标记为旧读数
+        electricity_info = await stale_electricity(campus, building, room)
+        if electricity_info is None:
+            raise
+        logger.warning(f"{campus} {building} {room} 查询失败，使用历史记录: {str(e)}")
+        fetched = False
+
+    # 缓存命中的读数已经写入过历史记录
+    if fetched:
+        await update_electricity_history(electricity_info, campus, building, room)
+    empty_time = await predict_empty_time(campus, building, room)
+    return electricity_info, empty_time
 
-        # 计算电量为0时的时间点
-        empty_time_timestamp = -b / m
-        empty_time = datetime.fromtimestamp(empty_time_timestamp)
 
-        return empty_time
+def format_age(seconds: float) -> str:
+    if seconds < 60:
+        return "不到 1 分钟"
+    if seconds < 3600:
+        return f"{int(seconds // 60)} 分钟"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)} 小时"
+    return f"{int(seconds // 86400)} 天"
 
 
-def query_electricity(
-    campus: str, building: str, room: str
-) -> Tuple[ElectricityInfo, Optional[datetime]]:
-    electricity_info = csust_api.get_electricity(campus, building, room)
-    update_electricity_history(electricity_info, campus, building, room)
-    empty_time = predict_empty_time(campus, building, room)
-    return electricity_info, empty_time
+def stale_notice(electricity_info: ElectricityInfo) -> str:
+    """旧读数的提示，附加在电量信息之后；正常读数返回空字符串"""
+    if not electricity_info.stale:
+        return ""
+    age = (datetime.now() - electricity_info.fetched_at).total_seconds()
+    return (
+        f"\n注意：学校服务器暂时无法访问，以上为 "
+        f"{electricity_info.fetched_at.strftime('%Y-%m-%d %H:%M')} 记录的电量"
+        f"（{format_age(age)}前）"
+    )
 
 
 def validate_time_format(time_str: str) -> bool:
@@ -108,3 +149,9 @@ def validate_time_format(time_str: str) -> bool:
         return 0 <= hour_int < 24 and 0 <= minute_int < 60
     except (ValueError, TypeError):
         return False
+
+
+def normalize_time_format(time_str: str) -> str:
+    """把 8:00、8:5 等写法统一为补零的 HH:MM，定时任务按这个格式查找到期的绑定"""
+    hour, minute = time_str.split(":")
+    return f"{int(hour):02d}:{int(minute):02d}"
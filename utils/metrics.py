@@ -0,0 +1,275 @@
+"""Prometheus 文本格式的运行指标
+
+只实现计数器、仪表与直方图三种类型，记录一次观测只需一次字典查找与一次二分查找，
+可以在生产环境中一直开启。已有统计计数的对象（缓存、发送队列、熔断器）通过 callback
+在导出时读取，不在热点路径上重复计数
+"""
+
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+# 导出时调用，返回 {标签值: 数值}，没有标签时键为 ()
+Callback = Callable[[], Mapping[LabelValues, float]]
+
+# 秒级耗时的默认分桶
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = "csust_electricity_"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class _Timer:
+    __slots__ = ("observe", "start")
+
+    def __init__(self, observe: Callable[[float], None]):
+        self.observe = observe
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.observe(time.perf_counter() - self.start)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # 最后一个为 +Inf 桶
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        """计时上下文管理器，退出时记录经过的秒数（包括抛出异常的情况）"""
+        return _Timer(self.observe)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._children: Dict[LabelValues, object] = {}
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(
+                    f"指标 {self.name} 需要 {len(self.labelnames)} 个标签值: {values}"
+                )
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> Iterator[Tuple[str, Sequence[str], LabelValues, float]]:
+        """(名称后缀, 标签名, 标签值, 数值)"""
+        if self.callback is not None:
+            values = self.callback().items()
+        else:
+            values = ((key, child.value) for key, child in self._children.items())
+        for key, value in values:
+            yield "", self.labelnames, key, value
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} "
+            + self.documentation.replace("\\", r"\\").replace("\n", r"\n"),
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, names, values, value in self._samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, values)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _samples(self):
+        names = self.labelnames + ("le",)
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, child.sum
+            yield "_count", self.labelnames, key, cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标 {metric.name} 已存在")
+        self._metrics[metric.name] = metric
+
+    def counter(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> Counter:
+        metric = Counter(PREFIX + name, documentation, labelnames, callback)
+        self.register(metric)
+        return metric
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Optional[Callback] = None,
+    ) -> Gauge:
+        metric = Gauge(PREFIX + name, documentation, labelnames, callback)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(PREFIX + name, documentation, labelnames, buckets)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# 热点路径上直接记录的指标；读取已有统计的指标在对应对象旁注册
+
+upstream_request_seconds = metrics.histogram(
+    "upstream_request_seconds",
+    "上游接口 HTTP 请求耗时（秒），不含限速与并发排队时间",
+    ("funname",),
+)
+upstream_errors = metrics.counter(
+    "upstream_errors_total",
+    "上游接口请求失败次数，reason 为 connection、invalid_response 或 circuit_open",
+    ("funname", "reason"),
+)
+db_query_seconds = metrics.histogram(
+    "db_query_seconds",
+    "数据库操作耗时（秒）",
+    ("operation",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+chart_render_seconds = metrics.histogram(
+    "chart_render_seconds",
+    "图表渲染耗时（秒），包含等待渲染进程的时间",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+scheduler_lag_seconds = metrics.histogram(
+    "scheduler_lag_seconds",
+    "定时查询实际开始时间与计划时间之差（秒）",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+outbound_send_seconds = metrics.histogram(
+    "outbound_send_seconds",
+    "定时推送调用发送消息 API 的耗时（秒）",
+)
+outbound_delivery_seconds = metrics.histogram(
+    "outbound_delivery_seconds",
+    "定时推送从进入发送队列到发出的耗时（秒），包含限速等待与重试",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
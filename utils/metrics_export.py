@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+
+from nonebot import get_driver, get_plugin_config, require
+from nonebot.drivers import ASGIMixin, HTTPServerSetup, Request, Response
+from nonebot.log import logger
+from yarl import URL
+
+require("nonebot_plugin_apscheduler")
+
+from nonebot_plugin_apscheduler import scheduler
+
+from ..config import Config
+from .metrics import metrics
+
+config = get_plugin_config(Config).csust_electricity
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+async def handle_metrics(request: Request) -> Response:
+    return Response(
+        200, headers={"Content-Type": CONTENT_TYPE}, content=metrics.render()
+    )
+
+
+def write_metrics_file(path: Path):
+    """先写入临时文件再替换，读取方不会读到写了一半的文件"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(metrics.render(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+driver = get_driver()
+
+if config.metrics_path:
+    if isinstance(driver, ASGIMixin):
+        driver.setup_http_server(
+            HTTPServerSetup(
+                path=URL(config.metrics_path),
+                method="GET",
+                name="csust_electricity_metrics",
+                handle_func=handle_metrics,
+            )
+        )
+    else:
+        logger.info(
+            f"当前驱动器 {driver.type} 不提供 HTTP 服务，指标接口未注册，"
+            f"可设置 metrics_file 把指标写入文件"
+        )
+
+if config.metrics_file:
+    metrics_file = Path(config.metrics_file)
+    metrics_file.parent.mkdir(parents=True, exist_ok=True)
+    scheduler.add_job(
+        write_metrics_file,
+        "interval",
+        seconds=config.metrics_file_interval,
+        args=(metrics_file,),
+        id="electricity_metrics_file",
+        replace_existing=True,
+    )
@@ -0,0 +1,50 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """令牌桶限速器，rate 为每秒补充的令牌数，为 0 时不限速"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """距离可以取得 tokens 个令牌还需等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def consume(self, tokens: float = 1.0):
+        """立即扣除令牌而不等待，令牌不足时记为欠额，由之后 acquire 的调用者多等待"""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens -= tokens
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        # 先预留令牌再等待，并发调用者按到达顺序排队
+        self._refill()
+        self.tokens -= tokens
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
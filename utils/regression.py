@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SegmentFit:
+    """按充值点切分后各放电段的线性拟合结果
+
+    starts/ends 为各段在原序列中的下标区间 [start, end)，
+    slopes/intercepts 对应原始时间戳（秒），单点段的拟合结果为 nan
+    """
+
+    starts: np.ndarray
+    ends: np.ndarray
+    slopes: np.ndarray
+    intercepts: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self.ends - self.starts
+
+
+def segment_starts(values: np.ndarray) -> np.ndarray:
+    """各放电段的起始下标，电量上升说明充值了，从该点开始新的一段"""
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.intp)
+    return np.concatenate(([0], np.flatnonzero(np.diff(values) > 0) + 1))
+
+
+def segment_sums(times: np.ndarray, values: np.ndarray, starts: np.ndarray):
+    """各段以段起点为时间原点的 (n, Σt, Σv, Σt², Σtv)"""
+    counts = np.diff(np.append(starts, len(values)))
+    origins = np.repeat(times[starts], counts)
+    t = times - origins
+    return (
+        counts,
+        np.add.reduceat(t, starts),
+        np.add.reduceat(values, starts),
+        np.add.reduceat(t * t, starts),
+        np.add.reduceat(t * values, starts),
+    )
+
+
+def fit_segments(times: np.ndarray, values: np.ndarray) -> SegmentFit:
+    """一次向量化计算所有放电段的最小二乘直线"""
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+
+    starts = segment_starts(values)
+    ends = np.append(starts[1:], len(values)).astype(np.intp)
+    if len(starts) == 0:
+        empty = np.zeros(0)
+        return SegmentFit(starts, ends, empty, empty)
+
+    n, sum_t, sum_v, sum_tt, sum_tv = segment_sums(times, values, starts)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = n * sum_tt - sum_t * sum_t
+        slopes = np.where(
+            denominator > 0, (n * sum_tv - sum_t * sum_v) / denominator, np.nan
+        )
+        intercepts = (sum_v - slopes * sum_t) / n - slopes * times[starts]
+
+    return SegmentFit(starts, ends, slopes, intercepts)
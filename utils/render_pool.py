@@ -0,0 +1,219 @@
+import asyncio
+import pickle
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Set
+
+from nonebot import get_plugin_config
+from nonebot.log import logger
+
+from ..config import Config
+from .metrics import chart_render_seconds, metrics
+
+if TYPE_CHECKING:
+    import numpy as np
+
+config = get_plugin_config(Config).csust_electricity
+
+WORKER_SCRIPT = Path(__file__).resolve().parent / "render_worker.py"
+# 与 render_worker.HEADER 一致：4 字节大端长度
+HEADER_SIZE = 4
+
+
+def _render(
+    times: "np.ndarray", values: "np.ndarray", location: str, max_points: int
+) -> bytes:
+    # 在后台线程中执行，matplotlib 只在第一次渲染时导入
+    from .chart import generate_graph
+
+    return generate_graph(times, values, location, max_points)
+
+
+class RenderError(Exception):
+    """渲染进程中绘图失败，进程本身仍可继续使用"""
+
+
+class RenderWorker:
+    """一个独立的渲染进程，同一时间只处理一个请求"""
+
+    def __init__(self, process: asyncio.subprocess.Process):
+        self.process = process
+        self.tasks = 0
+
+    @classmethod
+    async def start(cls) -> "RenderWorker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            str(WORKER_SCRIPT),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        return cls(process)
+
+    async def call(self, operation: str, *args):
+        assert self.process.stdin is not None and self.process.stdout is not None
+        data = pickle.dumps((operation, args), protocol=pickle.HIGHEST_PROTOCOL)
+        self.process.stdin.write(len(data).to_bytes(HEADER_SIZE, "big") + data)
+        await self.process.stdin.drain()
+
+        header = await self.process.stdout.readexactly(HEADER_SIZE)
+        ok, result = pickle.loads(
+            await self.process.stdout.readexactly(int.from_bytes(header, "big"))
+        )
+        self.tasks += 1
+        if not ok:
+            raise RenderError(result)
+        return result
+
+    def kill(self):
+        if self.process.returncode is None:
+            self.process.kill()
+
+
+class ChartRenderer:
+    """在独立的渲染进程中渲染图表，避免阻塞事件循环
+
+    渲染进程直接以 `python render_worker.py` 启动，不经过 multiprocessing，不会重新执行
+    主进程的 __main__，也不会导入插件与 NoneBot。每个进程同一时间只处理一个请求，
+    超时时只结束该进程，其余渲染不受影响；workers 为 0 时退化为在单个后台线程中渲染
+    """
+
+    # 每个渲染进程处理这么多次请求后重启，避免 matplotlib 的缓存持续增长
+    MAX_TASKS_PER_WORKER = 100
+
+    def __init__(self, workers: int, timeout: float, max_pending: int):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+
+        self._idle: List[RenderWorker] = []
+        self._busy: Set[RenderWorker] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._exiting: Set[asyncio.Task] = set()
+        self._thread_lock = threading.Lock()
+        self.pending = 0
+
+    @property
+    def use_processes(self) -> bool:
+        return self.workers > 0
+
+    def _stop(self, worker: RenderWorker):
+        """结束渲染进程，并在后台回收它"""
+        worker.kill()
+        task = asyncio.ensure_future(worker.process.wait())
+        self._exiting.add(task)
+        task.add_done_callback(self._exiting.discard)
+
+    async def close(self):
+        workers = self._idle + list(self._busy)
+        for worker in workers:
+            worker.kill()
+        self._idle.clear()
+        self._busy.clear()
+        await asyncio.gather(
+            *(worker.process.wait() for worker in workers),
+            *self._exiting,
+            return_exceptions=True,
+        )
+        self._slots = None
+
+    def _render_locked(self, times, values, location, max_points) -> bytes:
+        with self._thread_lock:
+            return _render(times, values, location, max_points)
+
+    def _release(self, task: "asyncio.Future[bytes]"):
+        self.pending -= 1
+        # 超时后没有等待方，避免 "exception was never retrieved" 警告
+        if not task.cancelled():
+            task.exception()
+
+    async def _render_in_thread(self, times, values, location, max_points) -> bytes:
+        # 线程无法中断，超时后仍占用名额，直到线程真正结束
+        task = asyncio.ensure_future(
+            asyncio.to_thread(self._render_locked, times, values, location, max_points)
+        )
+        task.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+
+    async def _acquire(self) -> RenderWorker:
+        if self._idle:
+            return self._idle.pop()
+        worker = await RenderWorker.start()
+        logger.debug(f"图表渲染进程已启动: pid {worker.process.pid}")
+        return worker
+
+    async def _render_in_process(self, times, values, location, max_points) -> bytes:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+
+        async with self._slots:
+            worker = await self._acquire()
+            self._busy.add(worker)
+            try:
+                image = await worker.call("render", times, values, location, max_points)
+            except RenderError:
+                self._busy.discard(worker)
+                self._idle.append(worker)
+                raise
+            except BaseException:
+                # 超时、取消或进程异常退出：进程状态未知，只结束这一个进程
+                self._busy.discard(worker)
+                self._stop(worker)
+                raise
+
+            self._busy.discard(worker)
+            if worker.tasks >= self.MAX_TASKS_PER_WORKER:
+                self._stop(worker)
+            else:
+                self._idle.append(worker)
+            return image
+
+    async def render(
+        self,
+        times: "np.ndarray",
+        values: "np.ndarray",
+        location: str,
+        max_points: int = 0,
+    ) -> bytes:
+        """渲染图表并返回 PNG 图片数据"""
+        if self.pending >= self.max_pending:
+            raise RuntimeError("图表生成任务过多，请稍后再试")
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            if self.use_processes:
+                try:
+                    # 超时包含等待空闲渲染进程的时间
+                    image = await asyncio.wait_for(
+                        self._render_in_process(times, values, location, max_points),
+                        self.timeout,
+                    )
+                finally:
+                    self.pending -= 1
+            else:
+                # 名额由后台线程结束时释放
+                image = await self._render_in_thread(
+                    times, values, location, max_points
+                )
+        except asyncio.TimeoutError:
+            logger.warning("图表渲染超时")
+            raise TimeoutError("图表生成超时，请稍后再试")
+
+        chart_render_seconds.observe(time.perf_counter() - start)
+        return image
+
+
+chart_renderer = ChartRenderer(
+    workers=config.graph_render_workers,
+    timeout=config.graph_render_timeout,
+    max_pending=config.graph_render_queue_size,
+)
+
+metrics.gauge(
+    "chart_render_pending",
+    "正在渲染或等待渲染的图表数",
+    callback=lambda: {(): chart_renderer.pending},
+)
@@ -0,0 +1,81 @@
+"""图表渲染进程
+
+由 ChartRenderer 以 `python render_worker.py` 的方式启动，不经过 multiprocessing，
+因此不会重新执行主进程的 __main__（通常是初始化 NoneBot 并加载全部插件的 bot.py），
+也不会导入插件包。本文件只依赖标准库；绘图用到的 chart、downsample 与 regression
+只有包内相对导入，在这里以独立的包名从本目录加载。
+
+通信使用标准输入输出：每条消息为 4 字节大端长度加 pickle 数据。
+请求为 (操作, 参数)，应答为 (True, 结果) 或 (False, 错误信息)。
+"""
+
+import importlib
+import importlib.util
+import pickle
+import struct
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+PACKAGE = "csust_electricity_render"
+HEADER = struct.Struct("!I")
+
+
+def _chart_module():
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_loader(PACKAGE, None, is_package=True)
+        package = importlib.util.module_from_spec(spec)
+        package.__path__ = [str(HERE)]
+        sys.modules[PACKAGE] = package
+    return importlib.import_module(f"{PACKAGE}.chart")
+
+
+def render(times, values, location: str, max_points: int) -> bytes:
+    # matplotlib 只在第一次渲染时导入
+    return _chart_module().generate_graph(times, values, location, max_points)
+
+
+def modules():
+    """已导入的模块名，用于检查渲染进程没有导入插件与 NoneBot"""
+    return sorted(sys.modules)
+
+
+OPERATIONS = {"render": render, "modules": modules}
+
+
+def _read(stream):
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    return pickle.loads(stream.read(HEADER.unpack(header)[0]))
+
+
+def _write(stream, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    stream.write(HEADER.pack(len(data)) + data)
+    stream.flush()
+
+
+def main():
+    # 以脚本运行时本目录位于 sys.path 首位，其中的 cache、metrics 等模块名可能遮蔽第三方库
+    if sys.path and Path(sys.path[0] or ".").resolve() == HERE:
+        del sys.path[0]
+
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # 标准输出只用于应答，库打印的内容转到标准错误
+    sys.stdout = sys.stderr
+
+    while True:
+        request = _read(stdin)
+        if request is None:
+            return
+        operation, args = request
+        try:
+            response = (True, OPERATIONS[operation](*args))
+        except Exception as e:
+            response = (False, f"{type(e).__name__}: {e}")
+        _write(stdout, response)
+
+
+if __name__ == "__main__":
+    main()
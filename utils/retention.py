@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from nonebot import get_plugin_config, require
+from nonebot.log import logger
+
+require("nonebot_plugin_apscheduler")
+
+from nonebot_plugin_apscheduler import scheduler
+
+from ..config import Config
+from ..db.electricity_db import DailyRollup, ElectricityHistory, HourlyRollup
+from ..db.repository import HistoryRepository, history_repository
+from .electricity import chart_cache
+
+config = get_plugin_config(Config).csust_electricity
+
+
+class HistoryRetention:
+    """把超过保留期的原始记录按小时汇总，再把更早的小时汇总按天汇总
+
+    每次只处理一批宿舍的一个分块并单独提交，分块之间让出事件循环，
+    积压很多记录时也不会长时间占用数据库
+    """
+
+    # 每个分块涉及的宿舍数
+    ROOM_BATCH = 100
+
+    def __init__(
+        self,
+        repository: HistoryRepository,
+        raw_retention: timedelta,
+        hourly_retention: timedelta,
+        chunk_size: int,
+    ):
+        self.repository = repository
+        self.raw_retention = raw_retention
+        self.hourly_retention = hourly_retention
+        self.chunk_size = chunk_size
+        self._lock = asyncio.Lock()
+
+    def cutoffs(self, now: datetime):
+        """原始记录与小时汇总的截止时间，按天汇总的部分不晚于按小时汇总的部分"""
+        hourly_cutoff = HourlyRollup.truncate(now - self.raw_retention)
+        daily_cutoff = DailyRollup.truncate(
+            min(now - self.hourly_retention, hourly_cutoff)
+        )
+        return hourly_cutoff, daily_cutoff
+
+    async def _compact(self, source, target, cutoff: datetime) -> Set[int]:
+        room_ids = await self.repository.room_ids()
+        touched: Set[int] = set()
+        for i in range(0, len(room_ids), self.ROOM_BATCH):
+            batch = room_ids[i : i + self.ROOM_BATCH]
+            while True:
+                count, rooms = await self.repository.compact(
+                    source, target, batch, cutoff, self.chunk_size
+                )
+                touched |= rooms
+                await asyncio.sleep(0)
+                if count < self.chunk_size:
+                    break
+        return touched
+
+    async def compact(self, now: Optional[datetime] = None):
+        """定时任务：汇总超过保留期的记录"""
+        if self._lock.locked():
+            return
+
+        async with self._lock:
+            hourly_cutoff, daily_cutoff = self.cutoffs(now or datetime.now())
+            touched = await self._compact(
+                ElectricityHistory, HourlyRollup, hourly_cutoff
+            )
+            touched |= await self._compact(HourlyRollup, DailyRollup, daily_cutoff)
+
+        # 汇总不改变最新记录的ID，磁盘上同版本的图表也需要删除
+        await chart_cache.purge(touched)
+        if touched:
+            logger.info(f"电量历史汇总完成，涉及 {len(touched)} 个宿舍")
+
+
+history_retention = HistoryRetention(
+    history_repository,
+    raw_retention=timedelta(days=config.history_raw_retention_days),
+    hourly_retention=timedelta(days=config.history_hourly_retention_days),
+    chunk_size=config.history_compaction_chunk_size,
+)
+
+if config.history_raw_retention_days > 0:
+    scheduler.add_job(
+        history_retention.compact,
+        "interval",
+        seconds=config.history_compaction_interval,
+        id="electricity_history_compaction",
+        replace_existing=True,
+    )
@@ -1,122 +1,212 @@
-from nonebot import get_bot, require
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from nonebot import get_plugin_config, require
 from nonebot.log import logger
 
 require("nonebot_plugin_apscheduler")
 
 from nonebot_plugin_apscheduler import scheduler
 
-from ..db.electricity_db import Binding, Schedule, SessionLocal
-from ..utils.electricity import query_electricity
-
-
-async def query_and_send(binding_id: str):
-    """查询电量并发送消息"""
-    try:
-        with SessionLocal() as session:
-            binding = session.query(Binding).filter(Binding.id == binding_id).first()
-            if not binding:
-                logger.warning(f"定时任务: 绑定ID {binding_id} 不存在")
-                return
-
-        # 使用工具函数获取电量信息和预测时间
-        electricity_info, empty_time = query_electricity(
-            binding.campus, binding.building, binding.room
-        )
-
-        # 构建消息
-        message = (
-            f"【定时查询】宿舍电量信息：\n"
-            f"校区：{binding.campus}\n"
-            f"楼栋：{binding.building}\n"
-            f"房间：{binding.room}\n"
-            f"剩余电量：{electricity_info.value} 度"
-        )
-
-        # 如果有预测结果，添加到消息中
-        if empty_time:
-            message += f"\n预计电量耗尽时间：{empty_time.strftime('%Y-%m-%d %H:%M')}"
-
-        bot = get_bot()
-        # 发送消息
-        if binding.qq_number:
-            await bot.send_private_msg(user_id=int(binding.qq_number), message=message)
-        elif binding.group_number:
-            await bot.send_group_msg(
-                group_id=int(binding.group_number), message=message
-            )
+from ..config import Config
+from ..db.electricity_db import Binding
+from ..db.repository import binding_repository, schedule_repository
+from ..utils.dispatch import outbound_dispatcher
+from ..utils.electricity import (
+    normalize_time_format,
+    query_electricity,
+    stale_notice,
+)
+from ..utils.metrics import scheduler_lag_seconds
+
+config = get_plugin_config(Config).csust_electricity
+
+
+async def send_electricity_message(binding: Binding, electricity_info, empty_time):
+    """发送定时查询结果"""
+    # 构建消息
+    message = (
+        f"【定时查询】宿舍电量信息：\n"
+        f"校区：{binding.campus}\n"
+        f"楼栋：{binding.building}\n"
+        f"房间：{binding.room}\n"
+        f"剩余电量：{electricity_info.value} 度"
+        f"{stale_notice(electricity_info)}"
+    )
 
-        logger.info(
-            f"定时任务: 已发送电量信息给 {binding.qq_number or binding.group_number}"
-        )
-    except Exception as e:
-        logger.error(f"定时任务执行失败: {str(e)}")
+    # 如果有预测结果，添加到消息中
+    if empty_time:
+        message += f"\n预计电量耗尽时间：{empty_time.strftime('%Y-%m-%d %H:%M')}"
 
+    # 经发送队列限速发送，同一时间点的大量推送不会触发协议端的频率限制
+    if binding.qq_number:
+        await outbound_dispatcher.send(("private", int(binding.qq_number)), message)
+    elif binding.group_number:
+        await outbound_dispatcher.send(("group", int(binding.group_number)), message)
 
-def init_scheduler():
-    """初始化定时任务"""
-    logger.info("正在初始化电量查询定时任务...")
+    logger.info(
+        f"定时任务: 已发送电量信息给 {binding.qq_number or binding.group_number}"
+    )
+
+
+async def query_and_send_batch(schedule_time: str, binding_ids: List[str]):
+    """查询同一分钟内到期的所有绑定，同一宿舍只查询一次"""
+    bindings = await binding_repository.get_many(binding_ids)
+
+    if not bindings:
+        return
 
-    # 获取所有定时任务设置
-    with SessionLocal() as session:
-        schedules = session.query(Schedule).all()
+    # 按宿舍分组，同一宿舍的订阅者共享一次查询结果
+    rooms: Dict[Tuple[str, str, str], List[Binding]] = defaultdict(list)
+    for binding in bindings:
+        rooms[(binding.campus, binding.building, binding.room)].append(binding)
 
-    # 为每个定时任务创建一个job
-    for schedule in schedules:
-        hour, minute = schedule.schedule_time.split(":")
-        job_id = f"electricity_query_{schedule.binding_id}"
+    semaphore = asyncio.Semaphore(config.schedule_concurrency)
 
-        # 删除已存在的同名任务
+    async def query_room(room_key: Tuple[str, str, str], subscribers: List[Binding]):
         try:
-            scheduler.remove_job(job_id)
-        except:
-            pass
-
-        # 添加新任务
-        scheduler.add_job(
-            query_and_send,
-            "cron",
-            hour=int(hour),
-            minute=int(minute),
-            id=job_id,
-            args=[schedule.binding_id],
-        )
-        logger.info(
-            f"已设置定时任务: {schedule.schedule_time} 查询绑定ID {schedule.binding_id}"
-        )
-
-    logger.info(f"定时任务初始化完成, 共设置了 {len(schedules)} 个定时任务")
+            async with semaphore:
+                electricity_info, empty_time = await query_electricity(*room_key)
+        except Exception as e:
+            logger.error(f"定时任务执行失败: {' '.join(room_key)} 查询出错: {str(e)}")
+            return
+
+        for binding in subscribers:
+            try:
+                await send_electricity_message(binding, electricity_info, empty_time)
+            except Exception as e:
+                logger.error(f"定时任务执行失败: {str(e)}")
+
+    await asyncio.gather(*(query_room(*room) for room in rooms.items()))
+    logger.info(
+        f"定时任务: {schedule_time} 共 {len(bindings)} 个绑定，查询了 {len(rooms)} 个宿舍"
+    )
 
 
-def add_schedule_job(binding_id: str, time_str: str):
-    """添加一个定时任务"""
-    hour, minute = time_str.split(":")
-    job_id = f"electricity_query_{binding_id}"
+class ScheduleIndex:
+    """按 "HH:MM" 索引的定时查询
+
+    所有定时查询共用一个每分钟执行的任务，每次只需查找当前分钟的绑定；
+    任务数不再随绑定数增长，启动时也只需一次查询
+    """
+
+    # 任务延迟执行时最多补发的分钟数
+    MAX_CATCH_UP = 5
+
+    def __init__(self):
+        self.bindings: Dict[str, Set[str]] = {}
+        self.times: Dict[str, str] = {}
+        self._last_minute: Optional[datetime] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def add(self, binding_id: str, time_str: str):
+        self.remove(binding_id)
+        time_str = normalize_time_format(time_str)
+        self.bindings.setdefault(time_str, set()).add(binding_id)
+        self.times[binding_id] = time_str
+
+    def remove(self, binding_id: str) -> bool:
+        time_str = self.times.pop(binding_id, None)
+        if time_str is None:
+            return False
 
-    # 删除可能存在的同名任务
-    try:
-        scheduler.remove_job(job_id)
-    except:
-        pass
+        bindings = self.bindings[time_str]
+        bindings.discard(binding_id)
+        if not bindings:
+            del self.bindings[time_str]
+        return True
+
+    def load(self, schedules: Iterable[Tuple[str, str]]):
+        self.bindings.clear()
+        self.times.clear()
+        for binding_id, time_str in schedules:
+            # 早期版本保存的时间可能没有补零，如 8:00
+            time_str = normalize_time_format(time_str)
+            self.bindings.setdefault(time_str, set()).add(binding_id)
+            self.times[binding_id] = time_str
+
+    def due(self, now: datetime) -> List[Tuple[str, List[str]]]:
+        """上次执行以来到期的 (时间, 绑定ID)，任务被延迟时补上错过的分钟"""
+        minute = now.replace(second=0, microsecond=0)
+        start = minute
+        if self._last_minute is not None and self._last_minute < minute:
+            start = max(
+                self._last_minute + timedelta(minutes=1),
+                minute - timedelta(minutes=self.MAX_CATCH_UP - 1),
+            )
+        elif self._last_minute == minute:
+            return []
+        self._last_minute = minute
+
+        due = []
+        while start <= minute:
+            time_str = start.strftime("%H:%M")
+            if time_str in self.bindings:
+                due.append((time_str, list(self.bindings[time_str])))
+            start += timedelta(minutes=1)
+        return due
+
+    async def tick(self):
+        """定时任务：查询当前分钟到期的所有绑定
+
+        每个时间点在单独的协程中查询与发送，耗时较长时不会推迟下一分钟的任务
+        """
+        now = datetime.now()
+        for time_str, binding_ids in self.due(now):
+            scheduled = datetime.combine(
+                now.date(), datetime.strptime(time_str, "%H:%M").time()
+            )
+            if scheduled > now:
+                # 跨过零点补上的前一天的分钟
+                scheduled -= timedelta(days=1)
+            scheduler_lag_seconds.observe((now - scheduled).total_seconds())
+
+            task = asyncio.create_task(query_and_send_batch(time_str, binding_ids))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+schedule_index = ScheduleIndex()
+
+
+async def init_scheduler():
+    """初始化定时任务"""
+    logger.info("正在初始化电量查询定时任务...")
 
-    # 添加新任务
+    schedule_index.load(await schedule_repository.times())
     scheduler.add_job(
-        query_and_send,
+        schedule_index.tick,
         "cron",
-        hour=int(hour),
-        minute=int(minute),
-        id=job_id,
-        args=[binding_id],
+        minute="*",
+        id="electricity_schedule_tick",
+        replace_existing=True,
+        # 事件循环繁忙导致错过的分钟由 due 补上
+        coalesce=True,
+        misfire_grace_time=60,
     )
+
+    logger.info(
+        f"定时任务初始化完成, 共 {len(schedule_index)} 个定时查询，"
+        f"分布在 {len(schedule_index.bindings)} 个时间点"
+    )
+
+
+def add_schedule_job(binding_id: str, time_str: str):
+    """添加一个定时任务"""
+    schedule_index.add(binding_id, time_str)
     logger.info(f"已添加定时任务: {time_str} 查询绑定ID {binding_id}")
 
 
 def remove_schedule_job(binding_id: str):
     """移除一个定时任务"""
-    job_id = f"electricity_query_{binding_id}"
-    try:
-        scheduler.remove_job(job_id)
+    if schedule_index.remove(binding_id):
         logger.info(f"已移除定时任务: 查询绑定ID {binding_id}")
         return True
-    except:
-        logger.warning(f"移除定时任务失败: 查询绑定ID {binding_id} 的任务不存在")
-        return False
+
+    logger.warning(f"移除定时任务失败: 查询绑定ID {binding_id} 的任务不存在")
+    return False